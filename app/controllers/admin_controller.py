@@ -0,0 +1,63 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+import hmac
+import logging
+
+from app.core import config
+from app.core.cart_archive import list_maintenance_reports
+from app.core.database import SessionLocal, get_db
+from app.core.jobs import enqueue_job
+from app.core.maintenance import run_maintenance
+from app.core.profiler import list_profiles, load_profile
+from app.core.write_queue import execute_write
+
+# Logger para controladores
+logger = logging.getLogger("services")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependencia que protege las rutas de administración"""
+    if not config.ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        logger.warning("Acceso denegado a ruta de administración")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso denegado"
+        )
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+def get_profiles(limit: int = Query(20, ge=1, le=200, description="Número de perfiles")):
+    """Listar los últimos perfiles de peticiones"""
+    return list_profiles(limit=limit)
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """Obtener el desglose completo de un perfil"""
+    profile = load_profile(profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Perfil no encontrado"
+        )
+    return profile
+
+def _run_maintenance_in_background():
+    try:
+        run_maintenance(SessionLocal)
+    except Exception as e:
+        logger.error(f"Error en el mantenimiento: {e}")
+
+@router.get("/maintenance")
+def get_maintenance_reports(limit: int = Query(20, ge=1, le=200, description="Número de informes")):
+    """Listar los últimos informes de mantenimiento (carritos archivados y espacio recuperado)"""
+    return list_maintenance_reports(limit=limit)
+
+@router.post("/maintenance/run", status_code=status.HTTP_202_ACCEPTED)
+def run_maintenance_now(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """Lanzar ahora el archivado de carritos, ANALYZE y VACUUM incremental"""
+    if config.JOBS_ENABLED:
+        job_id = execute_write(db, lambda db: enqueue_job(db, "maintenance.run", max_attempts=1))
+        return {"status": "accepted", "jobId": job_id}
+    background_tasks.add_task(_run_maintenance_in_background)
+    return {"status": "accepted"}
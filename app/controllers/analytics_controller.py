@@ -0,0 +1,85 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from typing import List
+import logging
+
+from app.controllers.admin_controller import require_admin
+from app.core import config
+from app.core.database import SessionLocal, get_db
+from app.core.tracing import TracedRoute
+from app.services.analytics_service import AnalyticsService
+from app.schemas.analytics_schemas import ProductSalesResponse, UserSpendResponse
+
+# Logger para controladores
+logger = logging.getLogger("services")
+
+router = APIRouter(prefix="/analytics", tags=["analytics"], route_class=TracedRoute)
+
+def _rebuild_sales_analytics(chunk_size: int):
+    db = SessionLocal()
+    try:
+        AnalyticsService(db).rebuild(chunk_size=chunk_size)
+    except Exception as e:
+        logger.error(f"Error reconstruyendo analítica de ventas: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+@router.get("/top-products", response_model=List[ProductSalesResponse])
+def get_top_products(
+    limit: int = Query(10, ge=1, le=100, description="Número de productos"),
+    db: Session = Depends(get_db)
+):
+    """Obtener los productos más vendidos"""
+    try:
+        analytics_service = AnalyticsService(db)
+        return analytics_service.get_top_products(limit=limit)
+    except Exception as e:
+        logger.error(f"Error obteniendo productos más vendidos: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/top-users", response_model=List[UserSpendResponse])
+def get_top_users(
+    limit: int = Query(10, ge=1, le=100, description="Número de usuarios"),
+    db: Session = Depends(get_db)
+):
+    """Obtener los usuarios con mayor gasto"""
+    try:
+        analytics_service = AnalyticsService(db)
+        return analytics_service.get_top_users(limit=limit)
+    except Exception as e:
+        logger.error(f"Error obteniendo usuarios con mayor gasto: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/users/{user_id}/spend", response_model=UserSpendResponse)
+def get_user_spend(user_id: int, db: Session = Depends(get_db)):
+    """Obtener el gasto acumulado de un usuario"""
+    try:
+        analytics_service = AnalyticsService(db)
+        return analytics_service.get_user_spend(user_id)
+    except Exception as e:
+        logger.error(f"Error obteniendo gasto del usuario {user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+# Borra y recalcula todos los agregados: solo para administración
+@router.post("/rebuild", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+def rebuild_analytics(
+    background_tasks: BackgroundTasks,
+    chunk_size: int = Query(500, ge=1, le=10000, description="Carritos por transacción"),
+    db: Session = Depends(get_db)
+):
+    """Reconstruir los agregados de ventas por bloques en segundo plano"""
+    if config.JOBS_ENABLED:
+        job_id = AnalyticsService(db).enqueue_rebuild(chunk_size=chunk_size)
+        return {"status": "accepted", "jobId": job_id}
+    background_tasks.add_task(_rebuild_sales_analytics, chunk_size)
+    return {"status": "accepted"}
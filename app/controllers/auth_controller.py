@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+import logging
+
+from app.core.auth import AuthenticatedUser, get_current_user, issue_token
+from app.core.database import get_db
+from app.core.passwords import HasherBusy
+from app.core.tracing import TracedRoute
+from app.services.auth_service import AuthService
+from app.schemas.auth_schemas import CurrentUserResponse, LoginRequest, TokenResponse
+
+# Logger para controladores
+logger = logging.getLogger("services")
+
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=TracedRoute)
+
+@router.post("/login", response_model=TokenResponse)
+async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
+    """Emitir un token de acceso a partir de usuario y contraseña"""
+    try:
+        auth_service = AuthService(db)
+        user = await auth_service.authenticate(credentials.username, credentials.password)
+    except HasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiados inicios de sesión en curso",
+            headers={"Retry-After": "1"},
+        )
+    except Exception as e:
+        logger.error(f"Error en el login de {credentials.username}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Usuario o contraseña incorrectos",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    token, expires_in = issue_token(user.id, user.username)
+    return TokenResponse(access_token=token, expires_in=expires_in)
+
+@router.get("/me", response_model=CurrentUserResponse)
+async def get_me(current_user: AuthenticatedUser = Depends(get_current_user)):
+    """Identidad del token presentado, sin consultar la base de datos"""
+    return CurrentUserResponse(id=current_user.id, username=current_user.username, expiresAt=current_user.expires_at)
@@ -1,19 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import logging
 
+from app.core import config
+from app.core.auth import AuthenticatedUser, ensure_owner, require_auth
 from app.core.database import get_db
-from app.services.cart_service import CartService
-from app.schemas.cart_schemas import CartCreate, CartUpdate, CartResponse
+from app.core.tracing import TracedRoute
+from app.services.cart_service import CartLockedError, CartOwnerError, CartService, CheckoutError
+from app.schemas.cart_schemas import (
+    ArchivedCartResponse, CartCreate, CartUpdate, CartResponse, CartItemQuantity, CartItemResponse, CheckoutResponse
+)
+from app.schemas.job_schemas import JobAccepted
 
 # Logger para controladores
 logger = logging.getLogger("services")
 
-router = APIRouter(prefix="/carts", tags=["carts"])
+router = APIRouter(prefix="/carts", tags=["carts"], route_class=TracedRoute)
+
+def _item_response(cart, product_id: int) -> CartItemResponse:
+    quantity = next(
+        (line.get("quantity", 0) for line in cart.products if line.get("productId") == product_id), 0
+    )
+    return CartItemResponse(cartId=cart.id, productId=product_id, quantity=quantity)
+
+def _owner_id(current_user: Optional[AuthenticatedUser]) -> Optional[int]:
+    """Dueño exigido a las escrituras del carrito (None si la autenticación no es obligatoria)"""
+    return current_user.id if current_user is not None else None
+
+def _not_owner(cart_id: int, e: CartOwnerError) -> HTTPException:
+    logger.warning(f"Cambio rechazado en carrito {cart_id}: {e}")
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+def _cart_locked(cart_id: int, e: CartLockedError) -> HTTPException:
+    logger.warning(f"Cambio rechazado en carrito {cart_id}: {e}")
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+def _line_not_found(cart_service: CartService, cart_id: int) -> HTTPException:
+    detail = "Producto no encontrado en el carrito" if cart_service.cart_exists(cart_id) else "Carrito no encontrado"
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
 
 @router.get("/", response_model=List[CartResponse])
 def get_carts(
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
     user_id: int = Query(None, description="Filtrar por ID de usuario"),
@@ -26,6 +56,7 @@ def get_carts(
             carts = cart_service.get_carts_by_user(user_id)
         else:
             carts = cart_service.get_all_carts(skip=skip, limit=limit)
+        response.headers["X-Total-Count"] = str(cart_service.count_carts(user_id=user_id))
         return carts
     except Exception as e:
         logger.error(f"Error obteniendo carritos: {e}")
@@ -34,6 +65,45 @@ def get_carts(
             detail="Error interno del servidor"
         )
 
+@router.get("/archive", response_model=List[ArchivedCartResponse])
+def get_archived_carts(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: int = Query(None, description="Filtrar por ID de usuario"),
+    db: Session = Depends(get_db)
+):
+    """Obtener carritos archivados por la política de retención"""
+    try:
+        cart_service = CartService(db)
+        return cart_service.get_archived_carts(user_id=user_id, skip=skip, limit=limit)
+    except Exception as e:
+        logger.error(f"Error obteniendo carritos archivados: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/archive/{cart_id}", response_model=ArchivedCartResponse)
+def get_archived_cart(cart_id: int, db: Session = Depends(get_db)):
+    """Obtener un carrito archivado por ID"""
+    try:
+        cart_service = CartService(db)
+        cart = cart_service.get_archived_cart(cart_id)
+        if not cart:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Carrito archivado no encontrado"
+            )
+        return cart
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo carrito archivado {cart_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
 @router.get("/{cart_id}", response_model=CartResponse)
 def get_cart(cart_id: int, db: Session = Depends(get_db)):
     """Obtener carrito por ID"""
@@ -56,8 +126,9 @@ def get_cart(cart_id: int, db: Session = Depends(get_db)):
         )
 
 @router.post("/", response_model=CartResponse, status_code=status.HTTP_201_CREATED)
-def create_cart(cart: CartCreate, db: Session = Depends(get_db)):
+def create_cart(cart: CartCreate, db: Session = Depends(get_db), current_user: Optional[AuthenticatedUser] = Depends(require_auth)):
     """Crear nuevo carrito"""
+    ensure_owner(current_user, cart.userId, "No puedes crear carritos para otro usuario")
     try:
         cart_service = CartService(db)
         new_cart = cart_service.create_cart(cart)
@@ -70,11 +141,19 @@ def create_cart(cart: CartCreate, db: Session = Depends(get_db)):
         )
 
 @router.put("/{cart_id}", response_model=CartResponse)
-def update_cart(cart_id: int, cart_update: CartUpdate, db: Session = Depends(get_db)):
+def update_cart(
+    cart_id: int,
+    cart_update: CartUpdate,
+    db: Session = Depends(get_db),
+    current_user: Optional[AuthenticatedUser] = Depends(require_auth),
+):
     """Actualizar carrito existente"""
+    # Tampoco se puede pasar el carrito a otro usuario
+    if cart_update.userId is not None:
+        ensure_owner(current_user, cart_update.userId, "No puedes asignar el carrito a otro usuario")
     try:
         cart_service = CartService(db)
-        updated_cart = cart_service.update_cart(cart_id, cart_update)
+        updated_cart = cart_service.update_cart(cart_id, cart_update, _owner_id(current_user))
         if not updated_cart:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -83,6 +162,10 @@ def update_cart(cart_id: int, cart_update: CartUpdate, db: Session = Depends(get
         return updated_cart
     except HTTPException:
         raise
+    except CartOwnerError as e:
+        raise _not_owner(cart_id, e)
+    except CartLockedError as e:
+        raise _cart_locked(cart_id, e)
     except Exception as e:
         logger.error(f"Error actualizando carrito {cart_id}: {e}")
         raise HTTPException(
@@ -91,11 +174,11 @@ def update_cart(cart_id: int, cart_update: CartUpdate, db: Session = Depends(get
         )
 
 @router.delete("/{cart_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_cart(cart_id: int, db: Session = Depends(get_db)):
+def delete_cart(cart_id: int, db: Session = Depends(get_db), current_user: Optional[AuthenticatedUser] = Depends(require_auth)):
     """Eliminar carrito"""
     try:
         cart_service = CartService(db)
-        success = cart_service.delete_cart(cart_id)
+        success = cart_service.delete_cart(cart_id, _owner_id(current_user))
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -103,9 +186,148 @@ def delete_cart(cart_id: int, db: Session = Depends(get_db)):
             )
     except HTTPException:
         raise
+    except CartOwnerError as e:
+        raise _not_owner(cart_id, e)
+    except CartLockedError as e:
+        raise _cart_locked(cart_id, e)
     except Exception as e:
         logger.error(f"Error eliminando carrito {cart_id}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno del servidor"
-        )
\ No newline at end of file
+        )
+
+@router.post("/{cart_id}/items/{product_id}", response_model=CartItemResponse)
+def add_cart_item(
+    cart_id: int,
+    product_id: int,
+    item: CartItemQuantity,
+    db: Session = Depends(get_db),
+    current_user: Optional[AuthenticatedUser] = Depends(require_auth),
+):
+    """Añadir unidades de un producto al carrito"""
+    try:
+        cart_service = CartService(db)
+        cart = cart_service.add_item(cart_id, product_id, item.quantity, _owner_id(current_user))
+        if not cart:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Carrito no encontrado"
+            )
+        return _item_response(cart, product_id)
+    except HTTPException:
+        raise
+    except CartOwnerError as e:
+        raise _not_owner(cart_id, e)
+    except CartLockedError as e:
+        raise _cart_locked(cart_id, e)
+    except Exception as e:
+        logger.error(f"Error añadiendo producto {product_id} al carrito {cart_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.patch("/{cart_id}/items/{product_id}", response_model=CartItemResponse)
+def update_cart_item(
+    cart_id: int,
+    product_id: int,
+    item: CartItemQuantity,
+    db: Session = Depends(get_db),
+    current_user: Optional[AuthenticatedUser] = Depends(require_auth),
+):
+    """Cambiar la cantidad de un producto del carrito"""
+    try:
+        cart_service = CartService(db)
+        cart = cart_service.set_item_quantity(cart_id, product_id, item.quantity, _owner_id(current_user))
+        if not cart:
+            raise _line_not_found(cart_service, cart_id)
+        return _item_response(cart, product_id)
+    except HTTPException:
+        raise
+    except CartOwnerError as e:
+        raise _not_owner(cart_id, e)
+    except CartLockedError as e:
+        raise _cart_locked(cart_id, e)
+    except Exception as e:
+        logger.error(f"Error actualizando producto {product_id} del carrito {cart_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.delete("/{cart_id}/items/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_cart_item(
+    cart_id: int,
+    product_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[AuthenticatedUser] = Depends(require_auth),
+):
+    """Eliminar un producto del carrito"""
+    try:
+        cart_service = CartService(db)
+        cart = cart_service.remove_item(cart_id, product_id, _owner_id(current_user))
+        if not cart:
+            raise _line_not_found(cart_service, cart_id)
+    except HTTPException:
+        raise
+    except CartOwnerError as e:
+        raise _not_owner(cart_id, e)
+    except CartLockedError as e:
+        raise _cart_locked(cart_id, e)
+    except Exception as e:
+        logger.error(f"Error eliminando producto {product_id} del carrito {cart_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.post(
+    "/{cart_id}/checkout",
+    response_model=CheckoutResponse,
+    responses={status.HTTP_202_ACCEPTED: {"model": JobAccepted}},
+)
+def checkout_cart(
+    cart_id: int,
+    prefer: Optional[str] = Header(None, description="respond-async para encolar la compra y responder 202"),
+    db: Session = Depends(get_db),
+    current_user: Optional[AuthenticatedUser] = Depends(require_auth),
+):
+    """Comprar el carrito reservando el stock de todas sus líneas"""
+    try:
+        cart_service = CartService(db)
+        if config.JOBS_ENABLED and prefer and "respond-async" in prefer:
+            job_id = cart_service.enqueue_checkout(cart_id, _owner_id(current_user))
+            if job_id is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Carrito no encontrado"
+                )
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content=JobAccepted(jobId=job_id).model_dump(),
+                headers={"Location": f"/jobs/{job_id}"},
+            )
+        result = cart_service.checkout(cart_id, _owner_id(current_user))
+        if not result:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Carrito no encontrado"
+            )
+        return result
+    except CartOwnerError as e:
+        raise _not_owner(cart_id, e)
+    except CheckoutError as e:
+        logger.warning(f"Compra rechazada para carrito {cart_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "products": e.products}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error comprando carrito {cart_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+import logging
+
+from app.core.database import get_db
+from app.core.tracing import TracedRoute
+from app.services.job_service import JobService
+from app.schemas.job_schemas import JobResponse
+
+# Logger para controladores
+logger = logging.getLogger("services")
+
+router = APIRouter(prefix="/jobs", tags=["jobs"], route_class=TracedRoute)
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Consultar el estado de un trabajo en segundo plano"""
+    try:
+        job_service = JobService(db)
+        job = job_service.get_job(job_id)
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Trabajo no encontrado"
+            )
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo trabajo {job_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
@@ -1,16 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import logging
 
+from app.core import config
+from app.core.change_feed import change_hub
 from app.core.database import get_db
+from app.core.tracing import TracedRoute
+from app.core.singleflight import SingleFlight
 from app.services.product_service import ProductService
-from app.schemas.product_schemas import ProductCreate, ProductUpdate, ProductResponse
+from app.services.recommendation_service import RecommendationService
+from app.schemas.product_schemas import (
+    AutocompleteSuggestion, ProductCreate, ProductUpdate, ProductResponse, RatingCreate, RatingResponse,
+    RelatedProductResponse,
+)
 
 # Logger para controladores
 logger = logging.getLogger("services")
 
-router = APIRouter(prefix="/products", tags=["products"])
+router = APIRouter(prefix="/products", tags=["products"], route_class=TracedRoute)
+
+# Lecturas idénticas concurrentes comparten consulta y JSON serializado
+product_flights = SingleFlight("products")
+_product_adapter = TypeAdapter(ProductResponse)
+_product_list_adapter = TypeAdapter(List[ProductResponse])
+
+def _serialize_products(products) -> bytes:
+    return _product_list_adapter.dump_json(
+        _product_list_adapter.validate_python(products, from_attributes=True)
+    )
+
+def _serialize_product(product) -> Optional[bytes]:
+    if product is None:
+        return None
+    return _product_adapter.dump_json(_product_adapter.validate_python(product, from_attributes=True))
 
 @router.get("/", response_model=List[ProductResponse])
 def get_products(
@@ -22,11 +47,24 @@ def get_products(
     """Obtener lista de productos"""
     try:
         product_service = ProductService(db)
+        # El total viaja con el cuerpo para que ambos salgan de la misma consulta compartida
         if category:
-            products = product_service.get_products_by_category(category)
+            body, total = product_flights.do(
+                ("category", category),
+                lambda: (
+                    _serialize_products(product_service.get_products_by_category(category)),
+                    product_service.count_products(category=category),
+                )
+            )
         else:
-            products = product_service.get_products(skip=skip, limit=limit)
-        return products
+            body, total = product_flights.do(
+                ("page", skip, limit),
+                lambda: (
+                    _serialize_products(product_service.get_products(skip=skip, limit=limit)),
+                    product_service.count_products(),
+                )
+            )
+        return Response(content=body, media_type="application/json", headers={"X-Total-Count": str(total)})
     except Exception as e:
         logger.error(f"Error obteniendo productos: {e}")
         raise HTTPException(
@@ -34,18 +72,97 @@ def get_products(
             detail="Error interno del servidor"
         )
 
+@router.get("/search", response_model=List[ProductResponse])
+def search_products(
+    category: Optional[str] = Query(None, description="Filtrar por categoría"),
+    min_price: Optional[float] = Query(None, ge=0, description="Precio mínimo"),
+    max_price: Optional[float] = Query(None, ge=0, description="Precio máximo"),
+    min_rating: Optional[float] = Query(None, ge=0, le=5, description="Rating mínimo"),
+    sort_by: str = Query("id", pattern="^(id|price|rating|rating_count)$", description="Campo de orden"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Sentido del orden"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Filtrar, ordenar y obtener el top-k de productos"""
+    try:
+        product_service = ProductService(db)
+        products = product_service.search_products(
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating,
+            sort_by=sort_by,
+            descending=order == "desc",
+            skip=skip,
+            limit=limit,
+        )
+        return products
+    except Exception as e:
+        logger.error(f"Error buscando productos: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/autocomplete", response_model=List[AutocompleteSuggestion])
+def autocomplete_products(
+    prefix: str = Query(..., min_length=1, max_length=100, description="Texto escrito hasta ahora"),
+    limit: int = Query(10, ge=1, le=config.AUTOCOMPLETE_MAX_LIMIT, description="Número de sugerencias"),
+    db: Session = Depends(get_db)
+):
+    """Sugerir productos mientras se escribe"""
+    try:
+        product_service = ProductService(db)
+        return product_service.autocomplete(prefix, limit=limit)
+    except Exception as e:
+        logger.error(f"Error autocompletando productos para '{prefix}': {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/changes")
+async def stream_product_changes(
+    since: Optional[int] = Query(None, ge=0, description="Reanudar tras este id de evento"),
+    last_event_id: Optional[int] = Header(None, ge=0, description="Id del último evento recibido (reconexión SSE)"),
+):
+    """Stream SSE de altas, modificaciones y bajas de productos"""
+    if not change_hub.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Stream de cambios no disponible"
+        )
+    try:
+        # En la reconexión, la cabecera del navegador manda sobre el parámetro inicial
+        stream = change_hub.subscribe(last_event_id if last_event_id is not None else since)
+    except OverflowError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiados suscriptores",
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/{product_id}", response_model=ProductResponse)
 def get_product(product_id: int, db: Session = Depends(get_db)):
     """Obtener producto por ID"""
     try:
         product_service = ProductService(db)
-        product = product_service.get_product(product_id)
-        if not product:
+        body = product_flights.do(
+            ("id", product_id),
+            lambda: _serialize_product(product_service.get_product(product_id))
+        )
+        if body is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Producto no encontrado"
             )
-        return product
+        return Response(content=body, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -55,6 +172,34 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
             detail="Error interno del servidor"
         )
 
+@router.get("/{product_id}/related", response_model=List[RelatedProductResponse])
+def get_related_products(
+    product_id: int,
+    limit: int = Query(10, ge=1, le=config.RECOMMENDATIONS_TOP_K, description="Número de productos"),
+    db: Session = Depends(get_db)
+):
+    """Obtener los productos que se compran junto a uno dado"""
+    try:
+        recommendation_service = RecommendationService(db)
+        related = recommendation_service.get_related(product_id, limit=limit)
+        if related is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Producto no encontrado"
+            )
+        return [
+            RelatedProductResponse(**ProductResponse.model_validate(product).model_dump(), carts=carts)
+            for product, carts in related
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo productos relacionados con {product_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     """Crear nuevo producto"""
@@ -69,6 +214,27 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
             detail="Error interno del servidor"
         )
 
+@router.post("/{product_id}/ratings", response_model=RatingResponse, status_code=status.HTTP_201_CREATED)
+def add_rating(product_id: int, rating: RatingCreate, db: Session = Depends(get_db)):
+    """Registrar una valoración de producto"""
+    try:
+        product_service = ProductService(db)
+        result = product_service.add_rating(product_id, rating.rate)
+        if not result:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Producto no encontrado"
+            )
+        return RatingResponse(productId=result.id, rate=result.rating["rate"], count=result.rating["count"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error valorando producto {product_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
 @router.put("/{product_id}", response_model=ProductResponse)
 def update_product(product_id: int, product_update: ProductUpdate, db: Session = Depends(get_db)):
     """Actualizar producto existente"""
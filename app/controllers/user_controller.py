@@ -1,23 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import logging
 
+from app.core import config
+from app.core.auth import AuthenticatedUser, ensure_owner, require_auth
 from app.core.database import get_db
+from app.core.passwords import HasherBusy
+from app.core.tracing import TracedRoute
 from app.services.user_service import UserService
-from app.schemas.user_schemas import UserCreate, UserUpdate, UserResponse
+from app.schemas.user_schemas import NearbyUserResponse, UserCreate, UserUpdate, UserResponse
 
 # Logger para controladores
 logger = logging.getLogger("services")
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=TracedRoute)
 
 @router.get("/", response_model=List[UserResponse])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_users(response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Obtener lista de usuarios"""
     try:
         user_service = UserService(db)
         users = user_service.get_users(skip=skip, limit=limit)
+        response.headers["X-Total-Count"] = str(user_service.count_users())
         return users
     except Exception as e:
         logger.error(f"Error obteniendo usuarios: {e}")
@@ -26,6 +31,55 @@ def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
             detail="Error interno del servidor"
         )
 
+@router.get("/nearby", response_model=List[NearbyUserResponse])
+def get_users_nearby(
+    lat: float = Query(..., ge=-90, le=90, description="Latitud del punto"),
+    long: float = Query(..., ge=-180, le=180, description="Longitud del punto"),
+    radius: float = Query(..., gt=0, le=config.USERS_NEARBY_MAX_RADIUS_KM, description="Radio en kilómetros"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Obtener los usuarios más cercanos a un punto dentro de un radio"""
+    try:
+        user_service = UserService(db)
+        nearby = user_service.get_users_nearby(lat, long, radius, limit=limit)
+        return [
+            NearbyUserResponse(**UserResponse.model_validate(user).model_dump(), distanceKm=round(distance, 3))
+            for user, distance in nearby
+        ]
+    except Exception as e:
+        logger.error(f"Error buscando usuarios cercanos a ({lat}, {long}): {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/within", response_model=List[UserResponse])
+def get_users_within(
+    min_lat: float = Query(..., ge=-90, le=90),
+    max_lat: float = Query(..., ge=-90, le=90),
+    min_long: float = Query(..., ge=-180, le=180),
+    max_long: float = Query(..., ge=-180, le=180),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Obtener los usuarios dentro de una caja de coordenadas (zona de reparto)"""
+    if min_lat > max_lat or min_long > max_long:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La caja debe cumplir min_lat <= max_lat y min_long <= max_long"
+        )
+    try:
+        user_service = UserService(db)
+        return user_service.get_users_in_box(min_lat, max_lat, min_long, max_long, skip=skip, limit=limit)
+    except Exception as e:
+        logger.error(f"Error buscando usuarios en la caja: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user(user_id: int, db: Session = Depends(get_db)):
     """Obtener usuario por ID"""
@@ -54,6 +108,12 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         user_service = UserService(db)
         new_user = user_service.create_user(user)
         return new_user
+    except HasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas operaciones de contraseña en curso",
+            headers={"Retry-After": "1"},
+        )
     except ValueError as e:
         logger.warning(f"Error de validación creando usuario: {e}")
         raise HTTPException(
@@ -68,8 +128,14 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         )
 
 @router.put("/{user_id}", response_model=UserResponse)
-def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get_db)):
+def update_user(
+    user_id: int,
+    user_update: UserUpdate,
+    db: Session = Depends(get_db),
+    current_user: Optional[AuthenticatedUser] = Depends(require_auth),
+):
     """Actualizar usuario existente"""
+    ensure_owner(current_user, user_id)
     try:
         user_service = UserService(db)
         updated_user = user_service.update_user(user_id, user_update)
@@ -81,6 +147,18 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
         return updated_user
     except HTTPException:
         raise
+    except HasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas operaciones de contraseña en curso",
+            headers={"Retry-After": "1"},
+        )
+    except ValueError as e:
+        logger.warning(f"Error de validación actualizando usuario {user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error actualizando usuario {user_id}: {e}")
         raise HTTPException(
@@ -89,8 +167,13 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
         )
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
+def delete_user(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[AuthenticatedUser] = Depends(require_auth),
+):
     """Eliminar usuario"""
+    ensure_owner(current_user, user_id)
     try:
         user_service = UserService(db)
         success = user_service.delete_user(user_id)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.core import config
+from app.core.metrics import metrics
+from app.core.write_queue import pending_writes
+
+logger = logging.getLogger("app")
+
+def parse_route_limits(spec: str) -> List[Tuple[str, int]]:
+    """Convertir "/carts=8,/products=4" en [("/carts", 8), ("/products", 4)]"""
+    limits = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        prefix, _, limit = entry.partition("=")
+        limits.append((prefix.strip().rstrip("/") or "/", int(limit)))
+    # Los prefijos más largos tienen prioridad
+    return sorted(limits, key=lambda item: len(item[0]), reverse=True)
+
+class TokenBucket:
+    """Token bucket clásico: rate fichas/segundo con capacidad burst"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consumir una ficha; devuelve 0 o los segundos hasta la siguiente"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class _RouteLimit:
+    def __init__(self, prefix: str, limit: int):
+        self.prefix = prefix
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI de admisión para los métodos de escritura.
+
+    Aplica un token bucket por cliente (429) y un límite de concurrencia por
+    prefijo de ruta. Cuando la cola de espera de la base de datos supera el
+    umbral, o la espera por un hueco se alarga demasiado, descarta la
+    petición con 503. Ambos rechazos llevan Retry-After y quedan en métricas.
+    Las lecturas no pasan por aquí, así que conservan sus hilos del pool.
+
+    El cliente es scope["client"], que uvicorn ya resuelve desde
+    X-Forwarded-For para los proxies de JAGASTORE_FORWARDED_ALLOW_IPS. Detrás
+    de un proxy que no está en la lista, todos los clientes comparten bucket:
+    por eso el límite por cliente viene desactivado.
+    """
+
+    def __init__(
+        self,
+        app,
+        methods: str = config.ADMISSION_METHODS,
+        route_limits: str = config.ADMISSION_ROUTE_LIMITS,
+        queue_threshold: int = config.ADMISSION_QUEUE_THRESHOLD,
+        max_wait_s: float = config.ADMISSION_MAX_WAIT_S,
+        client_rate: float = config.ADMISSION_CLIENT_RATE,
+        client_burst: float = config.ADMISSION_CLIENT_BURST,
+        max_clients: int = config.ADMISSION_MAX_CLIENTS,
+    ):
+        self.app = app
+        self.methods = {m.strip().upper() for m in methods.split(",") if m.strip()}
+        self.routes = [_RouteLimit(prefix, limit) for prefix, limit in parse_route_limits(route_limits)]
+        self.queue_threshold = queue_threshold
+        self.max_wait_s = max_wait_s
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def _match(self, path: str) -> Optional[_RouteLimit]:
+        for route in self.routes:
+            if path == route.prefix or path.startswith(route.prefix + "/"):
+                return route
+        return None
+
+    def _take_token(self, client: str) -> float:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(self.client_rate, self.client_burst)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take()
+
+    def db_wait_depth(self) -> int:
+        """Peticiones de escritura esperando hueco más escrituras en la cola del escritor"""
+        return sum(route.waiting for route in self.routes) + pending_writes()
+
+    async def _reject(self, send, status_code: int, retry_after: float, route: str, reason: str):
+        metrics.inc("admission_shed_total", route=route, reason=reason, status=status_code)
+        logger.warning(f"Petición descartada ({status_code}, {reason}) en {route}")
+        body = json.dumps({"detail": "Servicio saturado, reintente más tarde"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+
+        route = self._match(scope["path"])
+        route_name = route.prefix if route else "other"
+
+        if self.client_rate > 0:
+            client = scope.get("client")
+            wait = self._take_token(client[0] if client else "unknown")
+            if wait > 0:
+                await self._reject(send, 429, wait, route_name, "rate_limited")
+                return
+
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        if route.semaphore.locked():
+            depth = self.db_wait_depth()
+            metrics.set_gauge("admission_db_wait_depth", depth)
+            if depth >= self.queue_threshold:
+                await self._reject(send, 503, self.max_wait_s, route_name, "queue_full")
+                return
+
+            route.waiting += 1
+            try:
+                await asyncio.wait_for(route.semaphore.acquire(), self.max_wait_s)
+            except asyncio.TimeoutError:
+                await self._reject(send, 503, self.max_wait_s, route_name, "wait_timeout")
+                return
+            finally:
+                route.waiting -= 1
+        else:
+            # Hay hueco: se adquiere sin ceder el bucle de eventos
+            await route.semaphore.acquire()
+        metrics.observe("admission_wait_seconds", time.perf_counter() - start, route=route_name)
+        metrics.inc("admission_admitted_total", route=route_name)
+
+        route.in_flight += 1
+        metrics.set_gauge("admission_in_flight", route.in_flight, route=route_name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route.in_flight -= 1
+            metrics.set_gauge("admission_in_flight", route.in_flight, route=route_name)
+            route.semaphore.release()
@@ -0,0 +1,178 @@
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import jwt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.core import config
+from app.core.file_lock import file_lock
+from app.core.metrics import metrics
+
+logger = logging.getLogger("app")
+
+ALGORITHM = "HS256"
+_REQUIRED_CLAIMS = ["sub", "iat", "exp", "iss", "aud"]
+
+_key: Optional[bytes] = None
+_key_lock = threading.Lock()
+
+def _load_or_create_key(path: str) -> bytes:
+    """Leer la clave compartida por los workers o generarla la primera vez"""
+    with file_lock(f"{path}.lock"):
+        if not os.path.exists(path):
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+            logger.info(f"Clave de firma de tokens generada en {path}")
+        with open(path) as f:
+            return f.read().strip().encode()
+
+def signing_key() -> bytes:
+    """Clave HMAC de los tokens, leída una sola vez por proceso"""
+    global _key
+    if _key is None:
+        with _key_lock:
+            if _key is None:
+                _key = config.AUTH_JWT_SECRET.encode() if config.AUTH_JWT_SECRET else _load_or_create_key(config.AUTH_JWT_KEY_PATH)
+    return _key
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """Identidad sacada de un token ya verificado; no se consulta la base de datos"""
+    id: int
+    username: str
+    expires_at: int
+
+def issue_token(user_id: int, username: str) -> Tuple[str, int]:
+    """Firmar un token de acceso; devuelve el token y su validez en segundos"""
+    now = int(time.time())
+    claims = {
+        "sub": str(user_id),
+        "username": username,
+        "iss": config.AUTH_JWT_ISSUER,
+        "aud": config.AUTH_JWT_AUDIENCE,
+        "iat": now,
+        "exp": now + config.AUTH_TOKEN_TTL_S,
+        "jti": secrets.token_urlsafe(12),
+    }
+    return jwt.encode(claims, signing_key(), algorithm=ALGORITHM), config.AUTH_TOKEN_TTL_S
+
+class TokenCache:
+    """LRU de tokens ya verificados.
+
+    Un acierto evita decodificar y comprobar la firma y los claims. Cada
+    entrada caduca con el exp del propio token, así que un token vencido no
+    sobrevive en la caché. Los tokens inválidos no se guardan.
+    """
+
+    def __init__(self, max_entries: int = config.AUTH_TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, AuthenticatedUser]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[AuthenticatedUser]:
+        with self._lock:
+            user = self._entries.get(token)
+            if user is None:
+                return None
+            if user.expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: AuthenticatedUser):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[token] = user
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache()
+
+def _decode(token: str) -> Dict[str, Any]:
+    return jwt.decode(
+        token,
+        signing_key(),
+        algorithms=[ALGORITHM],
+        audience=config.AUTH_JWT_AUDIENCE,
+        issuer=config.AUTH_JWT_ISSUER,
+        leeway=config.AUTH_JWT_LEEWAY_S,
+        options={"require": _REQUIRED_CLAIMS},
+    )
+
+def verify_token(token: str) -> AuthenticatedUser:
+    """Verificar firma y claims de un token (o tomarlo de la caché); lanza jwt.InvalidTokenError"""
+    user = token_cache.get(token)
+    if user is not None:
+        metrics.inc("auth_token_cache", result="hit")
+        return user
+    metrics.inc("auth_token_cache", result="miss")
+    claims = _decode(token)
+    try:
+        user = AuthenticatedUser(id=int(claims["sub"]), username=str(claims.get("username", "")), expires_at=int(claims["exp"]))
+    except (TypeError, ValueError):
+        raise jwt.InvalidTokenError("Claim sub inválido")
+    token_cache.put(token, user)
+    return user
+
+_bearer = HTTPBearer(auto_error=False)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> AuthenticatedUser:
+    """Dependencia que exige un token Bearer válido.
+
+    Es async a propósito: solo hace CPU de microsegundos (o un acierto de
+    caché) y así no consume un hilo del threadpool por petición.
+    """
+    if credentials is None:
+        raise _unauthorized("No autenticado")
+    try:
+        return verify_token(credentials.credentials)
+    except jwt.ExpiredSignatureError:
+        metrics.inc("auth_rejected", reason="expired")
+        raise _unauthorized("Token caducado")
+    except jwt.InvalidTokenError as e:
+        metrics.inc("auth_rejected", reason="invalid")
+        logger.warning(f"Token rechazado: {e}")
+        raise _unauthorized("Token inválido")
+
+async def require_auth(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> Optional[AuthenticatedUser]:
+    """Dependencia para las rutas de escritura: exige token solo con JAGASTORE_AUTH_REQUIRED.
+
+    Con la autenticación opcional, un token presente se valida igualmente
+    (uno inválido da 401) para que los clientes puedan migrar antes del corte.
+    """
+    if credentials is None and not config.AUTH_REQUIRED:
+        return None
+    return await get_current_user(credentials)
+
+def ensure_owner(current_user: Optional[AuthenticatedUser], user_id: Optional[int], detail: str = "No puedes modificar otro usuario"):
+    """403 si hay usuario autenticado y el recurso pertenece a otro (o a nadie)"""
+    if current_user is not None and current_user.id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=detail
+        )
@@ -0,0 +1,307 @@
+import bisect
+import logging
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.core.catalog_snapshot import CatalogView, rating_values, read_catalog_position
+from app.core.metrics import metrics
+from app.models.product_model import Product
+
+try:
+    import numpy as np
+except ImportError:  # Sin numpy el servicio responde con una consulta LIKE
+    np = None
+
+logger = logging.getLogger("app")
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Mayor que cualquier carácter de un término normalizado: cierra el rango de un prefijo
+_PREFIX_END = "\uffff"
+
+def normalize_terms(text: Optional[str]) -> List[str]:
+    """Términos en minúsculas, sin acentos ni signos de puntuación"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower())
+    return _WORD.findall("".join(c for c in text if not unicodedata.combining(c)))
+
+def _matches(terms: List[str], tokens: List[str]) -> bool:
+    # Cada token de la consulta debe ser prefijo de algún término del producto
+    return all(any(term.startswith(token) for term in terms) for token in tokens)
+
+class AutocompleteIndex(CatalogView):
+    """Índice de prefijos sobre los términos de título y categoría de los productos.
+
+    La base es un array ordenado de términos (búsqueda con bisect) cuyas listas
+    de productos están contiguas en un único array de numpy y ya ordenadas por
+    número de valoraciones, así que un prefijo es un rango del array y los
+    mejores resultados están al principio. Los títulos se guardan concatenados
+    en UTF-8 con sus desplazamientos. La base no se modifica tras la carga: las
+    escrituras marcan la posición antigua como borrada y añaden el producto a
+    una capa pequeña de cambios, que se funde con la base al recargar.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._reset()
+
+    @property
+    def enabled(self) -> bool:
+        return config.AUTOCOMPLETE_ENABLED
+
+    @property
+    def available(self) -> bool:
+        return np is not None and self.version is not None
+
+    def _reset(self):
+        self.terms: List[str] = []
+        self._terms_bytes = 0
+        self._categories: List[Optional[str]] = []
+        if np is not None:
+            self.ids = np.empty(0, dtype=np.int64)
+            self.rating_count = np.empty(0, dtype=np.int32)
+            self.category = np.empty(0, dtype=np.int32)
+            self.alive = np.empty(0, dtype=bool)
+            self.title_offsets = np.zeros(1, dtype=np.int64)
+            # Posición de cada producto en el orden global (más valoraciones, id) y su inversa
+            self.rank = np.empty(0, dtype=np.int32)
+            self.by_rank = np.empty(0, dtype=np.int32)
+            # Índice invertido: término -> posiciones, contiguas y ordenadas por rank
+            self.term_offsets = np.zeros(1, dtype=np.int64)
+            self.postings = np.empty(0, dtype=np.int32)
+            # Índice directo: posición -> términos, para filtrar por el resto de palabras
+            self.product_term_offsets = np.zeros(1, dtype=np.int64)
+            self.product_terms = np.empty(0, dtype=np.int32)
+        self._titles = b""
+        # Cabezas de los rangos grandes (prefijos cortos): la base no cambia hasta recargar
+        self._ranked: Dict[str, Tuple[Any, bool]] = {}
+        # Capa de cambios: id -> (título, categoría, valoraciones, términos) y (término, id) ordenados
+        self._overlay: Dict[int, Tuple[str, Optional[str], int, List[str]]] = {}
+        self._overlay_terms: List[Tuple[str, int]] = []
+
+    def load(self, db: Session):
+        """Construir el índice completo desde la tabla products"""
+        if np is None:
+            logger.warning("numpy no está instalado: índice de autocompletado desactivado")
+            return
+        start = time.perf_counter()
+        version, change_id = read_catalog_position(db)
+        rows = db.execute(
+            select(Product.id, Product.title, Product.category, Product.rating_count).order_by(Product.id)
+        ).all()
+
+        count = len(rows)
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        rating_count = np.fromiter((row[3] or 0 for row in rows), dtype=np.int32, count=count)
+        encoded = [(row[1] or "").encode() for row in rows]
+        title_offsets = np.zeros(count + 1, dtype=np.int64)
+        title_offsets[1:] = np.cumsum(np.fromiter((len(t) for t in encoded), dtype=np.int64, count=count))
+        categories: List[Optional[str]] = []
+        category_codes: Dict[Optional[str], int] = {}
+        category = np.empty(count, dtype=np.int32)
+
+        # Pares (término, posición del producto) en arrays compactos
+        term_codes: Dict[str, int] = {}
+        pair_terms, pair_positions = array("i"), array("i")
+        for pos, (_, title, product_category, _) in enumerate(rows):
+            code = category_codes.get(product_category)
+            if code is None:
+                code = category_codes[product_category] = len(categories)
+                categories.append(product_category)
+            category[pos] = code
+            for term in set(normalize_terms(title)) | set(normalize_terms(product_category)):
+                pair_terms.append(term_codes.setdefault(term, len(term_codes)))
+                pair_positions.append(pos)
+        titles = b"".join(encoded)
+        del rows, encoded
+
+        terms = sorted(term_codes)
+        rank = np.empty(len(terms), dtype=np.int32)
+        rank[[term_codes[term] for term in terms]] = np.arange(len(terms), dtype=np.int32)
+        pair_terms = rank[np.frombuffer(pair_terms, dtype=np.int32)]
+        pair_positions = np.frombuffer(pair_positions, dtype=np.int32)
+        by_rank = np.lexsort((ids, -rating_count.astype(np.int64))).astype(np.int32)
+        product_rank = np.empty(count, dtype=np.int32)
+        product_rank[by_rank] = np.arange(count, dtype=np.int32)
+        order = np.lexsort((product_rank[pair_positions], pair_terms))
+        postings = pair_positions[order]
+        term_offsets = np.searchsorted(pair_terms[order], np.arange(len(terms) + 1)).astype(np.int64)
+        order = np.argsort(pair_positions, kind="stable")
+        product_terms = pair_terms[order]
+        product_term_offsets = np.searchsorted(pair_positions[order], np.arange(count + 1)).astype(np.int64)
+
+        with self._lock:
+            self._reset()
+            self.terms = terms
+            self._terms_bytes = sys.getsizeof(terms) + sum(sys.getsizeof(term) for term in terms)
+            self._categories = categories
+            self.ids = ids
+            self.rating_count = rating_count
+            self.category = category
+            self.alive = np.ones(count, dtype=bool)
+            self.title_offsets = title_offsets
+            self._titles = titles
+            self.rank = product_rank
+            self.by_rank = by_rank
+            self.term_offsets = term_offsets
+            self.postings = postings
+            self.product_term_offsets = product_term_offsets
+            self.product_terms = product_terms
+            # Los prefijos de una y dos letras son los únicos que tocan rangos enormes
+            for prefix in sorted({term[:size] for term in terms for size in (1, 2)}):
+                self._ranked_positions(prefix)
+            self._loaded(version, change_id)
+        metrics.set_gauge("autocomplete_products", count)
+        metrics.set_gauge("autocomplete_bytes", self.memory_bytes())
+        logger.info(
+            f"Índice de autocompletado cargado: {count} productos, {len(terms)} términos, "
+            f"{self.memory_bytes()} bytes (versión {version}, {(time.perf_counter() - start) * 1000:.1f} ms)"
+        )
+
+    def memory_bytes(self) -> int:
+        if np is None:
+            return 0
+        arrays = (
+            self.ids, self.rating_count, self.category, self.alive, self.title_offsets, self.rank, self.by_rank,
+            self.term_offsets, self.postings, self.product_term_offsets, self.product_terms,
+        )
+        ranked = sum(positions.nbytes for positions, _ in self._ranked.values())
+        return sum(a.nbytes for a in arrays) + len(self._titles) + self._terms_bytes + ranked
+
+    def _title(self, pos: int) -> str:
+        return self._titles[self.title_offsets[pos]:self.title_offsets[pos + 1]].decode()
+
+    def _term_range(self, token: str) -> Tuple[int, int]:
+        # Términos [lo, hi) que empiezan por el token
+        lo = bisect.bisect_left(self.terms, token)
+        return lo, bisect.bisect_left(self.terms, token + _PREFIX_END, lo)
+
+    def _ranked_positions(self, token: str, full: bool = False) -> Tuple[Any, bool]:
+        """Posiciones con algún término que empieza por el token, de más a menos valoraciones.
+
+        Devuelve también si la lista es completa: de los rangos grandes solo se
+        guarda la cabeza, que basta salvo que los filtros descarten casi todo.
+        """
+        lo, hi = self._term_range(token)
+        start, end = int(self.term_offsets[lo]), int(self.term_offsets[hi])
+        if hi - lo <= 1:
+            # Un solo término ya viene ordenado de la carga
+            return self.postings[start:end], True
+        if not full:
+            cached = self._ranked.get(token)
+            if cached is not None:
+                return cached
+        ranked = self.by_rank[np.unique(self.rank[self.postings[start:end]])]
+        if not full and end - start >= config.AUTOCOMPLETE_CACHE_MIN_POSTINGS:
+            head = ranked[:config.AUTOCOMPLETE_CACHE_DEPTH].copy()
+            self._ranked[token] = (head, len(head) == len(ranked))
+            return self._ranked[token]
+        return ranked, True
+
+    def _filter(self, positions, term_ranges: List[Tuple[int, int]]):
+        # Vectorizado: productos vivos con algún término en cada rango [lo, hi)
+        positions = positions[self.alive[positions]]
+        for lo, hi in term_ranges:
+            if not len(positions):
+                break
+            starts = self.product_term_offsets[positions]
+            lengths = self.product_term_offsets[positions + 1] - starts
+            owner = np.repeat(np.arange(len(positions)), lengths)
+            terms = self.product_terms[np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))]
+            keep = np.zeros(len(positions), dtype=bool)
+            keep[owner[(terms >= lo) & (terms < hi)]] = True
+            positions = positions[keep]
+        return positions
+
+    def _collect(self, ranked, term_ranges: List[Tuple[int, int]], limit: int) -> List[int]:
+        found: List[int] = []
+        batch = max(limit * 4, 64)
+        for start in range(0, len(ranked), batch):
+            found.extend(self._filter(ranked[start:start + batch], term_ranges).tolist())
+            if len(found) >= limit:
+                break
+        return found[:limit]
+
+    def _base_candidates(self, tokens: List[str], limit: int) -> List[Tuple[int, int, str, Optional[str]]]:
+        # El token con el rango más corto guía el recorrido; el resto se filtra con el índice directo
+        ranges = {token: self._term_range(token) for token in tokens}
+        sizes = {token: self.term_offsets[hi] - self.term_offsets[lo] for token, (lo, hi) in ranges.items()}
+        driver = min(tokens, key=lambda token: sizes[token])
+        others = [ranges[token] for token in tokens if token != driver]
+        ranked, complete = self._ranked_positions(driver)
+        found = self._collect(ranked, others, limit)
+        if len(found) < limit and not complete:
+            found = self._collect(self._ranked_positions(driver, full=True)[0], others, limit)
+        return [
+            (int(self.rating_count[pos]), int(self.ids[pos]), self._title(pos), self._categories[self.category[pos]])
+            for pos in found
+        ]
+
+    def _overlay_candidates(self, tokens: List[str]) -> List[Tuple[int, int, str, Optional[str]]]:
+        token = tokens[-1]
+        lo = bisect.bisect_left(self._overlay_terms, (token,))
+        hi = bisect.bisect_left(self._overlay_terms, (token + _PREFIX_END,), lo)
+        found = []
+        for product_id in {product_id for _, product_id in self._overlay_terms[lo:hi]}:
+            title, category, rating_count, terms = self._overlay[product_id]
+            if _matches(terms, tokens):
+                found.append((rating_count, product_id, title, category))
+        return found
+
+    def query(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Productos cuyos términos empiezan por cada palabra del prefijo, por número de valoraciones"""
+        tokens = normalize_terms(prefix)
+        if not tokens:
+            return []
+        with self._lock:
+            found = self._base_candidates(tokens, limit) + self._overlay_candidates(tokens)
+        found.sort(key=lambda item: (-item[0], item[1]))
+        return [
+            {"id": product_id, "title": title, "category": category, "ratingCount": rating_count}
+            for rating_count, product_id, title, category in found[:limit]
+        ]
+
+    def _remove_overlay(self, product_id: int):
+        entry = self._overlay.pop(product_id, None)
+        if entry is None:
+            return
+        for term in set(entry[3]):
+            pos = bisect.bisect_left(self._overlay_terms, (term, product_id))
+            if pos < len(self._overlay_terms) and self._overlay_terms[pos] == (term, product_id):
+                del self._overlay_terms[pos]
+
+    def _retire_base(self, product_id: int):
+        pos = int(np.searchsorted(self.ids, product_id))
+        if pos < len(self.ids) and self.ids[pos] == product_id:
+            self.alive[pos] = False
+
+    def _upsert(self, values: Dict[str, Any]):
+        if np is None:
+            return
+        product_id = values["id"]
+        self._retire_base(product_id)
+        self._remove_overlay(product_id)
+        terms = normalize_terms(values["title"]) + normalize_terms(values["category"])
+        self._overlay[product_id] = (values["title"], values["category"], rating_values(values["rating"])[1], terms)
+        for term in set(terms):
+            bisect.insort(self._overlay_terms, (term, product_id))
+        if len(self._overlay) > config.AUTOCOMPLETE_OVERLAY_MAX:
+            # Demasiados cambios sueltos: la próxima consulta lanza la reconstrucción
+            self._stale = True
+            self._checked_at = 0.0
+
+    def _delete(self, product_id: int):
+        if np is None:
+            return
+        self._retire_base(product_id)
+        self._remove_overlay(product_id)
+
+autocomplete_index = AutocompleteIndex()
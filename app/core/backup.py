@@ -0,0 +1,175 @@
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.core import config
+from app.core.database import DATABASE_PATH, DATABASE_PATHS
+from app.core.file_lock import file_lock
+from app.core.metrics import metrics
+
+logger = logging.getLogger("app")
+
+SNAPSHOT_SUFFIX = ".db.gz"
+
+def snapshot_prefix(db_path: str) -> str:
+    """Prefijo de los snapshots de una base: jagastore.db -> jagastore-"""
+    return f"{os.path.splitext(os.path.basename(db_path))[0]}-"
+
+def list_snapshots(backup_dir: str = config.BACKUP_DIR, db_path: str = DATABASE_PATH) -> List[str]:
+    """Snapshots disponibles de una base, del más reciente al más antiguo"""
+    if not os.path.isdir(backup_dir):
+        return []
+    prefix = snapshot_prefix(db_path)
+    names = [
+        name for name in os.listdir(backup_dir)
+        if name.startswith(prefix) and name.endswith(SNAPSHOT_SUFFIX)
+    ]
+    return [os.path.join(backup_dir, name) for name in sorted(names, reverse=True)]
+
+def _rotate(backup_dir: str, db_path: str, keep: int):
+    for old in list_snapshots(backup_dir, db_path)[keep:]:
+        os.remove(old)
+        logger.info(f"Snapshot rotado: {old}")
+
+def _copy_database(db_path: str, raw_path: str):
+    """VACUUM INTO con reintentos acotados si la base está ocupada"""
+    for attempt in range(1, config.BACKUP_MAX_ATTEMPTS + 1):
+        source = sqlite3.connect(db_path, timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000)
+        try:
+            source.execute("VACUUM INTO ?", (raw_path,))
+            return
+        except sqlite3.OperationalError as e:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+            if attempt == config.BACKUP_MAX_ATTEMPTS:
+                raise
+            metrics.inc("backup_retries_total")
+            logger.warning(f"Copia de {db_path} fallida (intento {attempt}): {e}")
+        finally:
+            source.close()
+        time.sleep(config.BACKUP_RETRY_DELAY_S)
+
+def create_snapshot(
+    db_path: str = DATABASE_PATH,
+    backup_dir: str = config.BACKUP_DIR,
+    keep: int = config.BACKUP_KEEP,
+) -> str:
+    """Copia en caliente con VACUUM INTO.
+
+    La copia se hace de una vez dentro de una transacción de lectura: con WAL
+    los escritores siguen trabajando y, a diferencia de la API de backup por
+    pasos, una escritura no obliga a empezar de nuevo. El resultado se
+    comprime y se rotan los snapshots antiguos.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    start = time.perf_counter()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    prefix = snapshot_prefix(db_path)
+    raw_path = os.path.join(backup_dir, f".{prefix}{stamp}.db")
+    final_path = os.path.join(backup_dir, f"{prefix}{stamp}{SNAPSHOT_SUFFIX}")
+
+    _copy_database(db_path, raw_path)
+
+    try:
+        with open(raw_path, "rb") as src, gzip.open(final_path + ".tmp", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(final_path + ".tmp", final_path)
+    finally:
+        os.remove(raw_path)
+
+    _rotate(backup_dir, db_path, keep)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(final_path)
+    metrics.observe("backup_duration_seconds", elapsed)
+    metrics.set_gauge("backup_last_size_bytes", size)
+    metrics.set_gauge("backup_last_timestamp", time.time())
+    logger.info(f"💾 Snapshot creado: {final_path} ({size} bytes, {elapsed * 1000:.0f} ms)")
+    return final_path
+
+def restore_latest_snapshot(
+    db_path: str = DATABASE_PATH,
+    backup_dir: str = config.BACKUP_DIR,
+) -> Optional[str]:
+    """Restaurar la base de datos desde el snapshot válido más reciente"""
+    for snapshot in list_snapshots(backup_dir, db_path):
+        tmp_path = f"{db_path}.restore"
+        try:
+            with gzip.open(snapshot, "rb") as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            check = sqlite3.connect(tmp_path)
+            try:
+                result = check.execute("PRAGMA quick_check").fetchone()[0]
+            finally:
+                check.close()
+            if result != "ok":
+                raise sqlite3.DatabaseError(result)
+        except Exception as e:
+            logger.error(f"❌ Snapshot inválido {snapshot}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+
+        # Un WAL huérfano de la base anterior corrompería la restaurada
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        os.replace(tmp_path, db_path)
+        logger.info(f"✅ Base de datos restaurada desde {snapshot}")
+        return snapshot
+    return None
+
+class BackupScheduler:
+    """Hilo que crea snapshots periódicos; solo un worker lo ejecuta a la vez"""
+
+    def __init__(self, interval_s: float = config.BACKUP_INTERVAL_S):
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="jagastore-backup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _run(self):
+        with file_lock(os.path.join(config.BACKUP_DIR, "backup.lock"), blocking=False) as acquired:
+            if not acquired:
+                logger.debug("Otro worker gestiona las copias de seguridad")
+                return
+            logger.info(f"Copias de seguridad cada {self.interval_s:.0f} s en {config.BACKUP_DIR}")
+            while not self._stop.wait(self.interval_s):
+                # Con el catálogo separado cada base tiene su propio snapshot
+                for db_path in DATABASE_PATHS:
+                    try:
+                        create_snapshot(db_path)
+                    except Exception as e:
+                        metrics.inc("backup_errors_total")
+                        logger.error(f"❌ Error creando snapshot de {db_path}: {e}")
+
+backup_scheduler: Optional[BackupScheduler] = None
+
+def start_backup_scheduler() -> Optional[BackupScheduler]:
+    """Arrancar las copias periódicas si están habilitadas"""
+    global backup_scheduler
+    if not config.BACKUP_ENABLED:
+        return None
+    backup_scheduler = BackupScheduler()
+    backup_scheduler.start()
+    return backup_scheduler
+
+def stop_backup_scheduler():
+    global backup_scheduler
+    if backup_scheduler is not None:
+        backup_scheduler.stop()
+        backup_scheduler = None
@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core import config
+from app.core.metrics import metrics
+from app.core.row_counters import adjust_counts, row_delta
+from app.core.write_queue import execute_write
+from app.models.analytics_model import ArchivedCartSales, CartSales
+from app.models.cart_model import CartItem
+
+logger = logging.getLogger("app")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived_carts (
+    id INTEGER PRIMARY KEY,
+    userId INTEGER,
+    date TEXT,
+    archivedAt TEXT NOT NULL,
+    products BLOB NOT NULL  -- JSON comprimido con zlib
+);
+CREATE INDEX IF NOT EXISTS ix_archived_carts_user ON archived_carts (userId, id);
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+    id INTEGER PRIMARY KEY,
+    report TEXT NOT NULL
+);
+"""
+
+def connect_archive(path: str = config.CART_ARCHIVE_PATH) -> sqlite3.Connection:
+    """Abrir (y crear si falta) el fichero de archivo"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _row_to_cart(row) -> Dict[str, Any]:
+    cart_id, user_id, date, archived_at, products = row
+    return {
+        "id": cart_id,
+        "userId": user_id,
+        "date": date,
+        "archivedAt": archived_at,
+        "products": json.loads(zlib.decompress(products)),
+    }
+
+def archive_carts(
+    session_factory: sessionmaker,
+    older_than_days: int = config.CART_RETENTION_DAYS,
+    chunk_size: int = config.CART_ARCHIVE_CHUNK,
+    archive_path: str = config.CART_ARCHIVE_PATH,
+) -> int:
+    """Mover al archivo los carritos sin comprar anteriores al límite, por bloques.
+
+    Cada bloque se copia primero al archivo (INSERT OR REPLACE, idempotente) y
+    después se borra de cart_items en una escritura corta; si un carrito se
+    compra entre medias, no se borra y su copia se descarta. Un corte a mitad
+    de bloque deja como mucho copias repetidas que la siguiente pasada
+    sobrescribe.
+    """
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    start = time.perf_counter()
+    archive = connect_archive(archive_path)
+    archived = 0
+    last_id = 0
+    try:
+        while True:
+            db: Session = session_factory()
+            try:
+                rows = db.execute(
+                    select(CartItem.id, CartItem.userId, CartItem.date, CartItem.products)
+                    .where(CartItem.id > last_id, CartItem.checkedOutAt.is_(None), CartItem.date < cutoff)
+                    .order_by(CartItem.id)
+                    .limit(chunk_size)
+                ).all()
+                db.rollback()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                archived_at = datetime.now().isoformat()
+                with archive:
+                    archive.executemany(
+                        "INSERT OR REPLACE INTO archived_carts (id, userId, date, archivedAt, products) VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (
+                                row.id,
+                                row.userId,
+                                row.date.isoformat() if row.date else None,
+                                archived_at,
+                                zlib.compress(json.dumps(row.products or [], separators=(",", ":")).encode()),
+                            )
+                            for row in rows
+                        ],
+                    )
+                ids = [row.id for row in rows]
+
+                def write(db: Session) -> List[int]:
+                    stmt = delete(CartItem).where(CartItem.id.in_(ids), CartItem.checkedOutAt.is_(None))
+                    deleted = db.execute(stmt.returning(CartItem.id, CartItem.userId)).all()
+                    deltas: Dict[str, int] = {}
+                    for _, user_id in deleted:
+                        for name, delta in row_delta("cart_items", -1, userId=user_id).items():
+                            deltas[name] = deltas.get(name, 0) + delta
+                    adjust_counts(db, deltas)
+                    deleted = [cart_id for cart_id, _ in deleted]
+                    # Los agregados de ventas conservan lo ya contabilizado; el estado
+                    # por carrito pasa a la tabla de archivados (la reconstrucción lo
+                    # vuelve a sumar) y un id reutilizado empieza de cero
+                    sales = db.execute(
+                        delete(CartSales)
+                        .where(CartSales.cartId.in_(deleted))
+                        .returning(CartSales.cartId, CartSales.userId, CartSales.lines)
+                    ).all()
+                    if sales:
+                        db.execute(insert(ArchivedCartSales), [
+                            {"cartId": cart_id, "userId": user_id, "lines": lines} for cart_id, user_id, lines in sales
+                        ])
+                    return deleted
+
+                deleted = set(execute_write(db, write))
+                kept = [cart_id for cart_id in ids if cart_id not in deleted]
+                if kept:
+                    with archive:
+                        archive.executemany("DELETE FROM archived_carts WHERE id = ?", [(cart_id,) for cart_id in kept])
+                archived += len(deleted)
+            finally:
+                db.close()
+    finally:
+        archive.close()
+    metrics.inc("carts_archived_total", archived)
+    logger.info(
+        f"🗄️ Carritos archivados: {archived} anteriores a {cutoff.date()} "
+        f"({(time.perf_counter() - start) * 1000:.0f} ms)"
+    )
+    return archived
+
+def get_archived_cart(cart_id: int, archive_path: str = config.CART_ARCHIVE_PATH) -> Optional[Dict[str, Any]]:
+    """Carrito archivado por id"""
+    if not os.path.exists(archive_path):
+        return None
+    archive = connect_archive(archive_path)
+    try:
+        row = archive.execute(
+            "SELECT id, userId, date, archivedAt, products FROM archived_carts WHERE id = ?", (cart_id,)
+        ).fetchone()
+    finally:
+        archive.close()
+    return _row_to_cart(row) if row else None
+
+def list_archived_carts(
+    user_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    archive_path: str = config.CART_ARCHIVE_PATH,
+) -> List[Dict[str, Any]]:
+    """Carritos archivados, opcionalmente de un usuario, ordenados por id"""
+    if not os.path.exists(archive_path):
+        return []
+    query = "SELECT id, userId, date, archivedAt, products FROM archived_carts"
+    params: list = []
+    if user_id is not None:
+        query += " WHERE userId = ?"
+        params.append(user_id)
+    query += " ORDER BY id LIMIT ? OFFSET ?"
+    params += [limit, skip]
+    archive = connect_archive(archive_path)
+    try:
+        return [_row_to_cart(row) for row in archive.execute(query, params)]
+    finally:
+        archive.close()
+
+def record_maintenance_report(report: Dict[str, Any], archive_path: str = config.CART_ARCHIVE_PATH):
+    archive = connect_archive(archive_path)
+    try:
+        with archive:
+            archive.execute("INSERT INTO maintenance_runs (report) VALUES (?)", (json.dumps(report),))
+    finally:
+        archive.close()
+
+def list_maintenance_reports(limit: int = 20, archive_path: str = config.CART_ARCHIVE_PATH) -> List[Dict[str, Any]]:
+    """Informes de mantenimiento, del más reciente al más antiguo"""
+    if not os.path.exists(archive_path):
+        return []
+    archive = connect_archive(archive_path)
+    try:
+        rows = archive.execute("SELECT report FROM maintenance_runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        archive.close()
+    return [json.loads(report) for (report,) in rows]
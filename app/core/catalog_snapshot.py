@@ -0,0 +1,385 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.core.database import SessionLocal
+from app.core.metrics import metrics
+from app.core.write_queue import after_commit
+from app.models.catalog_version_model import CatalogVersion
+from app.models.product_change_model import ProductChange
+from app.models.product_model import Product
+
+try:
+    import numpy as np
+except ImportError:  # El snapshot es opcional: sin numpy se consulta SQLite
+    np = None
+
+logger = logging.getLogger("app")
+
+SORT_FIELDS = ("id", "price", "rating", "rating_count")
+
+def bump_catalog_version(db: Session, bind_arguments: Optional[dict] = None) -> int:
+    """Incrementar la versión del catálogo en la transacción actual y devolverla"""
+    stmt = insert(CatalogVersion).values(id=1, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CatalogVersion.id],
+        set_={"version": CatalogVersion.version + 1},
+    ).returning(CatalogVersion.version)
+    return db.execute(stmt, bind_arguments=bind_arguments).scalar_one()
+
+def read_catalog_version(db: Session) -> int:
+    return db.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1)).scalar() or 0
+
+def read_catalog_position(db: Session) -> Tuple[int, int]:
+    """Versión del catálogo y último evento de product_changes, leídos en la misma transacción"""
+    version = read_catalog_version(db)
+    return version, db.execute(select(func.max(ProductChange.id))).scalar() or 0
+
+def rating_values(rating) -> tuple:
+    if isinstance(rating, dict):
+        try:
+            return float(rating.get("rate") or 0.0), int(rating.get("count") or 0)
+        except (TypeError, ValueError):
+            pass
+    return 0.0, 0
+
+class CatalogView:
+    """Estructura en memoria derivada de la tabla products y versionada con ella.
+
+    Las escrituras de productos incrementan la versión del catálogo una sola vez
+    y cada vista aplica el cambio tras el commit si es el siguiente a su
+    versión. Los cambios de otros workers los recoge sync() del registro
+    product_changes, en orden y desde el último evento visto; aplicar dos
+    veces el mismo cambio no altera el resultado. Solo si el registro no
+    alcanza (recortado o demasiado atrás) se reconstruye la vista entera, en
+    un hilo aparte mientras la copia anterior sigue respondiendo.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version: Optional[int] = None
+        # Último evento de product_changes reflejado en la vista
+        self._change_id: Optional[int] = None
+        # La vista pide una reconstrucción completa (p. ej. capa de cambios llena)
+        self._stale = False
+        self._reloading = False
+        self._checked_at = 0.0
+        _catalog_views.append(self)
+
+    @property
+    def enabled(self) -> bool:
+        raise NotImplementedError
+
+    @property
+    def available(self) -> bool:
+        return self.version is not None
+
+    def load(self, db: Session):
+        raise NotImplementedError
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+    def sync(self, db: Session):
+        """Ponerse al día si otro proceso ha modificado el catálogo (comprobación acotada en el tiempo)"""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < config.CATALOG_SNAPSHOT_SYNC_INTERVAL_S:
+            return
+        self._checked_at = now
+        if self.version is None:
+            # Sin vista que servir mientras tanto: primera carga en línea
+            self.load(db)
+            return
+        if self._stale:
+            self._reload_in_background()
+            return
+        version = read_catalog_version(db)
+        if version != self.version and not self._catch_up(db, version):
+            self._reload_in_background()
+
+    def _catch_up(self, db: Session, version: int) -> bool:
+        """Aplicar los eventos de product_changes posteriores al último visto; False si no alcanzan"""
+        if not config.PRODUCT_CHANGES_ENABLED or self._change_id is None:
+            return False
+        loaded = self.version
+        # El registro se recorta por el principio: si falta el siguiente evento, no sirve
+        oldest = db.execute(select(func.min(ProductChange.id))).scalar()
+        if oldest is None or oldest > self._change_id + 1:
+            return False
+        changes = db.execute(
+            select(ProductChange.id, ProductChange.action, ProductChange.productId, ProductChange.payload)
+            .where(ProductChange.id > self._change_id)
+            .order_by(ProductChange.id)
+            .limit(config.CATALOG_VIEW_MAX_REPLAY + 1)
+        ).all()
+        if not changes or len(changes) > config.CATALOG_VIEW_MAX_REPLAY:
+            return False
+        with self._lock:
+            if self.version != loaded:
+                # Se aplicó un cambio local mientras se leía: repetir con la vista al día
+                self._checked_at = 0.0
+                return True
+            for _, action, product_id, payload in changes:
+                if action == "deleted":
+                    self._delete(product_id)
+                elif payload is not None:
+                    self._upsert(payload)
+            # version y eventos salen del mismo snapshot de lectura
+            self.version = version
+            self._change_id = changes[-1].id
+        metrics.inc("catalog_view_catch_up_total", view=self.name)
+        metrics.inc("catalog_view_catch_up_changes_total", len(changes), view=self.name)
+        return True
+
+    def _reload_in_background(self):
+        """Reconstruir la vista en un hilo; la copia actual responde hasta el cambio"""
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+
+        def run():
+            db = SessionLocal()
+            try:
+                self.load(db)
+                metrics.inc("catalog_view_reloads_total", view=self.name)
+            except Exception as e:
+                logger.error(f"Error reconstruyendo {self.name}: {e}")
+            finally:
+                db.close()
+                self._reloading = False
+                # Lo escrito durante la reconstrucción se recoge en la siguiente consulta
+                self._checked_at = 0.0
+
+        threading.Thread(target=run, name=f"{self.name}-reload", daemon=True).start()
+
+    def _loaded(self, version: int, change_id: int):
+        # Llamar con el bloqueo tomado, al sustituir las estructuras
+        self.version = version
+        self._change_id = change_id
+        self._stale = False
+        self._checked_at = time.monotonic()
+
+    def _advance(self, version: int) -> bool:
+        # Solo se aplica un cambio si es el siguiente a la versión cargada; si
+        # no, otro worker escribió entre medias y sync() recoge ambos del registro
+        if self.version is None:
+            return False
+        if version != self.version + 1:
+            self._checked_at = 0.0
+            return False
+        self.version = version
+        return True
+
+    def apply_upsert(self, values: Dict[str, Any], version: int):
+        """Aplicar un alta o modificación de producto ya confirmada"""
+        with self._lock:
+            if self._advance(version):
+                self._upsert(values)
+
+    def apply_delete(self, product_id: int, version: int):
+        """Aplicar una baja de producto ya confirmada"""
+        with self._lock:
+            if self._advance(version):
+                self._delete(product_id)
+
+    def _upsert(self, values: Dict[str, Any]):
+        raise NotImplementedError
+
+    def _delete(self, product_id: int):
+        raise NotImplementedError
+
+_catalog_views: List[CatalogView] = []
+
+def track_catalog_write(
+    db: Session,
+    product: Optional[Product] = None,
+    deleted_id: Optional[int] = None,
+    bind_arguments: Optional[dict] = None,
+):
+    """Versionar una escritura de productos y aplicarla a las vistas en memoria tras el commit.
+
+    bind_arguments lleva la escritura por otra conexión (on_store_connection)
+    cuando el producto se modificó dentro de una transacción del carrito.
+    """
+    views = [view for view in _catalog_views if view.enabled]
+    if not views:
+        return
+    version = bump_catalog_version(db, bind_arguments)
+    if product is not None:
+        # Copia de los valores: el objeto ORM no se toca fuera de la transacción
+        values = {
+            "id": product.id, "title": product.title, "price": product.price,
+            "category": product.category, "rating": product.rating,
+        }
+        for view in views:
+            after_commit(db, lambda view=view: view.apply_upsert(values, version))
+    else:
+        for view in views:
+            after_commit(db, lambda view=view: view.apply_delete(deleted_id, version))
+
+class CatalogSnapshot(CatalogView):
+    """Copia columnar en memoria de la tabla products para filtrar y ordenar vectorizado.
+
+    Guarda solo las columnas de consulta (id, precio, rating y código de
+    categoría) en arrays de numpy ordenados por id, unas decenas de bytes por
+    producto. Las consultas devuelven ids; el servicio carga después solo
+    la página pedida. Las escrituras locales se aplican incrementalmente y las
+    de otros workers se detectan por la versión del catálogo.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.categories: List[str] = []
+        self._category_codes: Dict[str, int] = {}
+        if np is not None:
+            self._reset_columns(0)
+
+    @property
+    def enabled(self) -> bool:
+        return config.CATALOG_SNAPSHOT_ENABLED
+
+    @property
+    def available(self) -> bool:
+        return np is not None and self.version is not None
+
+    def _reset_columns(self, size: int):
+        self.ids = np.empty(size, dtype=np.int64)
+        self.price = np.empty(size, dtype=np.float64)
+        self.rating = np.empty(size, dtype=np.float32)
+        self.rating_count = np.empty(size, dtype=np.int32)
+        self.category = np.empty(size, dtype=np.int32)
+        self.alive = np.ones(size, dtype=bool)
+
+    def _category_code(self, category: Optional[str]) -> int:
+        if category is None:
+            return -1
+        code = self._category_codes.get(category)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(category)
+            self._category_codes[category] = code
+        return code
+
+    def load(self, db: Session):
+        """Construir el snapshot completo desde la tabla products"""
+        if np is None:
+            logger.warning("numpy no está instalado: snapshot del catálogo desactivado")
+            return
+        start = time.perf_counter()
+        version, change_id = read_catalog_position(db)
+        rows = db.execute(
+            select(Product.id, Product.price, Product.category, Product.rating).order_by(Product.id)
+        ).all()
+        # Se construye aparte y se sustituye de golpe: las consultas no esperan a la carga
+        fresh = CatalogSnapshot.__new__(CatalogSnapshot)
+        fresh.categories, fresh._category_codes = [], {}
+        fresh._reset_columns(len(rows))
+        for i, (product_id, price, category, rating) in enumerate(rows):
+            fresh.ids[i] = product_id
+            fresh.price[i] = price or 0.0
+            fresh.rating[i], fresh.rating_count[i] = rating_values(rating)
+            fresh.category[i] = fresh._category_code(category)
+        with self._lock:
+            self.categories, self._category_codes = fresh.categories, fresh._category_codes
+            self.ids, self.price, self.rating = fresh.ids, fresh.price, fresh.rating
+            self.rating_count, self.category, self.alive = fresh.rating_count, fresh.category, fresh.alive
+            self._loaded(version, change_id)
+        metrics.set_gauge("catalog_snapshot_products", len(rows))
+        metrics.set_gauge("catalog_snapshot_bytes", self.memory_bytes())
+        logger.info(
+            f"Snapshot del catálogo cargado: {len(rows)} productos, {self.memory_bytes()} bytes "
+            f"(versión {version}, {(time.perf_counter() - start) * 1000:.1f} ms)"
+        )
+
+    def sync(self, db: Session):
+        if np is None:
+            return
+        super().sync(db)
+
+    def memory_bytes(self) -> int:
+        if np is None:
+            return 0
+        return sum(a.nbytes for a in (self.ids, self.price, self.rating, self.rating_count, self.category, self.alive))
+
+    def _upsert(self, values: Dict[str, Any]):
+        if np is None:
+            return
+        product_id, price = values["id"], values["price"]
+        rate, count = rating_values(values["rating"])
+        code = self._category_code(values["category"])
+        pos = int(np.searchsorted(self.ids, product_id))
+        if pos < len(self.ids) and self.ids[pos] == product_id:
+            self.price[pos] = price
+            self.rating[pos] = rate
+            self.rating_count[pos] = count
+            self.category[pos] = code
+            self.alive[pos] = True
+        else:
+            self.ids = np.insert(self.ids, pos, product_id)
+            self.price = np.insert(self.price, pos, price)
+            self.rating = np.insert(self.rating, pos, rate)
+            self.rating_count = np.insert(self.rating_count, pos, count)
+            self.category = np.insert(self.category, pos, code)
+            self.alive = np.insert(self.alive, pos, True)
+
+    def _delete(self, product_id: int):
+        if np is None:
+            return
+        pos = int(np.searchsorted(self.ids, product_id))
+        if pos < len(self.ids) and self.ids[pos] == product_id:
+            self.alive[pos] = False
+
+    def query(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        sort_by: str = "id",
+        descending: bool = False,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> List[int]:
+        """Ids de los productos que cumplen el filtro, ordenados y paginados"""
+        with self._lock:
+            mask = self.alive.copy()
+            if category is not None:
+                code = self._category_codes.get(category)
+                if code is None:
+                    return []
+                mask &= self.category == code
+            if min_price is not None:
+                mask &= self.price >= min_price
+            if max_price is not None:
+                mask &= self.price <= max_price
+            if min_rating is not None:
+                mask &= self.rating >= min_rating
+
+            rows = np.flatnonzero(mask)
+            column = {
+                "id": self.ids,
+                "price": self.price,
+                "rating": self.rating,
+                "rating_count": self.rating_count,
+            }[sort_by]
+            keys = column[rows]
+            if descending:
+                keys = -keys.astype(np.float64)
+            wanted = skip + limit
+
+            # Top-k: argpartition deja los k primeros sin ordenar el resto
+            if 0 < wanted < len(rows):
+                candidates = np.argpartition(keys, wanted - 1)[:wanted]
+                rows, keys = rows[candidates], keys[candidates]
+            order = np.lexsort((self.ids[rows], keys))
+            return self.ids[rows[order]][skip:wanted].tolist()
+
+catalog_snapshot = CatalogSnapshot()
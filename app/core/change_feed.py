@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.core.database import SessionLocal
+from app.core.metrics import metrics
+from app.core.write_queue import after_commit
+from app.models.product_change_model import ProductChange
+
+logger = logging.getLogger("app")
+
+# Cada cuántos eventos se recorta el registro (borrado por rango de clave primaria)
+_TRIM_EVERY = 100
+_KEEPALIVE = b": keepalive\n\n"
+_CLOSE = None
+
+# (id de evento, bytes SSE ya serializados); id None para comentarios
+Event = Tuple[Optional[int], bytes]
+
+def record_product_change(
+    db: Session, action: str, product_id: int, payload: Optional[dict] = None, bind_arguments: Optional[dict] = None
+):
+    """Anotar un cambio de producto en la transacción actual y avisar al hub tras el commit"""
+    if not config.PRODUCT_CHANGES_ENABLED:
+        return
+    stmt = insert(ProductChange).values(productId=product_id, action=action, payload=payload)
+    event_id = db.execute(stmt.returning(ProductChange.id), bind_arguments=bind_arguments).scalar_one()
+    if event_id % _TRIM_EVERY == 0:
+        db.execute(
+            delete(ProductChange).where(ProductChange.id <= event_id - config.PRODUCT_CHANGES_LOG_SIZE),
+            bind_arguments=bind_arguments,
+        )
+    after_commit(db, change_hub.notify)
+
+def _format(change: ProductChange) -> Event:
+    data = json.dumps({"productId": change.productId, "product": change.payload}, separators=(",", ":"))
+    return change.id, f"id: {change.id}\nevent: {change.action}\ndata: {data}\n\n".encode()
+
+def _fetch_since(last_id: int, until: Optional[int] = None) -> List[Event]:
+    db = SessionLocal()
+    try:
+        query = select(ProductChange).where(ProductChange.id > last_id).order_by(ProductChange.id)
+        if until is not None:
+            query = query.where(ProductChange.id <= until)
+        return [_format(change) for change in db.scalars(query)]
+    finally:
+        db.close()
+
+def _log_bounds() -> Tuple[int, int]:
+    db = SessionLocal()
+    try:
+        oldest, latest = db.execute(select(func.min(ProductChange.id), func.max(ProductChange.id))).one()
+        return oldest or 0, latest or 0
+    finally:
+        db.close()
+
+class Subscriber:
+    def __init__(self, last_id: int):
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(config.PRODUCT_CHANGES_SUBSCRIBER_BUFFER)
+        self.last_id = last_id
+
+class ChangeHub:
+    """Difusión en proceso de los cambios del catálogo a los streams SSE.
+
+    Una única tarea del event loop lee el registro product_changes y reparte
+    cada evento, serializado una sola vez, a las colas de los suscriptores.
+    Las escrituras de este worker la despiertan al confirmarse; las de otros
+    workers se recogen con un sondeo periódico. Un suscriptor inactivo solo
+    cuesta su cola vacía: no hay temporizadores ni consultas por conexión.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_id = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def start(self):
+        """Arrancar la tarea de difusión en el event loop actual"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        _, self.last_id = await asyncio.to_thread(_log_bounds)
+        self._task = asyncio.create_task(self._pump())
+        logger.info(f"Hub de cambios del catálogo iniciado (último evento {self.last_id})")
+
+    async def stop(self):
+        """Cerrar los streams abiertos y detener la tarea de difusión"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for subscriber in list(self._subscribers):
+            self._close(subscriber)
+        logger.info("Hub de cambios del catálogo detenido")
+
+    def notify(self):
+        """Despertar la difusión; seguro desde cualquier hilo"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _close(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        metrics.set_gauge("product_changes_subscribers", len(self._subscribers))
+        # Vaciar la cola deja sitio para la marca de cierre
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(_CLOSE)
+
+    def _broadcast(self, event: Event):
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Cliente lento: se cierra su stream y reanuda con Last-Event-ID
+                metrics.inc("product_changes_dropped_subscribers_total")
+                self._close(subscriber)
+
+    async def _pump(self):
+        last_keepalive = time.monotonic()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=config.PRODUCT_CHANGES_POLL_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if self._subscribers:
+                    events = await asyncio.to_thread(_fetch_since, self.last_id)
+                    for event in events:
+                        self._broadcast(event)
+                        self.last_id = event[0]
+                    if events:
+                        metrics.inc("product_changes_events_total", len(events))
+                else:
+                    # Sin suscriptores basta con seguir la posición del registro
+                    _, latest = await asyncio.to_thread(_log_bounds)
+                    self.last_id = max(self.last_id, latest)
+            except Exception as e:
+                logger.error(f"Error leyendo el registro de cambios: {e}")
+
+            now = time.monotonic()
+            if now - last_keepalive >= config.PRODUCT_CHANGES_KEEPALIVE_S:
+                last_keepalive = now
+                self._broadcast((None, _KEEPALIVE))
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Stream SSE desde last_event_id (o desde ahora) hasta que se cierre"""
+        if len(self._subscribers) >= config.PRODUCT_CHANGES_MAX_SUBSCRIBERS:
+            raise OverflowError("Demasiados suscriptores")
+        return self._stream(last_event_id)
+
+    async def _stream(self, last_event_id: Optional[int]) -> AsyncIterator[bytes]:
+        subscriber = Subscriber(self.last_id if last_event_id is None else last_event_id)
+        backlog_until = self.last_id
+        # Registrar antes de leer el histórico: lo que llegue mientras tanto
+        # queda en la cola y los duplicados se filtran por id
+        self._subscribers.add(subscriber)
+        metrics.set_gauge("product_changes_subscribers", len(self._subscribers))
+        try:
+            yield b"retry: 3000\n\n"
+            if subscriber.last_id < backlog_until:
+                oldest, _ = await asyncio.to_thread(_log_bounds)
+                if oldest > subscriber.last_id + 1:
+                    # El registro ya no cubre la posición pedida: recargar el catálogo
+                    yield f"event: reset\ndata: {json.dumps({'oldestEventId': oldest})}\n\n".encode()
+                for event_id, data in await asyncio.to_thread(_fetch_since, subscriber.last_id, backlog_until):
+                    subscriber.last_id = event_id
+                    yield data
+            while True:
+                event = await subscriber.queue.get()
+                if event is _CLOSE:
+                    return
+                event_id, data = event
+                if event_id is not None:
+                    if event_id <= subscriber.last_id:
+                        continue
+                    subscriber.last_id = event_id
+                yield data
+        finally:
+            self._subscribers.discard(subscriber)
+            metrics.set_gauge("product_changes_subscribers", len(self._subscribers))
+
+change_hub = ChangeHub()
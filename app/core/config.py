@@ -0,0 +1,181 @@
+import os
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Leer un flag booleano de las variables de entorno"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Cola de escritura con group commit (un único escritor para SQLite)
+WRITE_QUEUE_ENABLED = _env_bool("JAGASTORE_WRITE_QUEUE", False)
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("JAGASTORE_WRITE_QUEUE_MAX_BATCH", "64"))
+WRITE_QUEUE_MAX_DELAY_MS = float(os.getenv("JAGASTORE_WRITE_QUEUE_MAX_DELAY_MS", "5"))
+WRITE_QUEUE_TIMEOUT_S = float(os.getenv("JAGASTORE_WRITE_QUEUE_TIMEOUT_S", "30"))
+
+# Servidor de producción (multiproceso)
+SERVER_HOST = os.getenv("JAGASTORE_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("JAGASTORE_PORT", "8080"))
+SERVER_WORKERS = int(os.getenv("JAGASTORE_WORKERS", str(os.cpu_count() or 1)))
+SERVER_GRACEFUL_SHUTDOWN_S = int(os.getenv("JAGASTORE_GRACEFUL_SHUTDOWN_S", "30"))
+# Proxies de confianza (IPs o CIDR separados por comas, "*" para todos): de
+# ellos se toma la IP del cliente de X-Forwarded-For. El límite por cliente
+# de la admisión usa esa IP; sin el proxy en la lista, todos comparten bucket
+SERVER_FORWARDED_ALLOW_IPS = os.getenv("JAGASTORE_FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Ajustes de SQLite aplicados a cada conexión de cada worker
+SQLITE_JOURNAL_MODE = os.getenv("JAGASTORE_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("JAGASTORE_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("JAGASTORE_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("JAGASTORE_SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_MMAP_SIZE = int(os.getenv("JAGASTORE_SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+
+# Catálogo (productos, versión y registro de cambios) en su propio fichero SQLite
+# (opt-in): las escrituras de carritos y las del catálogo dejan de compartir el
+# bloqueo de escritura, a cambio de que la compra (carrito + stock) solo sea
+# atómica por fichero ante una caída y de un ATTACH en cada conexión. Vacío
+# guarda todo en la base principal
+CATALOG_DB_PATH = os.getenv("JAGASTORE_CATALOG_DB_PATH", "")
+
+# Stock de los productos que ya existían al añadir la columna y de los cargados por fill_db
+PRODUCT_INITIAL_STOCK = int(os.getenv("JAGASTORE_PRODUCT_INITIAL_STOCK", "100"))
+
+# Calentamiento antes de aceptar tráfico
+WARMUP_ENABLED = _env_bool("JAGASTORE_WARMUP", True)
+WARMUP_CONNECTIONS = int(os.getenv("JAGASTORE_WARMUP_CONNECTIONS", "4"))
+
+# Control de admisión y descarte de carga
+ADMISSION_ENABLED = _env_bool("JAGASTORE_ADMISSION", True)
+ADMISSION_METHODS = os.getenv("JAGASTORE_ADMISSION_METHODS", "POST,PUT,PATCH,DELETE")
+# Concurrencia máxima por prefijo de ruta: "/carts=8,/products=4"
+ADMISSION_ROUTE_LIMITS = os.getenv("JAGASTORE_ADMISSION_ROUTE_LIMITS", "/carts=8,/products=4,/users=4")
+ADMISSION_QUEUE_THRESHOLD = int(os.getenv("JAGASTORE_ADMISSION_QUEUE_THRESHOLD", "32"))
+ADMISSION_MAX_WAIT_S = float(os.getenv("JAGASTORE_ADMISSION_MAX_WAIT_S", "2"))
+# Token bucket por cliente (peticiones/segundo y ráfaga); 0 lo desactiva. Se
+# activa junto con JAGASTORE_FORWARDED_ALLOW_IPS si hay un proxy delante
+ADMISSION_CLIENT_RATE = float(os.getenv("JAGASTORE_ADMISSION_CLIENT_RATE", "0"))
+ADMISSION_CLIENT_BURST = float(os.getenv("JAGASTORE_ADMISSION_CLIENT_BURST", "40"))
+ADMISSION_MAX_CLIENTS = int(os.getenv("JAGASTORE_ADMISSION_MAX_CLIENTS", "10000"))
+
+# Coalescencia single-flight de lecturas calientes
+SINGLEFLIGHT_MAX_WAITERS = int(os.getenv("JAGASTORE_SINGLEFLIGHT_MAX_WAITERS", "1000"))
+SINGLEFLIGHT_WAIT_TIMEOUT_S = float(os.getenv("JAGASTORE_SINGLEFLIGHT_WAIT_TIMEOUT_S", "5"))
+
+# Copias de seguridad en caliente de SQLite
+BACKUP_ENABLED = _env_bool("JAGASTORE_BACKUP", True)
+BACKUP_DIR = os.getenv("JAGASTORE_BACKUP_DIR", "app/backups")
+BACKUP_INTERVAL_S = float(os.getenv("JAGASTORE_BACKUP_INTERVAL_S", "3600"))
+BACKUP_KEEP = int(os.getenv("JAGASTORE_BACKUP_KEEP", "7"))
+# Intentos de copia si SQLite devuelve ocupado; después se espera a la siguiente pasada
+BACKUP_MAX_ATTEMPTS = int(os.getenv("JAGASTORE_BACKUP_MAX_ATTEMPTS", "3"))
+BACKUP_RETRY_DELAY_S = float(os.getenv("JAGASTORE_BACKUP_RETRY_DELAY_S", "1"))
+
+# Administración: token para las rutas /admin (vacío las desactiva)
+ADMIN_TOKEN = os.getenv("JAGASTORE_ADMIN_TOKEN", "")
+
+# Autenticación con JWT firmados (HS256). Sin secreto se genera una clave en
+# AUTH_JWT_KEY_PATH, compartida por todos los workers
+AUTH_JWT_SECRET = os.getenv("JAGASTORE_JWT_SECRET", "")
+AUTH_JWT_KEY_PATH = os.getenv("JAGASTORE_JWT_KEY_PATH", "app/core/jwt.key")
+AUTH_JWT_ISSUER = os.getenv("JAGASTORE_JWT_ISSUER", "jagastore")
+AUTH_JWT_AUDIENCE = os.getenv("JAGASTORE_JWT_AUDIENCE", "jagastore-api")
+AUTH_JWT_LEEWAY_S = int(os.getenv("JAGASTORE_JWT_LEEWAY_S", "30"))
+AUTH_TOKEN_TTL_S = int(os.getenv("JAGASTORE_TOKEN_TTL_S", "3600"))
+# Tokens ya verificados que se conservan por worker
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("JAGASTORE_TOKEN_CACHE_SIZE", "10000"))
+# Exigir token en las rutas de escritura de usuarios y carritos
+AUTH_REQUIRED = _env_bool("JAGASTORE_AUTH_REQUIRED", False)
+# Hashing scrypt en un pool de procesos por worker (0 = en el propio hilo)
+AUTH_HASH_WORKERS = int(os.getenv("JAGASTORE_AUTH_HASH_WORKERS", "2"))
+AUTH_HASH_MAX_PENDING = int(os.getenv("JAGASTORE_AUTH_HASH_MAX_PENDING", "64"))
+AUTH_SCRYPT_N = int(os.getenv("JAGASTORE_AUTH_SCRYPT_N", str(2 ** 14)))
+AUTH_SCRYPT_R = int(os.getenv("JAGASTORE_AUTH_SCRYPT_R", "8"))
+AUTH_SCRYPT_P = int(os.getenv("JAGASTORE_AUTH_SCRYPT_P", "1"))
+
+# Profiler por petición (opt-in; desactivado no añade ningún coste)
+PROFILER_ENABLED = _env_bool("JAGASTORE_PROFILER", False)
+PROFILER_TOKEN = os.getenv("JAGASTORE_PROFILER_TOKEN", "")
+PROFILER_SAMPLE_RATE = float(os.getenv("JAGASTORE_PROFILER_SAMPLE_RATE", "0"))
+PROFILER_DIR = os.getenv("JAGASTORE_PROFILER_DIR", "app/logs/profiles")
+PROFILER_KEEP = int(os.getenv("JAGASTORE_PROFILER_KEEP", "50"))
+
+# Trazas por petición: spans de controlador, servicio y SQL exportados en OTLP/JSON
+TRACING_ENABLED = _env_bool("JAGASTORE_TRACING", True)
+# Muestreo en cabecera; una traceparent entrante impone su propia decisión
+TRACING_SAMPLE_RATE = float(os.getenv("JAGASTORE_TRACING_SAMPLE_RATE", "0.01"))
+TRACING_EXPORT_PATH = os.getenv("JAGASTORE_TRACING_EXPORT_PATH", "app/logs/traces.jsonl")
+TRACING_EXPORT_BATCH = int(os.getenv("JAGASTORE_TRACING_EXPORT_BATCH", "512"))
+TRACING_EXPORT_INTERVAL_S = float(os.getenv("JAGASTORE_TRACING_EXPORT_INTERVAL_S", "2"))
+TRACING_EXPORT_MAX_BYTES = int(os.getenv("JAGASTORE_TRACING_EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+# Spans pendientes de exportar antes de descartar, y spans por traza
+TRACING_QUEUE_SIZE = int(os.getenv("JAGASTORE_TRACING_QUEUE_SIZE", "8192"))
+TRACING_MAX_SPANS_PER_TRACE = int(os.getenv("JAGASTORE_TRACING_MAX_SPANS_PER_TRACE", "1000"))
+TRACING_SQL_MAX_LENGTH = int(os.getenv("JAGASTORE_TRACING_SQL_MAX_LENGTH", "1000"))
+
+# Snapshot columnar del catálogo en memoria (requiere numpy)
+CATALOG_SNAPSHOT_ENABLED = _env_bool("JAGASTORE_CATALOG_SNAPSHOT", False)
+CATALOG_SNAPSHOT_SYNC_INTERVAL_S = float(os.getenv("JAGASTORE_CATALOG_SNAPSHOT_SYNC_INTERVAL_S", "1"))
+# Eventos de product_changes que una vista en memoria aplica para ponerse al
+# día con otros workers; con más atraso se reconstruye en segundo plano
+CATALOG_VIEW_MAX_REPLAY = int(os.getenv("JAGASTORE_CATALOG_VIEW_MAX_REPLAY", "5000"))
+
+# Stream SSE de cambios del catálogo (GET /products/changes)
+PRODUCT_CHANGES_ENABLED = _env_bool("JAGASTORE_PRODUCT_CHANGES", True)
+# Eventos conservados para reanudar con Last-Event-ID
+PRODUCT_CHANGES_LOG_SIZE = int(os.getenv("JAGASTORE_PRODUCT_CHANGES_LOG_SIZE", "10000"))
+# Sondeo del registro para recoger los cambios de otros workers
+PRODUCT_CHANGES_POLL_INTERVAL_S = float(os.getenv("JAGASTORE_PRODUCT_CHANGES_POLL_INTERVAL_S", "1"))
+PRODUCT_CHANGES_KEEPALIVE_S = float(os.getenv("JAGASTORE_PRODUCT_CHANGES_KEEPALIVE_S", "15"))
+# Eventos pendientes por suscriptor antes de cerrar su stream por lento
+PRODUCT_CHANGES_SUBSCRIBER_BUFFER = int(os.getenv("JAGASTORE_PRODUCT_CHANGES_SUBSCRIBER_BUFFER", "256"))
+PRODUCT_CHANGES_MAX_SUBSCRIBERS = int(os.getenv("JAGASTORE_PRODUCT_CHANGES_MAX_SUBSCRIBERS", "10000"))
+
+# Trabajos en segundo plano persistidos en la tabla jobs
+JOBS_ENABLED = _env_bool("JAGASTORE_JOBS", True)
+JOBS_WORKERS = int(os.getenv("JAGASTORE_JOBS_WORKERS", "2"))
+JOBS_POLL_INTERVAL_S = float(os.getenv("JAGASTORE_JOBS_POLL_INTERVAL_S", "1"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JAGASTORE_JOBS_MAX_ATTEMPTS", "5"))
+# Reintentos con backoff exponencial: base * 2^(intento - 1), con tope
+JOBS_BACKOFF_BASE_S = float(os.getenv("JAGASTORE_JOBS_BACKOFF_BASE_S", "1"))
+JOBS_BACKOFF_MAX_S = float(os.getenv("JAGASTORE_JOBS_BACKOFF_MAX_S", "300"))
+# Un trabajo en ejecución más tiempo que esto se da por abandonado (worker caído)
+JOBS_LEASE_S = float(os.getenv("JAGASTORE_JOBS_LEASE_S", "600"))
+# Tiempo que se conservan los trabajos terminados
+JOBS_RETENTION_S = float(os.getenv("JAGASTORE_JOBS_RETENTION_S", "86400"))
+
+# Retención de carritos: los abandonados más antiguos se mueven al archivo comprimido
+CART_RETENTION_DAYS = int(os.getenv("JAGASTORE_CART_RETENTION_DAYS", "90"))
+CART_ARCHIVE_PATH = os.getenv("JAGASTORE_CART_ARCHIVE_PATH", "app/core/cart_archive.db")
+CART_ARCHIVE_CHUNK = int(os.getenv("JAGASTORE_CART_ARCHIVE_CHUNK", "500"))
+
+# Mantenimiento programado: archivado, ANALYZE y VACUUM incremental
+MAINTENANCE_ENABLED = _env_bool("JAGASTORE_MAINTENANCE", False)
+MAINTENANCE_INTERVAL_S = float(os.getenv("JAGASTORE_MAINTENANCE_INTERVAL_S", "86400"))
+# Páginas libres a devolver por ejecución (0 = todas)
+MAINTENANCE_VACUUM_PAGES = int(os.getenv("JAGASTORE_MAINTENANCE_VACUUM_PAGES", "0"))
+
+# Contadores de filas para X-Total-Count: reconciliación periódica con COUNT(*) real
+ROW_COUNTERS_RECONCILE_INTERVAL_S = float(os.getenv("JAGASTORE_ROW_COUNTERS_RECONCILE_INTERVAL_S", "3600"))
+
+# Índice en memoria de emails y nombres de usuario (filtro de Bloom + set) para el registro
+USER_INDEX_ENABLED = _env_bool("JAGASTORE_USER_INDEX", True)
+USER_INDEX_FALSE_POSITIVE_RATE = float(os.getenv("JAGASTORE_USER_INDEX_FALSE_POSITIVE_RATE", "0.01"))
+
+# Radio máximo de GET /users/nearby: escala de reparto, no de país. Con radios
+# mayores la caja del R*Tree abarca casi todos los usuarios y la búsqueda es
+# un recorrido completo con haversine por fila
+USERS_NEARBY_MAX_RADIUS_KM = float(os.getenv("JAGASTORE_USERS_NEARBY_MAX_RADIUS_KM", "200"))
+
+# Recomendaciones "comprados juntos": vecinos precalculados por producto
+RECOMMENDATIONS_TOP_K = int(os.getenv("JAGASTORE_RECOMMENDATIONS_TOP_K", "20"))
+# Carritos leídos por bloque en la reconstrucción completa de la matriz
+RECOMMENDATIONS_BUILD_CHUNK = int(os.getenv("JAGASTORE_RECOMMENDATIONS_BUILD_CHUNK", "5000"))
+
+# Autocompletado de productos (GET /products/autocomplete) con índice de prefijos en memoria
+AUTOCOMPLETE_ENABLED = _env_bool("JAGASTORE_AUTOCOMPLETE", True)
+AUTOCOMPLETE_MAX_LIMIT = int(os.getenv("JAGASTORE_AUTOCOMPLETE_MAX_LIMIT", "50"))
+# Prefijos con al menos estas entradas guardan su cabeza ya ordenada
+AUTOCOMPLETE_CACHE_MIN_POSTINGS = int(os.getenv("JAGASTORE_AUTOCOMPLETE_CACHE_MIN_POSTINGS", "2000"))
+AUTOCOMPLETE_CACHE_DEPTH = int(os.getenv("JAGASTORE_AUTOCOMPLETE_CACHE_DEPTH", "1000"))
+# Productos modificados desde la última carga antes de reconstruir el índice
+AUTOCOMPLETE_OVERLAY_MAX = int(os.getenv("JAGASTORE_AUTOCOMPLETE_OVERLAY_MAX", "10000"))
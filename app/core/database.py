@@ -1,18 +1,171 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app/core/jagastore.db"
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
+from app.core import config
+from app.core.tracing import instrument_engine, instrument_sessions
+from app.models.cart_model import CartItem
+from app.models.catalog_version_model import CatalogVersion
+from app.models.product_change_model import ProductChange
+from app.models.product_model import Product
+from app.models.row_counter_model import CatalogRowCounter
+
+# Base principal: usuarios, carritos, trabajos y analítica
+DATABASE_PATH = "app/core/jagastore.db"
+SQLALCHEMY_DATABASE_URL = f"sqlite:///./{DATABASE_PATH}"
+
+# Base del catálogo; si coincide con la principal todo vive en un solo fichero.
+# Las instalaciones que ya separaron el catálogo cuando era la opción por
+# defecto lo siguen usando: su base principal ya no tiene los productos
+_LEGACY_CATALOG_PATH = "app/core/catalog.db"
+CATALOG_DATABASE_PATH = config.CATALOG_DB_PATH or (
+    _LEGACY_CATALOG_PATH if os.path.exists(_LEGACY_CATALOG_PATH) else DATABASE_PATH
 )
+CATALOG_SPLIT = os.path.abspath(CATALOG_DATABASE_PATH) != os.path.abspath(DATABASE_PATH)
+# Nombre con el que las conexiones de la base principal ven el catálogo (ATTACH)
+CATALOG_SCHEMA = "catalog"
+# Ficheros que hay que copiar, restaurar y compactar
+DATABASE_PATHS = [DATABASE_PATH, CATALOG_DATABASE_PATH] if CATALOG_SPLIT else [DATABASE_PATH]
+
+# Modelos que viven en la base del catálogo; el resto va a la principal
+CATALOG_MODELS = (Product, CatalogVersion, ProductChange, CatalogRowCounter)
+
+# Sentencia con la que se abren las transacciones en el contexto actual
+_begin_statement: ContextVar[str] = ContextVar("jagastore_sqlite_begin", default="BEGIN")
+
+@contextmanager
+def immediate_transactions():
+    """Abrir con BEGIN IMMEDIATE las transacciones que empiecen dentro del bloque.
+
+    Una transacción diferida que lee y después escribe tiene que promocionar
+    su bloqueo, y si otra conexión está escribiendo SQLite falla al momento con
+    SQLITE_BUSY: busy_timeout no se aplica a esa promoción. Con IMMEDIATE el
+    bloqueo de escritura se espera (con busy_timeout) al abrir la transacción.
+    """
+    token = _begin_statement.set("BEGIN IMMEDIATE")
+    try:
+        yield
+    finally:
+        _begin_statement.reset(token)
+
+def create_sqlite_engine(url: str, **engine_options) -> Engine:
+    """Crear un engine SQLite con transacciones gestionadas por SQLAlchemy"""
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        **engine_options
+    )
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _configure_connection(dbapi_connection, connection_record):
+        # pysqlite gestiona BEGIN por su cuenta y rompe los SAVEPOINT;
+        # dejamos que sea SQLAlchemy quien abra las transacciones
+        dbapi_connection.isolation_level = None
+
+        # Ajustes por conexión: cada worker abre las suyas al arrancar
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        # Solo surte efecto en bases nuevas; las existentes se convierten en el mantenimiento
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.close()
+
+    @event.listens_for(sqlite_engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql(_begin_statement.get())
+
+    if config.TRACING_ENABLED:
+        instrument_engine(sqlite_engine, os.path.splitext(os.path.basename(make_url(url).database or "memory"))[0])
+        instrument_sessions()
+
+    return sqlite_engine
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def attach_catalog(store_engine: Engine, catalog_path: str):
+    """Adjuntar la base del catálogo a cada conexión de la base principal.
+
+    Los nombres de tabla sin esquema se resuelven primero en main y después
+    en las bases adjuntas, así que el SQL de siempre (products, ...) funciona
+    igual en estas conexiones mientras main no tenga su propia copia.
+    """
+    @event.listens_for(store_engine, "connect")
+    def _attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE ? AS {CATALOG_SCHEMA}", (catalog_path,))
+        # journal_mode y synchronous son por base: la adjunta no hereda los de main
+        cursor.execute(f"PRAGMA {CATALOG_SCHEMA}.journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA {CATALOG_SCHEMA}.synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.close()
+
+def create_session_factory(store_engine: Engine, catalog_engine: Engine) -> sessionmaker:
+    """Sesiones que envían cada modelo a su base sin que los servicios lo sepan"""
+    # Las escrituras construyen la respuesta con lo devuelto por RETURNING; sin
+    # expire_on_commit, leer el objeto tras el commit no relanza un SELECT
+    return sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=store_engine,
+        binds={model: catalog_engine for model in CATALOG_MODELS},
+    )
+
+def on_store_connection(db: Session) -> Dict[str, Any]:
+    """bind_arguments para ejecutar una sentencia del catálogo en la conexión de la base principal.
+
+    Esa conexión ve el catálogo por ATTACH: la sentencia entra en la misma
+    transacción que las escrituras de carritos y no abre una segunda conexión.
+    """
+    return {"bind": db.get_bind(CartItem)}
+
+engine = create_sqlite_engine(SQLALCHEMY_DATABASE_URL)
+catalog_engine = engine
+if CATALOG_SPLIT:
+    catalog_engine = create_sqlite_engine(f"sqlite:///{CATALOG_DATABASE_PATH}")
+    attach_catalog(engine, CATALOG_DATABASE_PATH)
+
+SessionLocal = create_session_factory(engine, catalog_engine)
+
+def create_dedicated_session_factory(connections: int) -> sessionmaker:
+    """Sesiones con engines propios, fuera del pool de las peticiones.
+
+    Para los hilos de fondo de los que dependen las peticiones (escritor de la
+    cola, trabajos): un handler que espera a la cola conserva su conexión del
+    pool, y si el escritor sacara la suya del mismo pool podría no quedar
+    ninguna libre. Como mucho `connections` conexiones por base.
+    """
+    options = {"pool_size": connections, "max_overflow": 0}
+    store_engine = create_sqlite_engine(SQLALCHEMY_DATABASE_URL, **options)
+    dedicated_catalog_engine = store_engine
+    if CATALOG_SPLIT:
+        dedicated_catalog_engine = create_sqlite_engine(f"sqlite:///{CATALOG_DATABASE_PATH}", **options)
+        attach_catalog(store_engine, CATALOG_DATABASE_PATH)
+    return create_session_factory(store_engine, dedicated_catalog_engine)
+
+@contextmanager
+def count_statements(bind: Engine = engine):
+    """Registrar las sentencias SQL que se envían al engine dentro del bloque"""
+    statements: List[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", _record)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,33 @@
+import logging
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger("app")
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """Bloqueo exclusivo entre procesos basado en un fichero.
+
+    Devuelve True si se obtuvo el bloqueo. Con blocking=False no espera y
+    devuelve False si otro proceso ya lo tiene.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as handle:
+        if fcntl is None:
+            yield True
+            return
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(handle.fileno(), flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
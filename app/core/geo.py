@@ -0,0 +1,82 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import column, table
+
+EARTH_RADIUS_KM = 6371.0088
+# Kilómetros por grado de latitud (y de longitud en el ecuador)
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Índice R*Tree de la posición de cada usuario (cajas degeneradas: min = max).
+# Lo mantienen los triggers sobre users, así que cualquier vía de escritura
+# (servicios, fill_db, cargas masivas) lo deja coherente en la misma transacción
+users_geo = table("users_geo", column("id"), column("min_lat"), column("max_lat"), column("min_long"), column("max_long"))
+
+SPATIAL_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_geo USING rtree(id, min_lat, max_lat, min_long, max_long)",
+    """
+    CREATE TRIGGER IF NOT EXISTS users_geo_insert AFTER INSERT ON users
+    WHEN NEW.lat IS NOT NULL AND NEW.long IS NOT NULL
+    BEGIN
+        INSERT INTO users_geo VALUES (NEW.id, NEW.lat, NEW.lat, NEW.long, NEW.long);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_geo_update AFTER UPDATE OF lat, long ON users
+    BEGIN
+        DELETE FROM users_geo WHERE id = OLD.id;
+        INSERT INTO users_geo SELECT NEW.id, NEW.lat, NEW.lat, NEW.long, NEW.long
+        WHERE NEW.lat IS NOT NULL AND NEW.long IS NOT NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_geo_delete AFTER DELETE ON users
+    BEGIN
+        DELETE FROM users_geo WHERE id = OLD.id;
+    END
+    """,
+]
+
+def geo_columns(address: Optional[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    """Columnas numéricas lat/long a partir de address.geolocation (guardado como texto)"""
+    geolocation = (address or {}).get("geolocation") or {}
+    try:
+        lat, long = float(geolocation["lat"]), float(geolocation["long"])
+    except (KeyError, TypeError, ValueError):
+        return {"lat": None, "long": None}
+    if not (-90 <= lat <= 90 and -180 <= long <= 180):
+        return {"lat": None, "long": None}
+    return {"lat": lat, "long": long}
+
+def haversine_km(lat1: float, long1: float, lat2: float, long2: float) -> float:
+    """Distancia de círculo máximo en kilómetros"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(long2 - long1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def radius_boxes(lat: float, long: float, radius_km: float) -> List[Tuple[float, float, float, float]]:
+    """Cajas (min_lat, max_lat, min_long, max_long) que contienen el círculo dado.
+
+    Si el círculo cruza el antimeridiano se parte en dos cajas; si alcanza un
+    polo cubre todas las longitudes.
+    """
+    delta_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, lat - delta_lat), min(90.0, lat + delta_lat)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if min_lat <= -90 or max_lat >= 90 or cos_lat <= 0 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+    delta_long = radius_km / (KM_PER_DEGREE * cos_lat)
+    min_long, max_long = long - delta_long, long + delta_long
+    if min_long < -180:
+        return [(min_lat, max_lat, min_long + 360, 180.0), (min_lat, max_lat, -180.0, max_long)]
+    if max_long > 180:
+        return [(min_lat, max_lat, min_long, 180.0), (min_lat, max_lat, -180.0, max_long - 360)]
+    return [(min_lat, max_lat, min_long, max_long)]
+
+def box_condition(min_lat: float, max_lat: float, min_long: float, max_long: float):
+    """Condición sobre users_geo: posiciones dentro de la caja (el R*Tree la resuelve por índice)"""
+    return (
+        (users_geo.c.max_lat >= min_lat) & (users_geo.c.min_lat <= max_lat)
+        & (users_geo.c.max_long >= min_long) & (users_geo.c.min_long <= max_long)
+    )
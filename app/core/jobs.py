@@ -0,0 +1,282 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, aliased, sessionmaker
+
+from app.core import config
+from app.core.database import immediate_transactions
+from app.core.metrics import metrics
+from app.core.write_queue import after_commit
+from app.models.job_model import Job
+
+logger = logging.getLogger("app")
+
+# Un manejador recibe una sesión propia y el payload, y devuelve un resultado serializable
+JobHandler = Callable[[Session, Dict[str, Any]], Any]
+
+_handlers: Dict[str, JobHandler] = {}
+
+class PermanentJobError(Exception):
+    """Fallo que no se resuelve reintentando; el trabajo pasa directamente a failed"""
+
+    def __init__(self, message: str, result: Any = None):
+        super().__init__(message)
+        self.result = result
+
+def job_handler(kind: str):
+    """Registrar el manejador de un tipo de trabajo"""
+    def decorator(fn: JobHandler) -> JobHandler:
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None,
+    max_attempts: Optional[int] = None,
+    only_if=None,
+) -> Optional[int]:
+    """Encolar un trabajo en la transacción actual; solo existe si la escritura se confirma.
+
+    Con only_if el trabajo solo se inserta si se cumple la condición, en la
+    misma sentencia (INSERT ... SELECT ... WHERE); si no, devuelve None
+    """
+    now = datetime.now()
+    values = dict(
+        kind=kind,
+        payload=payload or {},
+        status="queued",
+        attempts=0,
+        maxAttempts=max_attempts or config.JOBS_MAX_ATTEMPTS,
+        runAt=now,
+        createdAt=now,
+    )
+    if only_if is None:
+        stmt = insert(Job).values(**values)
+    else:
+        columns = Job.__table__.c
+        row = select(*(literal(value, columns[name].type) for name, value in values.items())).where(only_if)
+        stmt = insert(Job).from_select(list(values), row)
+    job_id = db.execute(stmt.returning(Job.id)).scalar()
+    if job_id is not None:
+        after_commit(db, notify_job_workers)
+    return job_id
+
+def _is_busy(error: Exception) -> bool:
+    """SQLITE_BUSY o SQLITE_LOCKED: otra conexión tenía el bloqueo, el trabajo no ha fallado"""
+    if not isinstance(error, OperationalError):
+        return False
+    return (getattr(error.orig, "sqlite_errorcode", 0) & 0xFF) in (5, 6)
+
+def _backoff(attempts: int) -> float:
+    delay = min(config.JOBS_BACKOFF_BASE_S * 2 ** (attempts - 1), config.JOBS_BACKOFF_MAX_S)
+    # Jitter para que los reintentos de un mismo fallo no lleguen a la vez
+    return delay * random.uniform(0.5, 1.0)
+
+class JobWorkerPool:
+    """Hilos que reclaman y ejecutan los trabajos de la tabla jobs.
+
+    El reclamo es un UPDATE condicional sobre el siguiente trabajo pendiente,
+    así que varios hilos y varios procesos pueden compartir la cola sin
+    ejecutar dos veces el mismo trabajo. Los fallos se reintentan con backoff
+    exponencial hasta maxAttempts; un trabajo en ejecución que supera el lease
+    (proceso caído) vuelve a la cola.
+    """
+
+    def __init__(self, session_factory: sessionmaker, workers: int = config.JOBS_WORKERS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._maintenance_lock = threading.Lock()
+        self._maintained_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        """Arrancar los hilos del pool"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"jagastore-jobs-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Pool de trabajos iniciado ({self.workers} hilos)")
+
+    def stop(self, timeout: float = 10.0):
+        """Detener los hilos cuando terminen el trabajo en curso"""
+        if not self._threads:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        logger.info("Pool de trabajos detenido")
+
+    def notify(self):
+        """Avisar de que hay trabajos nuevos"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._maintain()
+                job = self._claim()
+            except Exception as e:
+                logger.error(f"Error reclamando trabajos: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(config.JOBS_POLL_INTERVAL_S)
+                self._wakeup.clear()
+                continue
+            self._execute(job)
+
+    def _claim(self) -> Optional[Job]:
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            now = datetime.now()
+            # Alias para que la subconsulta no se correlacione con la tabla del UPDATE
+            pending = aliased(Job)
+            next_job = (
+                select(pending.id)
+                .where(pending.status == "queued", pending.runAt <= now)
+                .order_by(pending.runAt, pending.id)
+                .limit(1)
+                .scalar_subquery()
+            )
+            stmt = (
+                update(Job)
+                .where(Job.id == next_job, Job.status == "queued")
+                .values(status="running", startedAt=now, attempts=Job.attempts + 1)
+                .returning(Job)
+                .execution_options(synchronize_session=False)
+            )
+            job = db.scalars(stmt).first()
+            db.commit()
+            return job
+        finally:
+            db.close()
+
+    def _execute(self, job: Job):
+        handler = _handlers.get(job.kind)
+        metrics.observe("jobs_wait_seconds", (job.startedAt - job.createdAt).total_seconds(), kind=job.kind)
+        db = self.session_factory()
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise PermanentJobError(f"Tipo de trabajo desconocido: {job.kind}")
+            # BEGIN IMMEDIATE: los manejadores leen y después escriben, y una
+            # transacción diferida fallaría al promocionar con otra escritura en curso
+            with immediate_transactions():
+                result = handler(db, job.payload or {})
+                # Los efectos del manejador y el estado done se confirman juntos
+                db.execute(
+                    update(Job)
+                    .where(Job.id == job.id)
+                    .values(status="done", finishedAt=datetime.now(), result=result, lastError=None)
+                )
+                db.commit()
+            status = "done"
+        except Exception as e:
+            db.rollback()
+            permanent = isinstance(e, PermanentJobError)
+            if _is_busy(e):
+                # Base ocupada más allá de busy_timeout: vuelve a la cola sin gastar intento
+                status = "retry"
+                delay = _backoff(1)
+                values = dict(status="queued", attempts=Job.attempts - 1,
+                              runAt=datetime.now() + timedelta(seconds=delay), lastError=str(e))
+                logger.warning(f"Trabajo {job.id} ({job.kind}) con la base ocupada, reintentará en {delay:.1f} s")
+            elif permanent or job.attempts >= job.maxAttempts:
+                status = "failed"
+                values = dict(status="failed", finishedAt=datetime.now(), lastError=str(e),
+                              result=e.result if permanent else None)
+                logger.error(f"Trabajo {job.id} ({job.kind}) fallido tras {job.attempts} intentos: {e}")
+            else:
+                status = "retry"
+                delay = _backoff(job.attempts)
+                values = dict(status="queued", runAt=datetime.now() + timedelta(seconds=delay), lastError=str(e))
+                logger.warning(f"Trabajo {job.id} ({job.kind}) reintentará en {delay:.1f} s: {e}")
+            try:
+                db.execute(update(Job).where(Job.id == job.id).values(**values))
+                db.commit()
+            except Exception as update_error:
+                # Si ni siquiera se puede anotar, el lease lo devolverá a la cola
+                logger.error(f"Error actualizando trabajo {job.id}: {update_error}")
+                db.rollback()
+        finally:
+            db.close()
+        metrics.observe("jobs_run_seconds", time.perf_counter() - start, kind=job.kind)
+        metrics.inc("jobs_processed_total", kind=job.kind, status=status)
+
+    def _maintain(self):
+        # Tareas periódicas compartidas: solo un hilo las ejecuta en cada intervalo
+        now = time.monotonic()
+        if now - self._maintained_at < config.JOBS_POLL_INTERVAL_S or not self._maintenance_lock.acquire(blocking=False):
+            return
+        try:
+            self._maintained_at = now
+            db = self.session_factory()
+            try:
+                current = datetime.now()
+                recovered = db.execute(
+                    update(Job)
+                    .where(Job.status == "running", Job.startedAt < current - timedelta(seconds=config.JOBS_LEASE_S))
+                    .values(status="queued", runAt=current, lastError="Lease expirado")
+                ).rowcount
+                purged = db.execute(
+                    delete(Job).where(
+                        Job.status.in_(("done", "failed")),
+                        Job.finishedAt < current - timedelta(seconds=config.JOBS_RETENTION_S),
+                    )
+                ).rowcount
+                db.commit()
+                if recovered:
+                    logger.warning(f"{recovered} trabajos abandonados devueltos a la cola")
+                if purged:
+                    logger.info(f"{purged} trabajos terminados eliminados")
+                depth = db.execute(select(func.count()).select_from(Job).where(Job.status == "queued")).scalar()
+                metrics.set_gauge("jobs_queue_depth", depth)
+            finally:
+                db.close()
+        finally:
+            self._maintenance_lock.release()
+
+# Instancia global, solo activa si JAGASTORE_JOBS está habilitado
+job_pool: Optional[JobWorkerPool] = None
+
+def start_job_workers(session_factory: sessionmaker) -> Optional[JobWorkerPool]:
+    """Crear y arrancar el pool global si está habilitado por configuración"""
+    global job_pool
+    if not config.JOBS_ENABLED:
+        return None
+    if job_pool is None:
+        job_pool = JobWorkerPool(session_factory)
+    job_pool.start()
+    return job_pool
+
+def stop_job_workers():
+    """Detener el pool global"""
+    global job_pool
+    if job_pool is not None:
+        job_pool.stop()
+        job_pool = None
+
+def notify_job_workers():
+    """Despertar al pool global tras encolar trabajos"""
+    if job_pool is not None:
+        job_pool.notify()
@@ -2,6 +2,8 @@ import logging
 import os
 from logging.handlers import RotatingFileHandler
 
+from app.core.tracing import TraceIdFilter
+
 def setup_logging():
     # Crear carpeta logs si no existe
     log_dir = "app/logs"
@@ -9,8 +11,9 @@ def setup_logging():
     
     # Configurar formato
     formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        '%(asctime)s - %(name)s - %(levelname)s - %(trace_id)s - %(message)s'
     )
+    trace_filter = TraceIdFilter()
     
     # Handlers para diferentes niveles
     debug_handler = RotatingFileHandler(
@@ -18,24 +21,28 @@ def setup_logging():
     )
     debug_handler.setLevel(logging.DEBUG)
     debug_handler.setFormatter(formatter)
+    debug_handler.addFilter(trace_filter)
     
     info_handler = RotatingFileHandler(
         f"{log_dir}/info.log", maxBytes=10485760, backupCount=5  
     )
     info_handler.setLevel(logging.INFO)
     info_handler.setFormatter(formatter)
+    info_handler.addFilter(trace_filter)
     
     error_handler = RotatingFileHandler(
         f"{log_dir}/error.log", maxBytes=10485760, backupCount=5
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
+    error_handler.addFilter(trace_filter)
     
     all_handler = RotatingFileHandler(
         f"{log_dir}/all.log", maxBytes=10485760, backupCount=5
     )
     all_handler.setLevel(logging.DEBUG)
     all_handler.setFormatter(formatter)
+    all_handler.addFilter(trace_filter)
     
     # Logger principal
     logger = logging.getLogger("app")
@@ -0,0 +1,154 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core import config
+from app.core.cart_archive import archive_carts, record_maintenance_report
+from app.core.database import CATALOG_DATABASE_PATH, CATALOG_SPLIT, DATABASE_PATH, SessionLocal
+from app.core.file_lock import file_lock
+from app.core.jobs import job_handler
+from app.core.metrics import metrics
+
+logger = logging.getLogger("app")
+
+def _database_bytes(db_path: str) -> int:
+    return sum(os.path.getsize(path) for path in (db_path, f"{db_path}-wal") if os.path.exists(path))
+
+def _pragma(conn: sqlite3.Connection, name: str) -> int:
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+def compact_database(db_path: str = DATABASE_PATH, vacuum_pages: int = config.MAINTENANCE_VACUUM_PAGES) -> Dict[str, Any]:
+    """ANALYZE y VACUUM incremental de la base principal; devuelve el espacio recuperado.
+
+    Con auto_vacuum=INCREMENTAL las páginas libres se devuelven al sistema
+    sin reescribir la base entera. Una base creada antes de activarlo se
+    convierte una sola vez con un VACUUM completo.
+    """
+    # Conexión propia en autocommit: VACUUM no puede ir dentro de una transacción
+    conn = sqlite3.connect(db_path, timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    try:
+        page_size = _pragma(conn, "page_size")
+        bytes_before = _database_bytes(db_path)
+        free_before = _pragma(conn, "freelist_count")
+
+        converted = False
+        if _pragma(conn, "auto_vacuum") != 2:
+            logger.info("Convirtiendo la base de datos a auto_vacuum=INCREMENTAL (VACUUM completo)")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            converted = True
+
+        conn.execute("ANALYZE")
+        # incremental_vacuum libera una página por paso: hay que consumir el cursor
+        conn.execute(f"PRAGMA incremental_vacuum({vacuum_pages})" if vacuum_pages > 0 else "PRAGMA incremental_vacuum").fetchall()
+        # En modo WAL el fichero solo se trunca al hacer checkpoint
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+        free_after = _pragma(conn, "freelist_count")
+        bytes_after = _database_bytes(db_path)
+    finally:
+        conn.close()
+    return {
+        "convertedAutoVacuum": converted,
+        "pageSize": page_size,
+        "freePagesBefore": free_before,
+        "freePagesAfter": free_after,
+        "bytesBefore": bytes_before,
+        "bytesAfter": bytes_after,
+        "reclaimedBytes": max(0, bytes_before - bytes_after),
+    }
+
+def run_maintenance(
+    session_factory: sessionmaker,
+    db_path: str = DATABASE_PATH,
+    catalog_path: Optional[str] = CATALOG_DATABASE_PATH if CATALOG_SPLIT else None,
+) -> Optional[Dict[str, Any]]:
+    """Archivar carritos antiguos y compactar las bases; None si ya hay otra ejecución en curso"""
+    with file_lock(f"{db_path}.maintenance.lock", blocking=False) as acquired:
+        if not acquired:
+            logger.info("Mantenimiento ya en curso en otro proceso")
+            return None
+        start = time.perf_counter()
+        started_at = datetime.now().isoformat()
+        archived = archive_carts(session_factory)
+        report = {
+            "startedAt": started_at,
+            "archivedCarts": archived,
+            **compact_database(db_path),
+        }
+        database_bytes = report["bytesAfter"]
+        if catalog_path is not None:
+            report["catalog"] = compact_database(catalog_path)
+            database_bytes += report["catalog"]["bytesAfter"]
+        report["durationMs"] = round((time.perf_counter() - start) * 1000, 1)
+        record_maintenance_report(report)
+
+    metrics.inc("maintenance_runs_total")
+    metrics.inc("maintenance_reclaimed_bytes_total", report["reclaimedBytes"] + report.get("catalog", {}).get("reclaimedBytes", 0))
+    metrics.set_gauge("maintenance_last_timestamp", time.time())
+    metrics.set_gauge("database_bytes", database_bytes)
+    logger.info(
+        f"🧹 Mantenimiento: {archived} carritos archivados, {report['reclaimedBytes']} bytes recuperados "
+        f"({report['bytesBefore']} → {report['bytesAfter']}), {report['durationMs']} ms"
+    )
+    return report
+
+@job_handler("maintenance.run")
+def _maintenance_job(db, payload: dict):
+    report = run_maintenance(SessionLocal)
+    return report if report is not None else {"skipped": True}
+
+class MaintenanceScheduler:
+    """Hilo que lanza el mantenimiento periódico; solo un worker lo ejecuta a la vez"""
+
+    def __init__(self, session_factory: sessionmaker, interval_s: float = config.MAINTENANCE_INTERVAL_S):
+        self.session_factory = session_factory
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="jagastore-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _run(self):
+        with file_lock(f"{DATABASE_PATH}.maintenance-scheduler.lock", blocking=False) as acquired:
+            if not acquired:
+                logger.debug("Otro worker gestiona el mantenimiento")
+                return
+            logger.info(f"Mantenimiento cada {self.interval_s:.0f} s")
+            while not self._stop.wait(self.interval_s):
+                try:
+                    run_maintenance(self.session_factory)
+                except Exception as e:
+                    metrics.inc("maintenance_errors_total")
+                    logger.error(f"❌ Error en el mantenimiento: {e}")
+
+maintenance_scheduler: Optional[MaintenanceScheduler] = None
+
+def start_maintenance_scheduler(session_factory: sessionmaker) -> Optional[MaintenanceScheduler]:
+    """Arrancar el mantenimiento periódico si está habilitado"""
+    global maintenance_scheduler
+    if not config.MAINTENANCE_ENABLED:
+        return None
+    maintenance_scheduler = MaintenanceScheduler(session_factory)
+    maintenance_scheduler.start()
+    return maintenance_scheduler
+
+def stop_maintenance_scheduler():
+    global maintenance_scheduler
+    if maintenance_scheduler is not None:
+        maintenance_scheduler.stop()
+        maintenance_scheduler = None
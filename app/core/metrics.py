@@ -0,0 +1,64 @@
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Metrics:
+    """Registro de métricas en memoria del proceso (contadores, gauges y tiempos)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._timings: Dict[str, Dict[LabelKey, list]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Incrementar un contador"""
+        key = _key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Fijar el valor actual de un gauge"""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_key(labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Registrar una duración (count, sum, max)"""
+        key = _key(labels)
+        with self._lock:
+            series = self._timings.setdefault(name, {})
+            stats = series.get(key)
+            if stats is None:
+                series[key] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                if seconds > stats[2]:
+                    stats[2] = seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copia serializable de todas las métricas"""
+        def series(data, render):
+            return {
+                name: [{"labels": dict(key), **render(value)} for key, value in values.items()]
+                for name, values in data.items()
+            }
+
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": series(self._counters, lambda v: {"value": v}),
+                "gauges": series(self._gauges, lambda v: {"value": v}),
+                "timings": series(
+                    self._timings,
+                    lambda v: {"count": v[0], "sum": v[1], "avg": v[1] / v[0], "max": v[2]},
+                ),
+            }
+
+metrics = Metrics()
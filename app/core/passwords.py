@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core import config
+from app.core.metrics import metrics
+
+logger = logging.getLogger("app")
+
+# Formato guardado en users.password: scrypt$n$r$p$sal$hash (base64 sin relleno).
+# Lo que no empieza por el prefijo es una contraseña heredada en texto plano
+_PREFIX = "scrypt"
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # maxmem por encima de 128 * n * r para que OpenSSL acepte costes altos
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+def hash_password(password: str) -> str:
+    """Hash scrypt con sal aleatoria. Coste de CPU deliberado: se ejecuta en el pool"""
+    n, r, p = config.AUTH_SCRYPT_N, config.AUTH_SCRYPT_R, config.AUTH_SCRYPT_P
+    salt = os.urandom(16)
+    return f"{_PREFIX}${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+def verify_password(password: str, stored: str) -> bool:
+    """Comprobar una contraseña contra el valor guardado (hash o texto plano heredado)"""
+    if not stored.startswith(f"{_PREFIX}$"):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, n, r, p, salt, expected = stored.split("$")
+        expected_bytes = _unb64(expected)
+        derived = _scrypt(password, _unb64(salt), int(n), int(r), int(p))
+    except (ValueError, OverflowError, binascii.Error):
+        # Un hash corrupto no autentica a nadie, pero no debe acabar en un 500
+        logger.error("Hash de contraseña con formato inválido")
+        return False
+    return hmac.compare_digest(derived, expected_bytes)
+
+def needs_rehash(stored: str) -> bool:
+    """True si el valor guardado es texto plano o usa otros parámetros de scrypt"""
+    params = f"{_PREFIX}${config.AUTH_SCRYPT_N}${config.AUTH_SCRYPT_R}${config.AUTH_SCRYPT_P}$"
+    return not stored.startswith(params)
+
+class HasherBusy(RuntimeError):
+    """El pool de hashing tiene demasiadas tareas pendientes"""
+
+class PasswordHasher:
+    """Pool acotado de procesos para el hashing de contraseñas.
+
+    scrypt ocupa la CPU decenas de milisegundos; en un proceso aparte no
+    retiene el GIL del worker, que sigue atendiendo peticiones mientras tanto.
+    Las tareas en vuelo están limitadas: por encima del límite se rechaza al
+    momento (HasherBusy) en lugar de acumular una cola que nadie va a esperar.
+    """
+
+    def __init__(self, workers: int = config.AUTH_HASH_WORKERS, max_pending: int = config.AUTH_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        if self._executor is not None or self.workers <= 0:
+            return
+        # spawn: los workers de uvicorn ya tienen hilos, y fork solo copiaría uno
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        # Arrancar los procesos ahora y no en el primer login
+        for future in [self._executor.submit(needs_rehash, "") for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"Pool de hashing de contraseñas iniciado ({self.workers} procesos)")
+
+    def stop(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            logger.info("Pool de hashing de contraseñas detenido")
+
+    def _release(self, _future: Future):
+        with self._lock:
+            self._pending -= 1
+            metrics.set_gauge("password_hash_pending", self._pending)
+        self._slots.release()
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        """Encolar fn(*args) en el pool; sin pool se ejecuta en el propio hilo"""
+        if not self._slots.acquire(blocking=False):
+            metrics.inc("password_hash_rejected")
+            raise HasherBusy("Demasiadas operaciones de contraseña pendientes")
+        with self._lock:
+            self._pending += 1
+            metrics.set_gauge("password_hash_pending", self._pending)
+        executor = self._executor
+        if executor is None:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Ejecutar en el pool esperando en el hilo actual (handlers síncronos)"""
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn: Callable[..., Any], *args) -> Any:
+        """Ejecutar en el pool sin ocupar el bucle de eventos ni un hilo del threadpool"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+# Pool global; sin arrancar (scripts, fill_db) el hashing se hace en línea
+password_hasher = PasswordHasher()
+
+def start_password_hasher() -> PasswordHasher:
+    """Arrancar el pool global de hashing"""
+    password_hasher.start()
+    return password_hasher
+
+def stop_password_hasher():
+    """Detener el pool global de hashing"""
+    password_hasher.stop()
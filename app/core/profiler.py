@@ -0,0 +1,187 @@
+import asyncio
+import cProfile
+import functools
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core import config
+
+logger = logging.getLogger("app")
+
+PROFILE_HEADER = b"x-profile"
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("jagastore_request_profile", default=None)
+# cProfile no admite dos perfiles activos a la vez en el mismo proceso
+_profiler_lock = threading.Lock()
+
+# Categorías del desglose de tiempo, por fragmento de la ruta del fichero
+_CATEGORIES = [
+    ("sqlalchemy", "/sqlalchemy/"),
+    ("pydantic", "/pydantic"),
+    ("logging", "/logging/"),
+    ("json", "/json/"),
+    ("fastapi", "/fastapi/"),
+    ("starlette", "/starlette/"),
+    ("app", f"{os.sep}app{os.sep}"),
+]
+
+def _category(filename: str, funcname: str) -> str:
+    if filename == "~":
+        # Funciones built-in: "<method 'execute' of 'sqlite3.Cursor' objects>"
+        return "sqlite" if "sqlite3" in funcname else "builtins"
+    for name, fragment in _CATEGORIES:
+        if fragment in filename:
+            return name
+    return "other"
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.profiler = cProfile.Profile()
+        self.endpoint_s: Optional[float] = None
+        self.id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{random.randrange(16 ** 4):04x}"
+
+    def summary(self, route: str, status_code: int, total_s: float) -> Dict[str, Any]:
+        stats = pstats.Stats(self.profiler)
+        breakdown: Dict[str, float] = {}
+        functions: List[Dict[str, Any]] = []
+        for (filename, lineno, funcname), (cc, nc, tt, ct, _) in stats.stats.items():
+            category = _category(filename, funcname)
+            breakdown[category] = breakdown.get(category, 0.0) + tt * 1000
+            functions.append({
+                "function": f"{os.path.basename(filename)}:{lineno}({funcname})",
+                "category": category,
+                "calls": nc,
+                "self_ms": round(tt * 1000, 3),
+                "cumulative_ms": round(ct * 1000, 3),
+            })
+        functions.sort(key=lambda f: f["cumulative_ms"], reverse=True)
+        endpoint_ms = (self.endpoint_s or 0.0) * 1000
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": route,
+            "status": status_code,
+            "total_ms": round(total_s * 1000, 3),
+            "endpoint_ms": round(endpoint_ms, 3),
+            # Validación de la respuesta, serialización y middlewares
+            "outside_endpoint_ms": round(total_s * 1000 - endpoint_ms, 3),
+            "breakdown_ms": {k: round(v, 3) for k, v in sorted(breakdown.items(), key=lambda i: -i[1])},
+            "top_functions": functions[:30],
+        }
+
+def profiled_endpoint(endpoint):
+    """Envolver un endpoint síncrono para perfilarlo en su propio hilo cuando se pida"""
+    if not config.PROFILER_ENABLED or asyncio.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or not _profiler_lock.acquire(blocking=False):
+            return endpoint(*args, **kwargs)
+        start = time.perf_counter()
+        profile.profiler.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.profiler.disable()
+            profile.endpoint_s = time.perf_counter() - start
+            _profiler_lock.release()
+
+    return wrapper
+
+def _write_profile(profile: RequestProfile, summary: Dict[str, Any]):
+    os.makedirs(config.PROFILER_DIR, exist_ok=True)
+    base = os.path.join(config.PROFILER_DIR, profile.id)
+    profile.profiler.dump_stats(f"{base}.prof")
+    with open(f"{base}.json", "w") as f:
+        json.dump(summary, f, indent=2)
+
+    # Conservar solo los perfiles más recientes
+    summaries = sorted(name for name in os.listdir(config.PROFILER_DIR) if name.endswith(".json"))
+    for name in summaries[:-config.PROFILER_KEEP]:
+        for ext in (".json", ".prof"):
+            stale = os.path.join(config.PROFILER_DIR, name[:-5] + ext)
+            if os.path.exists(stale):
+                os.remove(stale)
+
+def list_profiles(limit: int = 20) -> List[Dict[str, Any]]:
+    """Resúmenes de los últimos perfiles, del más reciente al más antiguo"""
+    if not os.path.isdir(config.PROFILER_DIR):
+        return []
+    names = sorted((n for n in os.listdir(config.PROFILER_DIR) if n.endswith(".json")), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        profile = load_profile(name[:-5])
+        if profile:
+            profile.pop("top_functions", None)
+            profiles.append(profile)
+    return profiles
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    """Resumen completo de un perfil"""
+    path = os.path.join(config.PROFILER_DIR, f"{os.path.basename(profile_id)}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+class ProfilerMiddleware:
+    """Middleware ASGI que activa el profiler por cabecera protegida o por muestreo"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope) -> bool:
+        if config.PROFILER_TOKEN:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value.decode("latin-1"), config.PROFILER_TOKEN)
+        return config.PROFILER_SAMPLE_RATE > 0 and random.random() < config.PROFILER_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+
+        if profile.endpoint_s is None:
+            # El endpoint no se perfiló (otro perfil en curso o ruta no perfilable)
+            return
+        route = getattr(scope.get("route"), "path", scope["path"])
+        try:
+            summary = profile.summary(route, status_code, total)
+            _write_profile(profile, summary)
+            logger.info(f"Perfil {profile.id}: {profile.method} {route} {summary['total_ms']} ms")
+        except Exception as e:
+            logger.error(f"Error guardando perfil {profile.id}: {e}")
@@ -0,0 +1,179 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core import config
+from app.core.database import DATABASE_PATH, immediate_transactions
+from app.core.file_lock import file_lock
+from app.core.metrics import metrics
+from app.models.cart_model import CartItem
+from app.models.product_model import Product
+from app.models.row_counter_model import CatalogRowCounter, RowCounter
+from app.models.user_model import User
+
+logger = logging.getLogger("app")
+
+# Tablas con contador y columnas por las que filtran los listados
+COUNTED_TABLES: Dict[str, Tuple[Any, List[str]]] = {
+    "products": (Product, ["category"]),
+    "users": (User, []),
+    "cart_items": (CartItem, ["userId"]),
+}
+
+# Cada contador vive en la base de su tabla y se ajusta en la misma transacción
+COUNTER_MODELS = {"products": CatalogRowCounter}
+
+def _counter_model(table: str):
+    return COUNTER_MODELS.get(table, RowCounter)
+
+def counter_key(table: str, column: Optional[str] = None, value: Any = None) -> str:
+    return table if column is None else f"{table}:{column}={value}"
+
+def row_delta(table: str, delta: int, **filters) -> Dict[str, int]:
+    """Deltas del total de la tabla y de cada valor de filtro de una fila"""
+    deltas = {counter_key(table): delta}
+    for column, value in filters.items():
+        if value is not None:
+            deltas[counter_key(table, column, value)] = delta
+    return deltas
+
+def adjust_counts(db: Session, deltas: Dict[str, int]):
+    """Aplicar deltas a los contadores en la transacción actual, una sentencia por base"""
+    by_model: Dict[Any, Dict[str, int]] = {}
+    for name, delta in deltas.items():
+        if delta:
+            by_model.setdefault(_counter_model(name.split(":", 1)[0]), {})[name] = delta
+    for model, model_deltas in by_model.items():
+        stmt = insert(model).values([{"name": name, "count": delta} for name, delta in model_deltas.items()])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[model.name],
+            set_={"count": model.count + stmt.excluded.count},
+        ))
+
+def count_rows(db: Session, table: str, column: Optional[str] = None, value: Any = None) -> int:
+    """Filas de la tabla (o con ese valor de filtro) según los contadores; sin recorrer la tabla"""
+    key = counter_key(table, column, value)
+    model = _counter_model(table)
+    return db.execute(select(model.count).where(model.name == key)).scalar() or 0
+
+def _actual_counts(db: Session, counter_model) -> Dict[str, int]:
+    actual: Dict[str, int] = {}
+    for table, (model, columns) in COUNTED_TABLES.items():
+        if _counter_model(table) is not counter_model:
+            continue
+        actual[counter_key(table)] = db.execute(select(func.count()).select_from(model)).scalar()
+        for column in columns:
+            attribute = getattr(model, column)
+            rows = db.execute(select(attribute, func.count()).where(attribute.isnot(None)).group_by(attribute))
+            for value, count in rows:
+                actual[counter_key(table, column, value)] = count
+    return actual
+
+def _reconcile(db: Session, counter_model) -> Dict[str, int]:
+    # BEGIN IMMEDIATE: el bloqueo de escritura se toma antes del recuento, así
+    # que ninguna escritura concurrente puede colarse entre el recuento y el
+    # ajuste (con un BEGIN diferido la lectura vería un snapshot ya superado)
+    with immediate_transactions():
+        db.connection(bind_arguments={"mapper": counter_model})
+    try:
+        actual = _actual_counts(db, counter_model)
+        stored = dict(db.execute(select(counter_model.name, counter_model.count)).all())
+        drift = {
+            name: actual.get(name, 0) - stored.get(name, 0)
+            for name in set(actual) | set(stored)
+            if actual.get(name, 0) != stored.get(name, 0)
+        }
+        adjust_counts(db, drift)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return drift
+
+def reconcile_row_counters(session_factory: sessionmaker, bootstrap: bool = False) -> Dict[str, int]:
+    """Comparar los contadores con COUNT(*) real y corregir la deriva; devuelve las diferencias.
+
+    Con bootstrap=True se están creando los contadores de cero: la diferencia
+    es el recuento inicial y no cuenta como deriva en las métricas.
+    """
+    # Una transacción por base: cada una solo bloquea la suya
+    drift: Dict[str, int] = {}
+    for counter_model in (RowCounter, CatalogRowCounter):
+        db = session_factory()
+        try:
+            drift.update(_reconcile(db, counter_model))
+        finally:
+            db.close()
+    if bootstrap:
+        logger.info(f"Contadores de filas inicializados: {len(drift)} contadores")
+        return drift
+    metrics.inc("row_counter_reconciliations_total")
+    if drift:
+        metrics.inc("row_counter_drift_total", sum(abs(delta) for delta in drift.values()))
+        logger.warning(f"Contadores de filas corregidos: {drift}")
+    return drift
+
+def bootstrap_row_counters(session_factory: sessionmaker):
+    """Inicializar los contadores si la tabla está vacía (base poblada o restaurada sin ellos)"""
+    with file_lock(f"{DATABASE_PATH}.lock"):
+        db = session_factory()
+        try:
+            empty = any(
+                db.execute(select(model.name).limit(1)).first() is None
+                for model in (RowCounter, CatalogRowCounter)
+            )
+        finally:
+            db.close()
+        if empty:
+            reconcile_row_counters(session_factory, bootstrap=True)
+
+class RowCounterReconciler:
+    """Hilo que reconcilia los contadores periódicamente; solo un worker lo ejecuta a la vez"""
+
+    def __init__(self, session_factory: sessionmaker, interval_s: float = config.ROW_COUNTERS_RECONCILE_INTERVAL_S):
+        self.session_factory = session_factory
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="jagastore-row-counters", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _run(self):
+        with file_lock(f"{DATABASE_PATH}.row-counters.lock", blocking=False) as acquired:
+            if not acquired:
+                logger.debug("Otro worker reconcilia los contadores de filas")
+                return
+            while not self._stop.wait(self.interval_s):
+                try:
+                    reconcile_row_counters(self.session_factory)
+                except Exception as e:
+                    logger.error(f"❌ Error reconciliando contadores de filas: {e}")
+
+row_counter_reconciler: Optional[RowCounterReconciler] = None
+
+def start_row_counter_reconciler(session_factory: sessionmaker) -> Optional[RowCounterReconciler]:
+    """Arrancar la reconciliación periódica (0 la desactiva)"""
+    global row_counter_reconciler
+    if config.ROW_COUNTERS_RECONCILE_INTERVAL_S <= 0:
+        return None
+    row_counter_reconciler = RowCounterReconciler(session_factory)
+    row_counter_reconciler.start()
+    return row_counter_reconciler
+
+def stop_row_counter_reconciler():
+    global row_counter_reconciler
+    if row_counter_reconciler is not None:
+        row_counter_reconciler.stop()
+        row_counter_reconciler = None
@@ -0,0 +1,138 @@
+import logging
+from typing import Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core import config
+from app.core.database import CATALOG_MODELS, CATALOG_SCHEMA
+from app.core.geo import SPATIAL_DDL
+from app.models.dec_base import DecBase
+# Importar los modelos registra sus tablas en los metadatos
+from app.models import (  # noqa: F401
+    analytics_model, cart_model, catalog_version_model, job_model, product_change_model, product_model,
+    recommendation_model, row_counter_model, user_model,
+)
+
+logger = logging.getLogger("app")
+
+# Columnas añadidas a tablas que ya existían: (tabla, columna, tipo SQL)
+COLUMN_MIGRATIONS = [
+    ("products", "rating_rate", "FLOAT"),
+    ("products", "rating_count", "INTEGER"),
+    # El DEFAULT rellena las filas existentes: con 0 ningún carrito podría comprarse
+    ("products", "stock", f"INTEGER NOT NULL DEFAULT {config.PRODUCT_INITIAL_STOCK}"),
+    ("cart_items", "checkedOutAt", "DATETIME"),
+    ("users", "lat", "FLOAT"),
+    ("users", "long", "FLOAT"),
+]
+
+# Tablas virtuales y triggers que create_all no conoce (idempotentes)
+DDL = SPATIAL_DDL
+
+# Rellenos idempotentes de las columnas derivadas (filas creadas por fill_db o antiguas)
+BACKFILLS = [
+    """
+    UPDATE products
+    SET rating_rate = COALESCE(json_extract(rating, '$.rate'), 0),
+        rating_count = COALESCE(json_extract(rating, '$.count'), 0)
+    WHERE rating_rate IS NULL OR rating_count IS NULL
+    """,
+    # Las filas rellenadas aquí entran en el R*Tree por el trigger de UPDATE
+    """
+    UPDATE users
+    SET lat = CAST(json_extract(address, '$.geolocation.lat') AS REAL),
+        long = CAST(json_extract(address, '$.geolocation.long') AS REAL)
+    WHERE lat IS NULL
+      AND json_extract(address, '$.geolocation.lat') IS NOT NULL
+      AND json_extract(address, '$.geolocation.long') IS NOT NULL
+      AND CAST(json_extract(address, '$.geolocation.lat') AS REAL) BETWEEN -90 AND 90
+      AND CAST(json_extract(address, '$.geolocation.long') AS REAL) BETWEEN -180 AND 180
+    """,
+    # Usuarios con coordenadas de antes de existir el índice espacial
+    """
+    INSERT INTO users_geo (id, min_lat, max_lat, min_long, max_long)
+    SELECT id, lat, lat, long, long FROM users
+    WHERE lat IS NOT NULL AND long IS NOT NULL AND id NOT IN (SELECT id FROM users_geo)
+    """,
+]
+
+CATALOG_TABLES = [model.__table__ for model in CATALOG_MODELS]
+STORE_TABLES = [table for table in DecBase.metadata.sorted_tables if table not in CATALOG_TABLES]
+
+# Contadores de filas del catálogo guardados en la base principal antes de separarla
+_CATALOG_COUNTERS = "name = 'products' OR name LIKE 'products:%'"
+
+def _migrate_columns(bind: Engine):
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table, column, sql_type in COLUMN_MIGRATIONS:
+            if not inspector.has_table(table, schema="main"):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table, schema="main")}
+            if column not in existing:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN "{column}" {sql_type}'))
+                logger.info(f"Columna añadida: {table}.{column}")
+
+def _columns(conn: Connection, schema: str, table: str) -> list:
+    return [row[1] for row in conn.execute(text(f'PRAGMA {schema}.table_info("{table}")'))]
+
+def _move_catalog_tables(bind: Engine):
+    # Bases anteriores a la separación: las tablas del catálogo pasan de main a
+    # la base adjunta en una sola transacción. Después main no debe conservarlas,
+    # porque taparían a las del catálogo en el SQL sin esquema
+    inspector = inspect(bind)
+    legacy = [table.name for table in CATALOG_TABLES if inspector.has_table(table.name, schema="main")]
+    if not legacy:
+        return
+    with bind.begin() as conn:
+        for table in legacy:
+            if conn.execute(text(f'SELECT 1 FROM {CATALOG_SCHEMA}."{table}" LIMIT 1')).first() is not None:
+                raise RuntimeError(f"{table} tiene filas en las dos bases; no se puede separar el catálogo")
+            target = set(_columns(conn, CATALOG_SCHEMA, table))
+            columns = ", ".join(f'"{c}"' for c in _columns(conn, "main", table) if c in target)
+            conn.execute(text(
+                f'INSERT INTO {CATALOG_SCHEMA}."{table}" ({columns}) SELECT {columns} FROM main."{table}"'
+            ))
+            conn.execute(text(f'DROP TABLE main."{table}"'))
+            logger.info(f"Tabla {table} movida a la base del catálogo")
+        # Los ids de eventos SSE no deben reutilizarse tras el traslado
+        if "product_changes" in legacy:
+            conn.execute(text(f"DELETE FROM {CATALOG_SCHEMA}.sqlite_sequence WHERE name = 'product_changes'"))
+            conn.execute(text(f"""
+                INSERT INTO {CATALOG_SCHEMA}.sqlite_sequence (name, seq)
+                SELECT 'product_changes', MAX(
+                    COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = 'product_changes'), 0),
+                    COALESCE((SELECT MAX(id) FROM {CATALOG_SCHEMA}.product_changes), 0))
+            """))
+        if inspector.has_table("row_counters", schema="main"):
+            conn.execute(text(
+                f"INSERT OR REPLACE INTO {CATALOG_SCHEMA}.catalog_row_counters (name, count) "
+                f"SELECT name, count FROM main.row_counters WHERE {_CATALOG_COUNTERS}"
+            ))
+            conn.execute(text(f"DELETE FROM main.row_counters WHERE {_CATALOG_COUNTERS}"))
+
+def ensure_schema(bind: Engine, catalog_bind: Optional[Engine] = None):
+    """Crear las tablas y columnas que falten en una base de datos existente.
+
+    Con catalog_bind distinto de bind las tablas del catálogo se crean en su
+    propia base, que las conexiones de bind deben tener adjunta como
+    CATALOG_SCHEMA (ver attach_catalog).
+    """
+    if catalog_bind is None or catalog_bind is bind:
+        DecBase.metadata.create_all(bind=bind)
+        _migrate_columns(bind)
+    else:
+        DecBase.metadata.create_all(bind=catalog_bind, tables=CATALOG_TABLES)
+        DecBase.metadata.create_all(bind=bind, tables=STORE_TABLES)
+        _migrate_columns(catalog_bind)
+        _migrate_columns(bind)
+        _move_catalog_tables(bind)
+
+    # DDL y rellenos van por bind: con el catálogo adjunto ve todas las tablas
+    with bind.begin() as conn:
+        for statement in DDL:
+            conn.execute(text(statement))
+        for backfill in BACKFILLS:
+            conn.execute(text(backfill))
+    logger.debug("Esquema de base de datos verificado")
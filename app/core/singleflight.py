@@ -0,0 +1,91 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from app.core import config
+from app.core.metrics import metrics
+
+logger = logging.getLogger("app")
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalescencia de llamadas idénticas concurrentes (single-flight).
+
+    La primera petición con una clave ejecuta la función; las que llegan
+    mientras sigue en vuelo esperan y reciben el mismo resultado. El número
+    de esperas por clave está acotado: quien lo excede, o se cansa de
+    esperar, ejecuta su propia llamada.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_waiters: int = config.SINGLEFLIGHT_MAX_WAITERS,
+        wait_timeout: float = config.SINGLEFLIGHT_WAIT_TIMEOUT_S,
+    ):
+        self.name = name
+        self.max_waiters = max_waiters
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def _record(self, outcome: str):
+        metrics.inc("singleflight_calls_total", group=self.name, outcome=outcome)
+        with self._lock:
+            if outcome == "leader":
+                self.leaders += 1
+            elif outcome == "shared":
+                self.shared += 1
+            total = self.leaders + self.shared
+            ratio = self.shared / total if total else 0.0
+        metrics.set_gauge("singleflight_coalescing_ratio", ratio, group=self.name)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Ejecutar fn una sola vez para todas las llamadas concurrentes con la misma clave"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+            elif call.waiters >= self.max_waiters:
+                call = None
+                leader = False
+            else:
+                call.waiters += 1
+                leader = False
+
+        if call is None:
+            self._record("overflow")
+            return fn()
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+            self._record("leader")
+        else:
+            if not call.event.wait(self.wait_timeout):
+                logger.warning(f"Espera single-flight agotada en {self.name} para {key}")
+                self._record("timeout")
+                return fn()
+            self._record("shared")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
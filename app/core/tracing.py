@@ -0,0 +1,493 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.core.file_lock import file_lock
+from app.core.metrics import metrics
+from app.core.profiler import profiled_endpoint
+
+logger = logging.getLogger("app")
+
+TRACE_ID_HEADER = b"x-trace-id"
+TRACEPARENT_HEADER = b"traceparent"
+# W3C Trace Context: versión-traceid-parentid-flags
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# Tipos de span de OTLP
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_SPAN_KEY = "jagastore_span"
+
+class Trace:
+    """Estado compartido por los spans de una petición"""
+
+    __slots__ = ("trace_id", "sampled", "spans", "endpoint_end_ns")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = 0
+        # Fin del endpoint: lo que queda hasta enviar la respuesta es serialización
+        self.endpoint_end_ns: Optional[int] = None
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes",
+                 "status", "status_message", "events")
+
+    def __init__(self, trace: Trace, name: str, kind: int = KIND_INTERNAL, parent_id: Optional[str] = None,
+                 start_ns: Optional[int] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.events: List[Dict[str, Any]] = []
+
+    @property
+    def sampled(self) -> bool:
+        return self.trace.sampled
+
+    def child(self, name: str, kind: int = KIND_INTERNAL, start_ns: Optional[int] = None, **attributes) -> Optional["Span"]:
+        """Nuevo span hijo; None si la traza ya tiene el máximo de spans"""
+        if self.trace.spans >= config.TRACING_MAX_SPANS_PER_TRACE:
+            metrics.inc("tracing_spans_dropped_total", reason="trace_limit")
+            return None
+        self.trace.spans += 1
+        return Span(self.trace, name, kind, self.span_id, start_ns, attributes)
+
+    def record_exception(self, error: BaseException):
+        status_code = getattr(error, "status_code", None)
+        if status_code is not None and status_code < 500:
+            # Un 4xx es una respuesta válida, no un fallo del span
+            self.attributes["http.status_code"] = status_code
+            return
+        self.status = STATUS_ERROR
+        self.status_message = str(error)[:200]
+        self.events.append({
+            "name": "exception",
+            "timeUnixNano": str(time.time_ns()),
+            "attributes": _otlp_attributes({
+                "exception.type": type(error).__name__,
+                "exception.message": str(error)[:1000],
+            }),
+        })
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        if self.trace.sampled and span_exporter is not None:
+            span_exporter.export(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status, "message": self.status_message} if self.status else {},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.events:
+            span["events"] = self.events
+        return span
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON codifica los int64 como cadena
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+_current: ContextVar[Optional[Span]] = ContextVar("jagastore_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace.trace_id if span is not None else None
+
+@contextmanager
+def start_span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Span hijo del actual durante el bloque; sin traza muestreada no hace nada y devuelve None"""
+    parent = _current.get()
+    span = parent.child(name, kind, **attributes) if parent is not None and parent.sampled else None
+    if span is None:
+        yield None
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+@contextmanager
+def use_span(span: Optional[Span]):
+    """Activar un span existente en este hilo (escritor de la cola, trabajos...)"""
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+def propagate(fn: Callable) -> Callable:
+    """Envolver una función para que, ejecutada en otro hilo, cuelgue sus spans del actual"""
+    span = _current.get()
+    if span is None or not span.sampled:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with use_span(span):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+def traced(fn: Optional[Callable] = None, *, name: Optional[str] = None):
+    """Decorador: la llamada es un span hijo del actual (por defecto "Clase.método").
+
+    Sin traza muestreada la función se llama directamente, sin más coste
+    que leer la variable de contexto.
+    """
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+        attributes = {"code.namespace": func.__module__, "code.function": func.__name__}
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                parent = _current.get()
+                if parent is None or not parent.sampled:
+                    return await func(*args, **kwargs)
+                with start_span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None or not parent.sampled:
+                return func(*args, **kwargs)
+            with start_span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate(fn) if fn is not None else decorate
+
+def traced_endpoint(endpoint):
+    """Span del controlador; marca el fin del endpoint para medir la serialización"""
+    # include_router vuelve a crear las rutas con el endpoint ya envuelto
+    if not config.TRACING_ENABLED or getattr(endpoint, "_jagastore_traced", False):
+        return endpoint
+    inner = traced(endpoint, name=f"{endpoint.__module__.rsplit('.', 1)[-1]}.{endpoint.__name__}")
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await inner(*args, **kwargs)
+            finally:
+                _mark_endpoint_end()
+        async_wrapper._jagastore_traced = True
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        try:
+            return inner(*args, **kwargs)
+        finally:
+            _mark_endpoint_end()
+    wrapper._jagastore_traced = True
+    return wrapper
+
+def _mark_endpoint_end():
+    span = _current.get()
+    if span is not None and span.sampled:
+        span.trace.endpoint_end_ns = time.time_ns()
+
+class TracedRoute(APIRoute):
+    """Ruta cuyos endpoints se trazan y pueden perfilarse bajo demanda"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, traced_endpoint(profiled_endpoint(endpoint)), **kwargs)
+
+def instrument_engine(sqlite_engine: Engine, db_name: str):
+    """Un span por sentencia SQL enviada al engine dentro de una traza muestreada"""
+    @event.listens_for(sqlite_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is None or not parent.sampled or context is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        span = parent.child(
+            f"{operation} {db_name}", KIND_CLIENT,
+            **{
+                "db.system": "sqlite",
+                "db.name": db_name,
+                "db.operation": operation,
+                "db.statement": statement[:config.TRACING_SQL_MAX_LENGTH],
+            },
+        )
+        if span is not None and executemany:
+            span.attributes["db.executemany.rows"] = len(parameters)
+        setattr(context, _SPAN_KEY, span)
+
+    @event.listens_for(sqlite_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, _SPAN_KEY, None)
+        if span is None:
+            return
+        setattr(context, _SPAN_KEY, None)
+        if cursor.rowcount >= 0:
+            span.attributes["db.rows_affected"] = cursor.rowcount
+        span.end()
+
+    @event.listens_for(sqlite_engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        span = getattr(context, _SPAN_KEY, None) if context is not None else None
+        if span is None:
+            return
+        setattr(context, _SPAN_KEY, None)
+        span.record_exception(exception_context.original_exception)
+        span.end()
+
+def _commit_started(session: Session):
+    parent = _current.get()
+    if parent is not None and parent.sampled:
+        span = parent.child("COMMIT", KIND_CLIENT, **{"db.system": "sqlite", "db.operation": "COMMIT"})
+        if span is not None:
+            session.info[_SPAN_KEY] = span
+
+def _commit_finished(session: Session, previous_transaction=None):
+    span = session.info.pop(_SPAN_KEY, None)
+    if span is not None:
+        if previous_transaction is not None:
+            span.status = STATUS_ERROR
+            span.status_message = "rollback"
+        span.end()
+
+def instrument_sessions():
+    """Medir los commits de sesión (incluye el fsync de SQLite) como spans"""
+    if not event.contains(Session, "before_commit", _commit_started):
+        event.listen(Session, "before_commit", _commit_started)
+        event.listen(Session, "after_commit", _commit_finished)
+        event.listen(Session, "after_soft_rollback", _commit_finished)
+
+class TraceIdFilter(logging.Filter):
+    """Añadir el trace id de la petición en curso a cada línea de log"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+class SpanExporter:
+    """Exportador por lotes a un fichero OTLP/JSON.
+
+    Los spans terminados se acumulan en memoria y un hilo los escribe cada
+    pocos segundos (o al llenarse un lote) como una ExportTraceServiceRequest
+    por línea, el formato que lee el receptor otlpjsonfile del collector. Si
+    la cola se llena los spans se descartan en lugar de frenar las peticiones.
+    """
+
+    def __init__(
+        self,
+        path: str = config.TRACING_EXPORT_PATH,
+        batch_size: int = config.TRACING_EXPORT_BATCH,
+        interval_s: float = config.TRACING_EXPORT_INTERVAL_S,
+        max_queue: int = config.TRACING_QUEUE_SIZE,
+        max_bytes: int = config.TRACING_EXPORT_MAX_BYTES,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.max_queue = max_queue
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending: List[Span] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._resource = {"attributes": _otlp_attributes({"service.name": "jagastore", "process.pid": os.getpid()})}
+
+    def export(self, span: Span):
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                metrics.inc("tracing_spans_dropped_total", reason="queue_full")
+                return
+            self._pending.append(span)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="jagastore-trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                metrics.inc("tracing_export_errors_total")
+                logger.error(f"❌ Error exportando trazas: {e}")
+
+    def flush(self) -> int:
+        """Escribir los spans pendientes; devuelve cuántos se exportaron"""
+        with self._lock:
+            spans, self._pending = self._pending, []
+        if not spans:
+            return 0
+        line = json.dumps({"resourceSpans": [{
+            "resource": self._resource,
+            "scopeSpans": [{"scope": {"name": "jagastore"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}, separators=(",", ":"))
+        start = time.perf_counter()
+        # Varios workers escriben en el mismo fichero: bloqueo para la rotación
+        # y una única escritura por lote para que las líneas no se mezclen
+        with file_lock(f"{self.path}.lock"):
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+        metrics.inc("tracing_spans_exported_total", len(spans))
+        metrics.observe("tracing_export_seconds", time.perf_counter() - start)
+        return len(spans)
+
+# Exportador global, activo solo si JAGASTORE_TRACING está habilitado
+span_exporter: Optional[SpanExporter] = None
+
+def start_span_exporter() -> Optional[SpanExporter]:
+    global span_exporter
+    if not config.TRACING_ENABLED:
+        return None
+    if span_exporter is None:
+        span_exporter = SpanExporter()
+        span_exporter.start()
+    return span_exporter
+
+def stop_span_exporter():
+    global span_exporter
+    if span_exporter is not None:
+        span_exporter.stop()
+        span_exporter = None
+
+def _parse_traceparent(scope) -> Optional[tuple]:
+    for name, value in scope["headers"]:
+        if name == TRACEPARENT_HEADER:
+            match = _TRACEPARENT.match(value.decode("latin-1").strip().lower())
+            if match and match.group(1) != "0" * 32 and match.group(2) != "0" * 16:
+                return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+            return None
+    return None
+
+class TracingMiddleware:
+    """Middleware ASGI que abre la traza de cada petición.
+
+    El muestreo se decide en la cabecera: una traceparent entrante impone su
+    decisión (y su trace id); si no, se muestrea con probabilidad
+    JAGASTORE_TRACING_SAMPLE_RATE. Toda petición lleva trace id en los logs
+    y en la cabecera X-Trace-Id, aunque solo las muestreadas exportan spans.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = _parse_traceparent(scope)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < config.TRACING_SAMPLE_RATE
+        trace = Trace(trace_id, sampled)
+        root = Span(trace, f"{scope['method']} {scope['path']}", KIND_SERVER, parent_id, attributes={
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        })
+        status_code = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(TRACE_ID_HEADER, trace_id.encode())]
+                if sampled and trace.endpoint_end_ns is not None:
+                    # Validación del response_model y codificación JSON
+                    span = root.child("serialize response", start_ns=trace.endpoint_end_ns)
+                    if span is not None:
+                        span.end()
+            await send(message)
+
+        token = _current.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except Exception as e:
+            root.record_exception(e)
+            raise
+        finally:
+            _current.reset(token)
+            if sampled:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    root.name = f"{scope['method']} {route}"
+                    root.attributes["http.route"] = route
+                root.attributes["http.status_code"] = status_code
+                if status_code >= 500:
+                    root.status = STATUS_ERROR
+                root.end()
@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.core.metrics import metrics
+from app.core.write_queue import after_commit
+from app.models.user_model import User
+
+logger = logging.getLogger("app")
+
+# Columnas con restricción UNIQUE que se comprueban al registrar
+UNIQUE_FIELDS = ("email", "username")
+
+class BloomFilter:
+    """Filtro de Bloom sobre un bytearray con doble hashing (Kirsch-Mitzenmacher).
+
+    Responde "seguro que no está" sin falsos negativos; un positivo solo es
+    probable, con la tasa de falsos positivos elegida al dimensionarlo.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        capacity = max(capacity, 1)
+        self.bits = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.capacity = capacity
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, value: str) -> Iterable[int]:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, value: str):
+        for pos in self._positions(value):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    def memory_bytes(self) -> int:
+        return len(self._array)
+
+class _FieldIndex:
+    # Filtro de Bloom delante de un set exacto: la mayoría de registros son
+    # valores nuevos y se descartan sin tocar el set
+    def __init__(self, values: Set[str]):
+        self.values = values
+        self.removed = 0
+        self.bloom = self._build_bloom()
+
+    def _build_bloom(self) -> BloomFilter:
+        # Margen para crecer sin reconstruir en cada alta
+        bloom = BloomFilter(max(len(self.values) * 2, 1024), config.USER_INDEX_FALSE_POSITIVE_RATE)
+        for value in self.values:
+            bloom.add(value)
+        self.removed = 0
+        return bloom
+
+    def contains(self, value: str) -> bool:
+        if value not in self.bloom:
+            return False
+        return value in self.values
+
+    def add(self, value: str):
+        if value in self.values:
+            return
+        self.values.add(value)
+        self.bloom.add(value)
+        if len(self.values) > self.bloom.capacity:
+            self.bloom = self._build_bloom()
+
+    def discard(self, value: str):
+        if value not in self.values:
+            return
+        self.values.discard(value)
+        # Un Bloom no admite borrados: los bits huérfanos solo suben los
+        # falsos positivos, que el set resuelve; se reconstruye si se acumulan
+        self.removed += 1
+        if self.removed > self.bloom.capacity // 4:
+            self.bloom = self._build_bloom()
+
+class UserUniquenessIndex:
+    """Índice en memoria de los emails y nombres de usuario registrados.
+
+    Permite rechazar un registro duplicado sin consultar la base de datos y,
+    sobre todo, aceptar uno nuevo sin SELECT previo. Se construye al arrancar
+    el worker y se mantiene tras el commit de cada escritura de usuarios. Las
+    altas de otros workers no se ven aquí: la restricción UNIQUE sigue siendo
+    la autoridad final y el servicio aprende esos valores al chocar con ella.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fields: Optional[Dict[str, _FieldIndex]] = None
+
+    @property
+    def available(self) -> bool:
+        return self._fields is not None
+
+    def load(self, db: Session):
+        """Construir el índice completo desde la tabla users"""
+        start = time.perf_counter()
+        rows = db.execute(select(User.email, User.username)).all()
+        fields = {
+            field: _FieldIndex({row[i] for row in rows if row[i] is not None})
+            for i, field in enumerate(UNIQUE_FIELDS)
+        }
+        with self._lock:
+            self._fields = fields
+        metrics.set_gauge("user_index_entries", len(rows))
+        metrics.set_gauge("user_index_bloom_bytes", self.memory_bytes())
+        logger.info(
+            f"Índice de unicidad de usuarios cargado: {len(rows)} usuarios, filtros de {self.memory_bytes()} bytes "
+            f"({(time.perf_counter() - start) * 1000:.1f} ms)"
+        )
+
+    def memory_bytes(self) -> int:
+        if self._fields is None:
+            return 0
+        return sum(index.bloom.memory_bytes() for index in self._fields.values())
+
+    def contains(self, field: str, value: str) -> Optional[bool]:
+        """Si el valor está registrado; None si el índice no está cargado"""
+        with self._lock:
+            if self._fields is None:
+                return None
+            found = self._fields[field].contains(value)
+        metrics.inc("user_index_lookups_total", field=field, result="hit" if found else "miss")
+        return found
+
+    def add(self, field: str, value: Optional[str]):
+        if value is None:
+            return
+        with self._lock:
+            if self._fields is not None:
+                self._fields[field].add(value)
+
+    def discard(self, field: str, value: Optional[str]):
+        if value is None:
+            return
+        with self._lock:
+            if self._fields is not None:
+                self._fields[field].discard(value)
+
+    def track_write(self, db: Session, added: Optional[Dict[str, str]] = None, removed: Optional[Dict[str, str]] = None):
+        """Aplicar al índice los valores que entran y salen cuando la transacción se confirme"""
+        def apply():
+            for field, value in (removed or {}).items():
+                self.discard(field, value)
+            for field, value in (added or {}).items():
+                self.add(field, value)
+        after_commit(db, apply)
+
+user_index = UserUniquenessIndex()
@@ -0,0 +1,57 @@
+import logging
+import time
+from typing import Callable, List, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core import config
+from app.services.cart_service import CartService
+from app.services.product_service import ProductService
+from app.services.user_service import UserService
+
+logger = logging.getLogger("app")
+
+# Tareas de calentamiento adicionales (cachés en memoria, índices...)
+_warmers: List[Tuple[str, Callable[[Session], None]]] = []
+
+def register_warmer(name: str, warmer: Callable[[Session], None]):
+    """Registrar una tarea que se ejecuta antes de aceptar tráfico"""
+    _warmers.append((name, warmer))
+
+def _warm_queries(db: Session):
+    # Compila las consultas de los servicios (caché de SQLAlchemy) y deja
+    # las sentencias preparadas en la caché de la conexión de sqlite3
+    products = ProductService(db)
+    products.get_products(limit=1)
+    products.get_product(0)
+    products.get_products_by_category("")
+    users = UserService(db)
+    users.get_users(limit=1)
+    users.get_user(0)
+    users.get_user_by_email("")
+    carts = CartService(db)
+    carts.get_all_carts(limit=1)
+    carts.get_cart(0)
+    carts.get_carts_by_user(0)
+
+def warm_up(session_factory: sessionmaker):
+    """Calentar conexiones, consultas y cachés del worker actual"""
+    if not config.WARMUP_ENABLED:
+        return
+    start = time.perf_counter()
+
+    # Mantener varias sesiones abiertas a la vez fuerza conexiones distintas del pool
+    sessions = [session_factory() for _ in range(max(1, config.WARMUP_CONNECTIONS))]
+    try:
+        for db in sessions:
+            _warm_queries(db)
+        for name, warmer in _warmers:
+            try:
+                warmer(sessions[0])
+            except Exception as e:
+                logger.error(f"Error en calentamiento '{name}': {e}")
+    finally:
+        for db in sessions:
+            db.close()
+
+    logger.info(f"🔥 Worker calentado en {(time.perf_counter() - start) * 1000:.1f} ms")
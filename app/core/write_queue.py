@@ -0,0 +1,217 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core import config
+from app.core.database import immediate_transactions
+from app.core.tracing import propagate
+
+logger = logging.getLogger("app")
+
+# Una intención de escritura recibe la sesión del escritor y devuelve el resultado
+WriteIntent = Callable[[Session], Any]
+
+_STOP = object()
+_AFTER_COMMIT_KEY = "jagastore_after_commit"
+
+def after_commit(db: Session, callback: Callable[[], None]):
+    """Registrar una acción que se ejecuta solo si la escritura llega a confirmarse"""
+    db.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+def _take_after_commit(db: Session) -> List[Callable[[], None]]:
+    return db.info.pop(_AFTER_COMMIT_KEY, [])
+
+def _run_after_commit(callbacks: List[Callable[[], None]]):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Error en acción posterior al commit: {e}")
+
+class WriteQueue:
+    """Escritor único para SQLite con group commit.
+
+    Los handlers envían intenciones de escritura; un hilo dedicado las agrupa
+    en una sola transacción cada pocos milisegundos y devuelve a cada llamante
+    su propio resultado. Cada intención corre dentro de un SAVEPOINT, de modo
+    que un fallo solo afecta a su llamante y no al resto del lote.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        max_batch: int = config.WRITE_QUEUE_MAX_BATCH,
+        max_delay_ms: float = config.WRITE_QUEUE_MAX_DELAY_MS,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.writes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def pending(self) -> int:
+        """Intenciones en cola esperando al escritor"""
+        return self._queue.qsize()
+
+    def start(self):
+        """Arrancar el hilo escritor"""
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="jagastore-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Cola de escritura iniciada (lote máx. {self.max_batch}, espera {self.max_delay * 1000:.1f} ms)")
+
+    def stop(self, timeout: float = 10.0):
+        """Drenar las escrituras pendientes y detener el hilo escritor"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"Cola de escritura detenida ({self.writes} escrituras en {self.batches} lotes)")
+
+    def submit(self, intent: WriteIntent) -> Future:
+        """Encolar una intención de escritura y devolver su Future"""
+        future: Future = Future()
+        # Los spans de la intención cuelgan de la petición que la encoló
+        self._queue.put((propagate(intent), future))
+        return future
+
+    def execute(self, intent: WriteIntent, timeout: float = config.WRITE_QUEUE_TIMEOUT_S) -> Any:
+        """Encolar una intención de escritura y esperar su resultado"""
+        return self.submit(intent).result(timeout)
+
+    def _collect(self, first) -> Tuple[List[Tuple[WriteIntent, Future]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+            self._commit_batch(batch)
+        # Vaciar lo que quede en cola antes de salir
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pending.append(item)
+        if pending:
+            self._commit_batch(pending)
+
+    def _commit_batch(self, batch: List[Tuple[WriteIntent, Future]]):
+        db = self.session_factory(expire_on_commit=False)
+        results = []
+        callbacks: List[Callable[[], None]] = []
+        try:
+            for intent, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                _take_after_commit(db)
+                try:
+                    # La primera intención abre la transacción del lote
+                    with immediate_transactions(), db.begin_nested():
+                        result = intent(db)
+                    results.append((future, result, None))
+                    callbacks.extend(_take_after_commit(db))
+                except Exception as e:
+                    # Las acciones de una intención revertida se descartan
+                    _take_after_commit(db)
+                    results.append((future, None, e))
+            db.commit()
+            # Los objetos se entregan desacoplados para poder leerlos desde otros hilos
+            db.expunge_all()
+        except Exception as e:
+            logger.error(f"Error confirmando lote de escrituras: {e}")
+            db.rollback()
+            callbacks = []
+            results = [(future, None, e) for future, _, _ in results]
+        finally:
+            db.close()
+
+        _run_after_commit(callbacks)
+
+        self.batches += 1
+        self.writes += len(results)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+# Instancia global, solo activa si JAGASTORE_WRITE_QUEUE está habilitado
+write_queue: Optional[WriteQueue] = None
+
+def start_write_queue(session_factory: sessionmaker) -> Optional[WriteQueue]:
+    """Crear y arrancar la cola global si está habilitada por configuración"""
+    global write_queue
+    if not config.WRITE_QUEUE_ENABLED:
+        return None
+    if write_queue is None:
+        write_queue = WriteQueue(session_factory)
+    write_queue.start()
+    return write_queue
+
+def stop_write_queue():
+    """Detener la cola global drenando las escrituras pendientes"""
+    global write_queue
+    if write_queue is not None:
+        write_queue.stop()
+        write_queue = None
+
+def pending_writes() -> int:
+    """Escrituras pendientes en la cola global (0 si no está activa)"""
+    if write_queue is not None and write_queue.running:
+        return write_queue.pending
+    return 0
+
+def execute_write(db: Session, intent: WriteIntent) -> Any:
+    """Ejecutar una escritura a través de la cola o, si no está activa, con commit propio"""
+    # Lo leído antes por la petición deja abierta una transacción de lectura:
+    # se cierra para devolver la conexión al pool mientras se espera a la cola
+    # y para que la escritura empiece una transacción nueva (sin promocionar
+    # un snapshot de lectura antiguo, que SQLite rechaza con SQLITE_BUSY)
+    if db.in_transaction():
+        db.commit()
+    if write_queue is not None and write_queue.running:
+        return write_queue.execute(intent)
+    try:
+        with immediate_transactions():
+            result = intent(db)
+        db.commit()
+    except Exception:
+        _take_after_commit(db)
+        db.rollback()
+        raise
+    _run_after_commit(_take_after_commit(db))
+    return result
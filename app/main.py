@@ -3,7 +3,30 @@ import os
 import subprocess
 import sys
 from app.core.logging_config import setup_logging
-from app.controllers import user_controller, product_controller, cart_controller
+from app.core import config
+from app.core.admission import AdmissionControlMiddleware
+from app.core.backup import restore_latest_snapshot, start_backup_scheduler, stop_backup_scheduler
+from app.core.change_feed import change_hub
+from app.core.database import (
+    CATALOG_DATABASE_PATH, CATALOG_SPLIT, DATABASE_PATH, SessionLocal, catalog_engine, create_dedicated_session_factory, engine,
+)
+from app.core.file_lock import file_lock
+from app.core.jobs import start_job_workers, stop_job_workers
+from app.core.maintenance import start_maintenance_scheduler, stop_maintenance_scheduler
+from app.core.metrics import metrics
+from app.core.passwords import start_password_hasher, stop_password_hasher
+from app.core.profiler import ProfilerMiddleware
+from app.core.row_counters import bootstrap_row_counters, start_row_counter_reconciler, stop_row_counter_reconciler
+from app.core.schema import ensure_schema
+from app.core.tracing import TracingMiddleware, start_span_exporter, stop_span_exporter
+from app.core.autocomplete import autocomplete_index
+from app.core.catalog_snapshot import catalog_snapshot
+from app.core.user_index import user_index
+from app.core.warmup import register_warmer, warm_up
+from app.core.write_queue import start_write_queue, stop_write_queue
+from app.controllers import auth_controller, user_controller, product_controller, cart_controller, analytics_controller, admin_controller, job_controller
+from app.services.analytics_service import AnalyticsService
+from app.services.recommendation_service import RecommendationService
 import logging
 
 # Configurar logging
@@ -18,15 +41,31 @@ app = FastAPI(
 )
 
 def check_and_populate_database():
-    """Verificar si la base de datos existe y poblarla si es necesario"""
-    db_path = "app/core/jagastore.db"
+    """Verificar si la base de datos existe y, si no, restaurarla o poblarla"""
+    db_path = DATABASE_PATH
     
-    if not os.path.exists(db_path):
-        logger.info("Base de datos no encontrada. Poblando con datos iniciales...")
+    # Con varios workers solo uno puebla la base de datos; el resto espera
+    # al bloqueo y después la encuentra ya creada
+    with file_lock(f"{db_path}.lock"):
+        # Solo hay snapshots del catálogo si ya estaba separado; sin ellos,
+        # ensure_schema lo crea o lo extrae de una base anterior a la separación
+        if CATALOG_SPLIT and not os.path.exists(CATALOG_DATABASE_PATH):
+            restore_latest_snapshot(CATALOG_DATABASE_PATH)
+
+        if os.path.exists(db_path):
+            logger.info("✅ Base de datos encontrada")
+            return
+        
+        # Restaurar el snapshot más reciente es mucho más rápido que repoblar
+        logger.info("Base de datos no encontrada. Buscando snapshot...")
+        if restore_latest_snapshot(db_path):
+            return
+        
+        logger.info("Sin snapshots disponibles. Poblando con datos iniciales...")
         try:
             # Ejecutar el script fill_db.py
             result = subprocess.run(
-                [sys.executable, "app/scripts/fill_db.py"],
+                [sys.executable, "-m", "app.scripts.fill_db"],
                 capture_output=True,
                 text=True,
                 cwd=os.path.dirname(os.path.dirname(__file__))  # Ir a la raíz del proyecto
@@ -39,24 +78,92 @@ def check_and_populate_database():
                 
         except Exception as e:
             logger.error(f"❌ Error ejecutando fill_db.py: {e}")
-    else:
-        logger.info("✅ Base de datos encontrada")
+
+def bootstrap_sales_analytics():
+    """Construir la analítica de ventas si la tabla de agregados está vacía"""
+    with file_lock("app/core/analytics.lock"):
+        db = SessionLocal()
+        try:
+            analytics_service = AnalyticsService(db)
+            if analytics_service.is_empty():
+                analytics_service.rebuild()
+            elif RecommendationService(db).is_empty():
+                # Bases ya contabilizadas antes de existir las recomendaciones
+                RecommendationService(db).rebuild()
+        except Exception as e:
+            logger.error(f"❌ Error construyendo analítica de ventas: {e}")
+            db.rollback()
+        finally:
+            db.close()
 
 @app.on_event("startup")
 async def startup_event():
     """Evento al iniciar la aplicación"""
+    start_span_exporter()
     check_and_populate_database()
+    with file_lock(f"{DATABASE_PATH}.lock"):
+        ensure_schema(engine, catalog_engine)
+    bootstrap_sales_analytics()
+    bootstrap_row_counters(SessionLocal)
+    warm_up(SessionLocal)
+    # El escritor y los trabajos no compiten con las peticiones por el pool
+    start_write_queue(create_dedicated_session_factory(2))
+    start_password_hasher()
+    start_job_workers(create_dedicated_session_factory(config.JOBS_WORKERS + 1))
+    start_backup_scheduler()
+    start_maintenance_scheduler(SessionLocal)
+    start_row_counter_reconciler(SessionLocal)
+    if config.PRODUCT_CHANGES_ENABLED:
+        await change_hub.start()
     logger.info("🚀 JaGaStore API iniciada")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento al cerrar la aplicación"""
+    await change_hub.stop()
+    stop_backup_scheduler()
+    stop_maintenance_scheduler()
+    stop_row_counter_reconciler()
+    # Los trabajos en curso pueden escribir a través de la cola: se paran antes
+    stop_job_workers()
+    stop_write_queue()
+    stop_password_hasher()
+    stop_span_exporter()
     logger.info("🛑 JaGaStore API detenida")
 
+# Snapshot columnar del catálogo, cargado antes de aceptar tráfico
+if config.CATALOG_SNAPSHOT_ENABLED:
+    register_warmer("catalog_snapshot", catalog_snapshot.load)
+
+# Índice de prefijos para el autocompletado de productos
+if config.AUTOCOMPLETE_ENABLED:
+    register_warmer("autocomplete", autocomplete_index.load)
+
+# Índice de unicidad de usuarios para el registro
+if config.USER_INDEX_ENABLED:
+    register_warmer("user_index", user_index.load)
+
+# Control de admisión para las rutas de escritura
+if config.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+
+# Profiler por petición (opt-in)
+if config.PROFILER_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+# Trazas por petición: el último middleware añadido es el más externo, así
+# la traza cubre también la espera en el control de admisión
+if config.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
 # Incluir routers
+app.include_router(auth_controller.router)
 app.include_router(user_controller.router)
 app.include_router(product_controller.router)
 app.include_router(cart_controller.router)
+app.include_router(analytics_controller.router)
+app.include_router(admin_controller.router)
+app.include_router(job_controller.router)
 
 @app.get("/")
 async def root():
@@ -70,4 +177,9 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Endpoint de salud"""
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métricas en memoria del worker que atiende la petición"""
+    return metrics.snapshot()
@@ -0,0 +1,40 @@
+# app/models/analytics_model.py
+
+from sqlalchemy import JSON, Column, Integer, Float
+from .dec_base import DecBase
+
+class ProductSales(DecBase):
+    __tablename__ = "analytics_product_sales"
+
+    productId = Column(Integer, primary_key=True)
+    units = Column(Integer, nullable=False, default=0, index=True)
+    revenue = Column(Float, nullable=False, default=0.0)
+    carts = Column(Integer, nullable=False, default=0)
+
+class UserSpend(DecBase):
+    __tablename__ = "analytics_user_spend"
+
+    userId = Column(Integer, primary_key=True)
+    carts = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0, index=True)
+
+class CartSales(DecBase):
+    """Contribución ya contabilizada de cada carrito, para aplicar solo deltas"""
+    __tablename__ = "analytics_cart_sales"
+
+    cartId = Column(Integer, primary_key=True)
+    userId = Column(Integer)
+    # [{"productId": int, "quantity": int, "price": float}]
+    lines = Column(JSON, nullable=False)
+
+class ArchivedCartSales(DecBase):
+    """Contribución de los carritos ya archivados: la reconstrucción la vuelve a sumar"""
+    __tablename__ = "analytics_archived_cart_sales"
+    # Un id de carrito puede reutilizarse después de archivarlo
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    cartId = Column(Integer, nullable=False)
+    userId = Column(Integer)
+    lines = Column(JSON, nullable=False)
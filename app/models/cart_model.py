@@ -7,55 +7,61 @@ from .dec_base import DecBase
 class CartItem(DecBase):
     __tablename__ = "cart_items"
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=False)
+    id = Column(Integer, primary_key=True, index=True)
     userId = Column(Integer, ForeignKey("users.id"))
     date = Column(DateTime)
     products = Column(JSON)
+    # Fecha de compra; un carrito solo puede comprarse una vez
+    checkedOutAt = Column(DateTime)
     
     user = relationship("User", back_populates="carts")
 
-def __repr__(self):
-    return f"<CartItem(id={self.id}, userId={self.userId}, date={self.date}, products={self.products})>"
+    def __repr__(self):
+        return f"<CartItem(id={self.id}, userId={self.userId}, date={self.date}, products={self.products})>"
 
-def to_dict(self):
-    return {
-        "id": self.id,
-        "userId": self.userId,
-        "date": self.date.isoformat() if self.date else None,
-        "products": self.products
-    }   
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "userId": self.userId,
+            "date": self.date.isoformat() if self.date else None,
+            "products": self.products
+        }
 
-def get_id(self):
-    return self.id
+    def get_id(self):
+        return self.id
 
-def get_user_id(self):
-    return self.userId 
+    def get_user_id(self):
+        return self.userId 
 
-def get_date(self):
-    return self.date
+    def get_date(self):
+        return self.date
 
-def get_products(self):
-    return self.products
+    def get_products(self):
+        return self.products
 
-def set_user_id(self, user_id: int):
-    self.userId = user_id
+    def set_user_id(self, user_id: int):
+        self.userId = user_id
 
-def set_date(self, date: DateTime):
-    self.date = date
+    def set_date(self, date: DateTime):
+        self.date = date
 
-def set_products(self, products: list):
-    self.products = products
+    def set_products(self, products: list):
+        self.products = products
 
-def add_product(self, product: dict):
-    if not self.products:
-        self.products = []
-    self.products.append(product)   
+    def add_product(self, product: dict):
+        # Reasignar la lista para que SQLAlchemy detecte el cambio en la columna JSON
+        self.products = [*(self.products or []), product]
 
-def remove_product(self, product_id: int):
-    if self.products:
-        self.products = [p for p in self.products if p.get("productId") != product_id]
+    def set_product_quantity(self, product_id: int, quantity: int):
+        if self.products:
+            self.products = [
+                {**p, "quantity": quantity} if p.get("productId") == product_id else p
+                for p in self.products
+            ]
 
-def clear_products(self):
-    self.products = []
+    def remove_product(self, product_id: int):
+        if self.products:
+            self.products = [p for p in self.products if p.get("productId") != product_id]
 
-    
+    def clear_products(self):
+        self.products = []
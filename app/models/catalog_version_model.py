@@ -0,0 +1,11 @@
+# app/models/catalog_version_model.py
+
+from sqlalchemy import Column, Integer
+from .dec_base import DecBase
+
+class CatalogVersion(DecBase):
+    """Contador que cambia con cada escritura de productos (fila única id=1)"""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
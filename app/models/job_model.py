@@ -0,0 +1,26 @@
+# app/models/job_model.py
+
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text
+from .dec_base import DecBase
+
+class Job(DecBase):
+    """Trabajo en segundo plano; la tabla es la cola compartida por todos los workers"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Selección del siguiente trabajo: status = 'queued' AND runAt <= ahora
+        Index("ix_jobs_status_run_at", "status", "runAt"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(64), nullable=False)
+    payload = Column(JSON)
+    # queued | running | done | failed
+    status = Column(String(16), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    maxAttempts = Column(Integer, nullable=False)
+    runAt = Column(DateTime, nullable=False)
+    createdAt = Column(DateTime, nullable=False)
+    startedAt = Column(DateTime)
+    finishedAt = Column(DateTime)
+    lastError = Column(Text)
+    result = Column(JSON)
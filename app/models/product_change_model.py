@@ -0,0 +1,17 @@
+# app/models/product_change_model.py
+
+from sqlalchemy import JSON, Column, DateTime, Integer, String, func
+from .dec_base import DecBase
+
+class ProductChange(DecBase):
+    """Registro acotado de cambios del catálogo; el id es el id de evento SSE"""
+    __tablename__ = "product_changes"
+    # AUTOINCREMENT: un id de evento nunca se reutiliza aunque se recorte el registro
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    productId = Column(Integer, nullable=False)
+    # created | updated | deleted
+    action = Column(String(16), nullable=False)
+    payload = Column(JSON)
+    createdAt = Column(DateTime, nullable=False, server_default=func.current_timestamp())
@@ -12,4 +12,9 @@ class Product(DecBase):
     description = Column(Text)
     category = Column(String(50))
     image = Column(String(255))
-    rating = Column(JSON)
\ No newline at end of file
+    rating = Column(JSON)
+    # Agregados numéricos del rating, actualizables con una sola sentencia atómica
+    rating_rate = Column(Float)
+    rating_count = Column(Integer)
+    # Unidades disponibles; solo se descuentan con UPDATE condicional (stock >= cantidad)
+    stock = Column(Integer, nullable=False, default=0, server_default="0")
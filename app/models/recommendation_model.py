@@ -0,0 +1,26 @@
+# app/models/recommendation_model.py
+
+from sqlalchemy import JSON, Column, Index, Integer
+from .dec_base import DecBase
+
+class ProductPair(DecBase):
+    """Matriz dispersa de co-ocurrencia: carritos que contienen ambos productos.
+
+    Se guarda en los dos sentidos para que los vecinos de un producto sean un
+    único rango del índice.
+    """
+    __tablename__ = "analytics_product_pairs"
+
+    productId = Column(Integer, primary_key=True)
+    relatedId = Column(Integer, primary_key=True)
+    carts = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("ix_product_pairs_rank", "productId", "carts"),)
+
+class RelatedProducts(DecBase):
+    """Top-k precalculado de cada producto, leído con una sola búsqueda por clave"""
+    __tablename__ = "analytics_related_products"
+
+    productId = Column(Integer, primary_key=True)
+    # [[relatedId, carts], ...] ordenado de mayor a menor co-ocurrencia
+    related = Column(JSON, nullable=False)
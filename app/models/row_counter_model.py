@@ -0,0 +1,18 @@
+# app/models/row_counter_model.py
+
+from sqlalchemy import Column, Integer, String
+from .dec_base import DecBase
+
+class RowCounter(DecBase):
+    """Número de filas por tabla ("products") y por valor de filtro ("products:category=jewelery")"""
+    __tablename__ = "row_counters"
+
+    name = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class CatalogRowCounter(DecBase):
+    """Contadores de las tablas del catálogo, en su propia base junto a ellas"""
+    __tablename__ = "catalog_row_counters"
+
+    name = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
@@ -1,6 +1,6 @@
 # app/models/user_model.py
 
-from sqlalchemy import Column, Integer, String, JSON
+from sqlalchemy import Column, Float, Integer, String, JSON
 from sqlalchemy.orm import relationship
 from .dec_base import DecBase
 
@@ -14,5 +14,8 @@ class User(DecBase):
     name = Column(JSON) 
     address = Column(JSON)  
     phone = Column(String)
+    # Coordenadas numéricas de address.geolocation, indexadas en el R*Tree users_geo
+    lat = Column(Float)
+    long = Column(Float)
 
     carts = relationship("CartItem", back_populates="user")
\ No newline at end of file
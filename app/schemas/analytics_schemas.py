@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+
+class ProductSalesResponse(BaseModel):
+    productId: int = Field(..., description="Product ID")
+    units: int = Field(..., description="Units sold")
+    revenue: float = Field(..., description="Revenue at cart-time prices")
+    carts: int = Field(..., description="Number of carts containing the product")
+
+    class Config:
+        from_attributes = True
+
+class UserSpendResponse(BaseModel):
+    userId: int = Field(..., description="User ID")
+    carts: int = Field(..., description="Number of carts")
+    units: int = Field(..., description="Units bought")
+    total: float = Field(..., description="Total spend at cart-time prices")
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+
+class LoginRequest(BaseModel):
+    username: str = Field(..., min_length=1, max_length=50, description="Username")
+    password: str = Field(..., min_length=1, description="User password")
+
+class TokenResponse(BaseModel):
+    access_token: str = Field(..., description="Signed JWT")
+    token_type: str = Field("bearer", description="Token type for the Authorization header")
+    expires_in: int = Field(..., description="Token lifetime in seconds")
+
+class CurrentUserResponse(BaseModel):
+    id: int = Field(..., description="User ID")
+    username: str = Field(..., description="Username")
+    expiresAt: int = Field(..., description="Token expiry (Unix time)")
@@ -17,6 +17,32 @@ class CartUpdate(BaseModel):
 class CartResponse(CartBase):
     id: int = Field(..., description="Cart ID")
     products: List[Dict[str, Any]] = Field(..., description="List of products with quantities")
+    checkedOutAt: Optional[datetime] = Field(None, description="Checkout date")
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class CartItemQuantity(BaseModel):
+    quantity: int = Field(..., gt=0, description="Product quantity")
+
+class CartItemResponse(BaseModel):
+    cartId: int = Field(..., description="Cart ID")
+    productId: int = Field(..., description="Product ID")
+    quantity: int = Field(..., description="Product quantity in the cart")
+
+class CheckoutLine(BaseModel):
+    productId: int = Field(..., description="Product ID")
+    quantity: int = Field(..., description="Reserved quantity")
+    remainingStock: Optional[int] = Field(None, description="Stock left after the reservation (unknown for a checkout reported again)")
+
+class CheckoutResponse(BaseModel):
+    cartId: int = Field(..., description="Cart ID")
+    checkedOutAt: datetime = Field(..., description="Checkout date")
+    lines: List[CheckoutLine] = Field(..., description="Reserved lines")
+
+class ArchivedCartResponse(BaseModel):
+    id: int = Field(..., description="Cart ID")
+    userId: Optional[int] = Field(None, description="User ID")
+    date: Optional[datetime] = Field(None, description="Cart date")
+    products: List[Dict[str, Any]] = Field(..., description="List of products with quantities")
+    archivedAt: datetime = Field(..., description="Archive date")
@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+class JobResponse(BaseModel):
+    id: int = Field(..., description="Job ID")
+    kind: str = Field(..., description="Job type")
+    status: str = Field(..., description="queued, running, done or failed")
+    attempts: int = Field(..., description="Attempts so far")
+    maxAttempts: int = Field(..., description="Maximum attempts")
+    createdAt: datetime = Field(..., description="Enqueue date")
+    runAt: datetime = Field(..., description="Next eligible run date")
+    startedAt: Optional[datetime] = Field(None, description="Start date of the last attempt")
+    finishedAt: Optional[datetime] = Field(None, description="Completion date")
+    lastError: Optional[str] = Field(None, description="Error of the last failed attempt")
+    result: Optional[Dict[str, Any]] = Field(None, description="Job result")
+
+    class Config:
+        from_attributes = True
+
+class JobAccepted(BaseModel):
+    jobId: int = Field(..., description="Job ID")
+    status: str = Field("queued", description="Job status")
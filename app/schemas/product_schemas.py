@@ -10,6 +10,7 @@ class ProductBase(BaseModel):
 
 class ProductCreate(ProductBase):
     rating: Dict[str, Any] = Field(..., description="Product rating")
+    stock: int = Field(0, ge=0, description="Units in stock")
 
 class ProductUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=100, description="Product title")
@@ -18,10 +19,29 @@ class ProductUpdate(BaseModel):
     category: Optional[str] = Field(None, min_length=1, max_length=50, description="Product category")
     image: Optional[str] = Field(None, description="Product image URL")
     rating: Optional[Dict[str, Any]] = Field(None, description="Product rating")
+    stock: Optional[int] = Field(None, ge=0, description="Units in stock")
 
 class ProductResponse(ProductBase):
     id: int = Field(..., description="Product ID")
     rating: Dict[str, Any] = Field(..., description="Product rating")
+    stock: int = Field(0, description="Units in stock")
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class RelatedProductResponse(ProductResponse):
+    carts: int = Field(..., description="Carts that contain both products")
+
+class AutocompleteSuggestion(BaseModel):
+    id: int = Field(..., description="Product ID")
+    title: str = Field(..., description="Product title")
+    category: Optional[str] = Field(None, description="Product category")
+    ratingCount: int = Field(..., description="Number of ratings")
+
+class RatingCreate(BaseModel):
+    rate: float = Field(..., ge=0, le=5, description="Rating value (0-5)")
+
+class RatingResponse(BaseModel):
+    productId: int = Field(..., description="Product ID")
+    rate: float = Field(..., description="Average rating")
+    count: int = Field(..., description="Number of ratings")
@@ -26,4 +26,7 @@ class UserResponse(UserBase):
     phone: str = Field(..., description="Phone number")
 
     class Config:
-        from_attributes = True  # Para ORM compatibility
\ No newline at end of file
+        from_attributes = True  # Para ORM compatibility
+
+class NearbyUserResponse(UserResponse):
+    distanceKm: float = Field(..., description="Distance from the query point in kilometers")
@@ -0,0 +1,43 @@
+import argparse
+import logging
+import time
+
+from app.core import config
+from app.core.backup import create_snapshot, list_snapshots, restore_latest_snapshot
+from app.core.database import DATABASE_PATHS
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("app")
+
+def main():
+    parser = argparse.ArgumentParser(description="Copias de seguridad en caliente de jagastore.db (y del catálogo si está separado)")
+    parser.add_argument("--every", type=float, default=0, help="Repetir cada N segundos (0: una sola copia)")
+    parser.add_argument("--restore", action="store_true", help="Restaurar el snapshot más reciente")
+    parser.add_argument("--list", action="store_true", help="Listar los snapshots disponibles")
+    args = parser.parse_args()
+
+    if args.list:
+        for db_path in DATABASE_PATHS:
+            for snapshot in list_snapshots(db_path=db_path):
+                print(snapshot)
+        return
+
+    if args.restore:
+        for db_path in DATABASE_PATHS:
+            if not restore_latest_snapshot(db_path):
+                logger.error(f"❌ No hay snapshots válidos de {db_path} en {config.BACKUP_DIR}")
+        return
+
+    while True:
+        for db_path in DATABASE_PATHS:
+            try:
+                create_snapshot(db_path)
+            except Exception as e:
+                logger.error(f"❌ Error creando snapshot de {db_path}: {e}")
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
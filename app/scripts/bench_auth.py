@@ -0,0 +1,154 @@
+"""Benchmark de autenticación: login con scrypt y lecturas autenticadas con JWT.
+
+Login: N logins concurrentes en un bucle asyncio, con scrypt en el pool de
+procesos frente a scrypt en línea. Mientras tanto un ticker mide cuánto se
+retrasa el bucle de eventos, que es lo que notan el resto de peticiones.
+
+Lectura autenticada: verificación del token por petición con la caché de
+tokens verificados frente a decodificar y comprobar la firma cada vez, y
+GET /auth/me de extremo a extremo.
+
+Uso: python -m app.scripts.bench_auth [logins_concurrentes] [logins_totales] [lecturas]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core import config
+from app.core.auth import issue_token, token_cache, verify_token
+from app.core.database import create_sqlite_engine
+from app.core.passwords import PasswordHasher, hash_password
+from app.core.schema import ensure_schema
+from app.models.user_model import User
+from app.services import auth_service
+from app.services.auth_service import AuthService
+
+USERS = 1000
+PASSWORD = "secreto123"
+
+def populate(session_factory):
+    stored = hash_password(PASSWORD)
+    db = session_factory()
+    db.execute(insert(User), [
+        {"email": f"user{i}@example.com", "username": f"user{i}", "password": stored,
+         "name": {"firstname": "Bench", "lastname": str(i)}, "address": {}, "phone": "600000000"}
+        for i in range(1, USERS + 1)
+    ])
+    db.commit()
+    db.close()
+
+async def login_load(session_factory, concurrency: int, total: int):
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        # Cada 5 ms: cuánto tarda de más el bucle en volver a darnos turno
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    counter = iter(range(total))
+    latencies = []
+
+    async def worker():
+        db = session_factory()
+        try:
+            for i in counter:
+                start = time.perf_counter()
+                user = await AuthService(db).authenticate(f"user{i % USERS + 1}", PASSWORD)
+                assert user is not None
+                latencies.append(time.perf_counter() - start)
+        finally:
+            db.close()
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    return elapsed, latencies, lags
+
+def report_logins(name: str, total: int, elapsed: float, latencies: list, lags: list):
+    latencies.sort()
+    lags.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    lag_p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0
+    print(f"  {name:<22} {total / elapsed:>7.1f} logins/s  p50 {statistics.median(latencies) * 1000:>7.1f} ms  "
+          f"p99 {p99 * 1000:>7.1f} ms  retraso del bucle p99 {lag_p99 * 1000:>6.1f} ms, máx {max(lags, default=0) * 1000:>6.1f} ms")
+
+def bench_logins(session_factory, concurrency: int, total: int):
+    print(f"login: {total} logins, {concurrency} concurrentes, scrypt n={config.AUTH_SCRYPT_N}")
+    for name, workers in (("scrypt en línea", 0), (f"pool de {config.AUTH_HASH_WORKERS} procesos", config.AUTH_HASH_WORKERS)):
+        hasher = PasswordHasher(workers=workers)
+        hasher.start()
+        # El servicio usa el pool global; se sustituye durante la medición
+        original, auth_service.password_hasher = auth_service.password_hasher, hasher
+        try:
+            report_logins(name, total, *asyncio.run(login_load(session_factory, concurrency, total)))
+        finally:
+            auth_service.password_hasher = original
+            hasher.stop()
+
+def timed_reads(name: str, fn, count: int):
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<34} {count / elapsed:>10.0f} lecturas/s  ({elapsed / count * 1e6:.1f} µs por petición)")
+
+def bench_reads(reads: int):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    tokens = [issue_token(i, f"user{i}")[0] for i in range(1, 101)]
+    print(f"lectura autenticada: {reads} verificaciones sobre {len(tokens)} tokens")
+    original_size = token_cache.max_entries
+    try:
+        token_cache.max_entries, i = 0, 0
+        token_cache.clear()
+        def verify():
+            nonlocal i
+            verify_token(tokens[i % len(tokens)])
+            i += 1
+        timed_reads("verify_token sin caché", verify, reads)
+        token_cache.max_entries = original_size
+        timed_reads("verify_token con caché", verify, reads)
+
+        # Sin eventos de startup: GET /auth/me no toca la base de datos
+        client = TestClient(app)
+        headers = [{"Authorization": f"Bearer {token}"} for token in tokens]
+        requests = max(1, reads // 50)
+        for name, size in (("GET /auth/me sin caché", 0), ("GET /auth/me con caché", original_size)):
+            token_cache.max_entries = size
+            token_cache.clear()
+            def me():
+                nonlocal i
+                assert client.get("/auth/me", headers=headers[i % len(headers)]).status_code == 200
+                i += 1
+            timed_reads(name, me, requests)
+    finally:
+        token_cache.max_entries = original_size
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    reads = int(sys.argv[3]) if len(sys.argv) > 3 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        ensure_schema(engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        populate(session_factory)
+        bench_logins(session_factory, concurrency, total)
+        engine.dispose()
+    bench_reads(reads)
+
+if __name__ == "__main__":
+    main()
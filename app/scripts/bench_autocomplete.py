@@ -0,0 +1,109 @@
+"""Benchmark del autocompletado: índice de prefijos en memoria frente a SQLite (LIKE).
+
+Genera un catálogo sintético, construye el índice y mide la latencia de
+consultas de 1 a 5 caracteres (algunas con dos palabras) y la memoria que
+ocupa.
+
+Uso: python -m app.scripts.bench_autocomplete [productos] [consultas]
+     python -m app.scripts.bench_autocomplete 1000000   (presupuesto para 1M de títulos)
+"""
+import itertools
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core import config
+from app.core.autocomplete import AutocompleteIndex
+from app.core.database import create_sqlite_engine
+from app.core.schema import ensure_schema
+from app.models.product_model import Product
+from app.services.product_service import ProductService
+
+CATEGORIES = ["electronics", "jewelery", "men's clothing", "women's clothing", "books", "toys", "home", "sports"]
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    return list({
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(size)
+    })
+
+def populate(session_factory, count: int, words: list, rng: random.Random):
+    db = session_factory()
+    # Distribución sesgada de palabras, como en un catálogo real
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    for start in range(1, count + 1, 50_000):
+        rows = []
+        for i in range(start, min(start + 50_000, count + 1)):
+            title = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(3, 8))).capitalize()[:100]
+            ratings = int(rng.paretovariate(1.2))
+            rows.append({
+                "id": i, "title": title, "price": 1.0, "description": "", "category": rng.choice(CATEGORIES),
+                "image": "", "rating": {"rate": 4.0, "count": ratings}, "rating_rate": 4.0, "rating_count": ratings,
+            })
+        db.execute(insert(Product), rows)
+    db.commit()
+    db.close()
+
+def queries(words: list, count: int, rng: random.Random) -> list:
+    result = []
+    for _ in range(count):
+        prefix = rng.choice(words)[:rng.randint(1, 5)]
+        if rng.random() < 0.2:
+            prefix = f"{rng.choice(words)} {prefix}"
+        result.append(prefix)
+    return result
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return f"p50 {pick(0.5):>7.3f} ms  p99 {pick(0.99):>7.3f} ms  máx {samples[-1] * 1000:>7.3f} ms"
+
+def timed(fn, prefixes: list) -> list:
+    samples = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        fn(prefix)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    rng = random.Random(42)
+    words = vocabulary(50_000, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        ensure_schema(engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        populate(session_factory, count, words, rng)
+        db = session_factory()
+
+        index = AutocompleteIndex()
+        start = time.perf_counter()
+        index.load(db)
+        print(f"{count} productos, {len(index.terms)} términos, índice construido en {time.perf_counter() - start:.1f} s")
+        prefixes = queries(words, query_count, rng)
+
+        # Primera pasada: las cabezas de los prefijos cortos quedan ordenadas en caché
+        cold = timed(lambda prefix: index.query(prefix, limit=10), prefixes)
+        warm = timed(lambda prefix: index.query(prefix, limit=10), prefixes)
+        memory = index.memory_bytes()
+        print(f"memoria índice:   {memory / 2**20:>8.1f} MiB ({memory / count:.0f} bytes/título)")
+        print(f"índice (frío)     {percentiles(cold)}")
+        print(f"índice            {percentiles(warm)}")
+
+        # Sin índice cargado el servicio recurre a LIKE sobre el título
+        config.AUTOCOMPLETE_ENABLED = False
+        service = ProductService(db)
+        sql = timed(lambda prefix: service.autocomplete(prefix, limit=10), prefixes[:200])
+        print(f"SQLite LIKE       {percentiles(sql)}")
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark del snapshot columnar del catálogo frente a SQLite + ORM.
+
+Uso: python -m app.scripts.bench_catalog_snapshot [productos]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.catalog_snapshot import CatalogSnapshot
+from app.core.database import create_sqlite_engine
+from app.core.schema import ensure_schema
+from app.models.product_model import Product
+from app.services.product_service import ProductService
+
+CATEGORIES = ["electronics", "jewelery", "men's clothing", "women's clothing", "books", "toys", "home", "sports"]
+
+QUERIES = [
+    dict(category="electronics", sort_by="price", descending=True, limit=20),
+    dict(min_price=10, max_price=50, sort_by="rating", descending=True, limit=20),
+    dict(min_rating=4.5, sort_by="rating_count", descending=True, limit=10),
+    dict(sort_by="price", skip=1000, limit=50),
+]
+
+def populate(session_factory, count: int):
+    db = session_factory()
+    rows = [
+        {
+            "id": i,
+            "title": f"Producto {i}",
+            "price": round(random.uniform(1, 1000), 2),
+            "description": "Descripción de ejemplo",
+            "category": random.choice(CATEGORIES),
+            "image": f"https://example.com/{i}.png",
+            "rating": {"rate": round(random.uniform(1, 5), 1), "count": random.randint(0, 1000)},
+        }
+        for i in range(1, count + 1)
+    ]
+    db.bulk_insert_mappings(Product, rows)
+    db.commit()
+    db.close()
+
+def timed(fn, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        ensure_schema(engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        populate(session_factory, count)
+        db = session_factory()
+
+        # Memoria: productos ORM completos frente a las columnas del snapshot
+        tracemalloc.start()
+        products = db.query(Product).all()
+        orm_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del products
+        db.expunge_all()
+
+        snapshot = CatalogSnapshot()
+        snapshot.load(db)
+        print(f"{count} productos")
+        print(f"memoria ORM:      {orm_bytes / count:>8.1f} bytes/producto")
+        print(f"memoria snapshot: {snapshot.memory_bytes() / count:>8.1f} bytes/producto")
+
+        # Consultas: SQL (json_extract + ORDER BY) frente a numpy; con el
+        # snapshot global sin cargar, el servicio consulta SQLite
+        for query in QUERIES:
+            sql_ms = timed(lambda: ProductService(db).search_products(**query), repeat=5)
+            snapshot_ms = timed(lambda: snapshot.query(**query))
+            print(f"{str(query):<90} SQL {sql_ms:>8.2f} ms  snapshot {snapshot_ms:>7.3f} ms")
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
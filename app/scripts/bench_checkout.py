@@ -0,0 +1,103 @@
+"""Benchmark de compras concurrentes sobre un único producto con poco stock.
+
+Cientos de compradores compran a la vez carritos con el mismo producto. Las
+reservas condicionales deben vender exactamente el stock disponible, sin
+vender de más, tanto con commit por petición como con group commit.
+
+Uso: python -m app.scripts.bench_checkout [compradores] [stock] [hilos]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core import write_queue as wq
+from app.core.database import create_sqlite_engine
+from app.core.schema import ensure_schema
+from app.models.cart_model import CartItem
+from app.models.product_model import Product
+from app.services.cart_service import CartService, CheckoutError
+
+def populate(session_factory, buyers: int, stock: int):
+    db = session_factory()
+    db.add(Product(id=1, title="Producto", price=10.0, description="", category="bench", image="",
+                   rating={"rate": 0, "count": 0}, stock=stock))
+    db.bulk_insert_mappings(CartItem, [
+        {"id": i, "userId": i, "date": datetime.now(), "products": [{"productId": 1, "quantity": 1}]}
+        for i in range(1, buyers + 1)
+    ])
+    db.commit()
+    db.close()
+
+def run(session_factory, buyers: int, threads: int):
+    sold, rejected, errors = [], [], []
+    lock = threading.Lock()
+    pending = list(range(1, buyers + 1))
+
+    def worker():
+        db = session_factory()
+        try:
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    cart_id = pending.pop()
+                try:
+                    CartService(db).checkout(cart_id)
+                    outcome = sold
+                except CheckoutError:
+                    outcome = rejected
+                except Exception as e:
+                    db.rollback()
+                    outcome = errors
+                    cart_id = e
+                with lock:
+                    outcome.append(cart_id)
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start, len(sold), len(rejected), errors
+
+def main():
+    buyers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    stock = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    print(f"{buyers} compradores, stock {stock}, {threads} hilos")
+
+    for name, use_queue in (("commit por petición", False), ("group commit", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            ensure_schema(engine)
+            session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+            populate(session_factory, buyers, stock)
+            if use_queue:
+                wq.write_queue = wq.WriteQueue(session_factory)
+                wq.write_queue.start()
+            try:
+                elapsed, sold, rejected, errors = run(session_factory, buyers, threads)
+            finally:
+                wq.stop_write_queue()
+            db = session_factory()
+            remaining = db.get(Product, 1).stock
+            db.close()
+            print(
+                f"{name:<20} {(sold + rejected) / elapsed:>8.0f} compras/s  vendidas {sold:>5}  "
+                f"rechazadas {rejected:>5}  errores {len(errors):>4}  stock final {remaining}  "
+                f"vendido de más {max(0, sold - stock)}"
+            )
+            if errors:
+                print(f"  primer error: {errors[0]}")
+            engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark de búsquedas por proximidad: R*Tree frente a recorrer todos los usuarios.
+
+Compara, para un radio alrededor de puntos aleatorios:
+  - recorrido completo leyendo y parseando address.geolocation (lo que había)
+  - recorrido completo de las columnas numéricas lat/long (sin índice)
+  - índice R*Tree (UserService.get_users_nearby y get_users_in_box)
+
+Uso: python -m app.scripts.bench_nearby [usuarios] [radio_km]
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import create_sqlite_engine
+from app.core.geo import KM_PER_DEGREE, haversine_km
+from app.core.schema import ensure_schema
+from app.models.user_model import User
+from app.services.user_service import UserService
+
+# Usuarios repartidos alrededor de ciudades, como en una base real
+CITIES = [(40.42, -3.70), (41.39, 2.17), (48.86, 2.35), (51.51, -0.13), (40.71, -74.01), (-33.87, 151.21), (35.68, 139.69)]
+
+def populate(session_factory, count: int, rng: random.Random):
+    db = session_factory()
+    for start in range(0, count, 50_000):
+        rows = []
+        for i in range(start, min(start + 50_000, count)):
+            city_lat, city_long = rng.choice(CITIES)
+            lat, long = rng.gauss(city_lat, 0.5), rng.gauss(city_long, 0.5)
+            rows.append({
+                "email": f"user{i}@example.com", "username": f"user{i}", "password": "secret",
+                "name": {"firstname": "Bench", "lastname": str(i)}, "phone": "600000000",
+                "address": {"city": "bench", "geolocation": {"lat": f"{lat:.4f}", "long": f"{long:.4f}"}},
+                "lat": round(lat, 4), "long": round(long, 4),
+            })
+        db.execute(insert(User), rows)
+    db.commit()
+    db.close()
+
+def scan_json(db, lat: float, long: float, radius_km: float) -> int:
+    found = 0
+    for (address,) in db.execute(select(User.address)):
+        if isinstance(address, str):
+            address = json.loads(address)
+        geolocation = (address or {}).get("geolocation") or {}
+        try:
+            user_lat, user_long = float(geolocation["lat"]), float(geolocation["long"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        found += haversine_km(lat, long, user_lat, user_long) <= radius_km
+    return found
+
+def scan_columns(db, lat: float, long: float, radius_km: float) -> int:
+    delta = radius_km / KM_PER_DEGREE
+    rows = db.execute(select(User.lat, User.long).where(User.lat.between(lat - delta, lat + delta))).all()
+    return sum(haversine_km(lat, long, user_lat, user_long) <= radius_km for user_lat, user_long in rows)
+
+def timed(name: str, fn, points: list):
+    samples, results = [], []
+    for point in points:
+        start = time.perf_counter()
+        results.append(fn(*point))
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(0.99 * len(samples)))]
+    print(f"{name:<28} mediana {statistics.median(samples) * 1000:>9.2f} ms  p99 {p99 * 1000:>9.2f} ms  "
+          f"(media {statistics.mean(results):.0f} resultados)")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    radius = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        ensure_schema(engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        start = time.perf_counter()
+        populate(session_factory, count, rng)
+        print(f"{count} usuarios insertados (R*Tree mantenido por triggers) en {time.perf_counter() - start:.1f} s, "
+              f"radio {radius} km")
+
+        db = session_factory()
+        points = [(rng.gauss(city_lat, 0.5), rng.gauss(city_long, 0.5), radius) for city_lat, city_long in
+                  (rng.choice(CITIES) for _ in range(200))]
+        timed("recorrido JSON", lambda *p: scan_json(db, *p), points[:3])
+        timed("recorrido lat/long", lambda *p: scan_columns(db, *p), points[:20])
+        service = UserService(db)
+        timed("R*Tree cercanos (límite 100)", lambda *p: len(service.get_users_nearby(*p, limit=100)), points)
+
+        def box(lat, long, radius_km):
+            delta = radius_km / KM_PER_DEGREE
+            return len(service.get_users_in_box(lat - delta, lat + delta, long - delta, long + delta, limit=100))
+        timed("R*Tree caja (límite 100)", box, points)
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark de valoraciones concurrentes sobre un mismo producto.
+
+Compara la lectura-modificación-escritura del PUT (carga el producto,
+recalcula el JSON de rating en Python y lo guarda) con la sentencia atómica
+de ProductService.add_rating. Informa del rendimiento y de las
+valoraciones perdidas o rechazadas (database is locked al promocionar la
+transacción de lectura a escritura) de cada estrategia.
+
+Uso: python -m app.scripts.bench_ratings [hilos] [valoraciones_por_hilo]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import create_sqlite_engine
+from app.core.schema import ensure_schema
+from app.models.product_model import Product
+from app.services.product_service import ProductService
+
+def naive_rating(db, product_id: int, rate: float):
+    product = db.get(Product, product_id)
+    count = product.rating["count"] + 1
+    mean = (product.rating["rate"] * product.rating["count"] + rate) / count
+    product.rating = {"rate": round(mean, 2), "count": count}
+    db.commit()
+
+def atomic_rating(db, product_id: int, rate: float):
+    ProductService(db).add_rating(product_id, rate)
+
+def run(session_factory, strategy, threads: int, per_thread: int):
+    errors = []
+
+    def worker():
+        db = session_factory()
+        try:
+            for i in range(per_thread):
+                try:
+                    strategy(db, 1, float(i % 5 + 1))
+                except Exception as e:
+                    db.rollback()
+                    errors.append(e)
+        finally:
+            db.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    db = session_factory()
+    count = db.get(Product, 1).rating["count"]
+    db.close()
+    return elapsed, count, len(errors)
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    expected = threads * per_thread
+    print(f"{threads} hilos x {per_thread} valoraciones = {expected}")
+
+    for name, strategy in (("lectura-escritura", naive_rating), ("atómica", atomic_rating)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            ensure_schema(engine)
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            db = session_factory()
+            db.add(Product(
+                id=1, title="Producto", price=10.0, description="", category="bench", image="",
+                rating={"rate": 0, "count": 0}, rating_rate=0.0, rating_count=0,
+            ))
+            db.commit()
+            db.close()
+
+            elapsed, count, errors = run(session_factory, strategy, threads, per_thread)
+            print(
+                f"{name:<18} {(expected - errors) / elapsed:>8.0f} valoraciones/s  "
+                f"perdidas {expected - errors - count:>5}  errores {errors}"
+            )
+            engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark de altas de usuarios: comprobación de unicidad por SELECT, solo UNIQUE o índice en memoria.
+
+Cada estrategia registra los mismos usuarios sobre una base de datos ya
+poblada; una fracción de las altas repite un email o nombre de usuario
+existente y debe rechazarse con ValueError (400 en la API).
+
+Uso: python -m app.scripts.bench_signups [usuarios_existentes] [altas] [fraccion_duplicados]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core import config
+from app.core.database import count_statements, create_sqlite_engine
+from app.core.schema import ensure_schema
+from app.core.user_index import user_index
+from app.models.user_model import User
+from app.schemas.user_schemas import UserCreate
+from app.services.user_service import UserService
+
+def user_values(i: int) -> dict:
+    return dict(
+        email=f"user{i}@example.com", username=f"user{i}", password="secret",
+        name={"firstname": "Bench", "lastname": str(i)},
+        address={"city": "Madrid", "street": "Gran Vía", "number": i, "zipcode": "28013",
+                 "geolocation": {"lat": "40.42", "long": "-3.70"}},
+        phone="600000000",
+    )
+
+def populate(session_factory, count: int):
+    db = session_factory()
+    db.execute(insert(User), [user_values(i) for i in range(count)])
+    db.commit()
+    db.close()
+
+def signups(existing: int, count: int, duplicates: float, seed: int) -> list:
+    rng = random.Random(seed)
+    result = []
+    for i in range(count):
+        if rng.random() < duplicates:
+            values = user_values(rng.randrange(existing))
+            # Mitad con el email repetido, mitad solo con el nombre de usuario
+            if rng.random() < 0.5:
+                values["email"] = f"new{seed}-{i}@example.com"
+        else:
+            values = user_values(existing + seed * count + i)
+        result.append(UserCreate(**values))
+    return result
+
+def select_then_insert(db, user: UserCreate):
+    # Estrategia anterior: una consulta por campo antes del INSERT
+    for column, value in ((User.email, user.email), (User.username, user.username)):
+        if db.execute(select(User.id).where(column == value)).first() is not None:
+            raise ValueError(f"{value} ya está registrado")
+    UserService(db).create_user(user)
+
+def run(name: str, engine, session_factory, users: list, create):
+    db = session_factory()
+    rejected = 0
+    with count_statements(engine) as statements:
+        start = time.perf_counter()
+        for user in users:
+            try:
+                create(db, user)
+            except ValueError:
+                rejected += 1
+        elapsed = time.perf_counter() - start
+    db.close()
+    queries = sum(1 for s in statements if s.strip().upper() not in ("BEGIN", "COMMIT", "ROLLBACK"))
+    print(f"{name:<22} {len(users) / elapsed:>8.0f} altas/s  {queries / len(users):>5.2f} sentencias/alta  "
+          f"{rejected} rechazadas")
+
+def main():
+    existing = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    duplicates = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+    # Los rechazos esperados se registran como error en el servicio
+    logging.disable(logging.ERROR)
+    # Se mide la comprobación de unicidad, no scrypt: coste mínimo para el hash
+    config.AUTH_SCRYPT_N = 2
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        ensure_schema(engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+        populate(session_factory, existing)
+        print(f"{existing} usuarios existentes, {count} altas, {duplicates:.0%} duplicadas")
+
+        # Sin índice cargado el servicio deja que decida la restricción UNIQUE
+        run("SELECT + INSERT", engine, session_factory, signups(existing, count, duplicates, 1), select_then_insert)
+        run("solo UNIQUE", engine, session_factory, signups(existing, count, duplicates, 2),
+            lambda db, user: UserService(db).create_user(user))
+
+        db = session_factory()
+        start = time.perf_counter()
+        user_index.load(db)
+        db.close()
+        print(f"índice cargado en {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"filtros de Bloom {user_index.memory_bytes() / 1024:.0f} KiB "
+              f"(falsos positivos {config.USER_INDEX_FALSE_POSITIVE_RATE:.0%})")
+        run("índice en memoria", engine, session_factory, signups(existing, count, duplicates, 3),
+            lambda db, user: UserService(db).create_user(user))
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
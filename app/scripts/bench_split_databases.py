@@ -0,0 +1,117 @@
+"""Benchmark de carga mixta: catálogo y carritos en una base frente a bases separadas.
+
+Varios hilos añaden líneas a carritos sin parar mientras otros editan
+productos (lo que haría un administrador). Con una sola base todos compiten
+por el mismo bloqueo de escritura; con el catálogo en su propio fichero cada
+dominio tiene el suyo.
+
+Uso: python -m app.scripts.bench_split_databases [hilos_carritos] [hilos_catálogo] [segundos]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from app.core.database import attach_catalog, create_session_factory, create_sqlite_engine
+from app.core.schema import ensure_schema
+from app.models.cart_model import CartItem
+from app.models.product_model import Product
+from app.schemas.product_schemas import ProductUpdate
+from app.services.cart_service import CartService
+from app.services.product_service import ProductService
+
+PRODUCTS = 1000
+CARTS = 2000
+
+def populate(session_factory):
+    db = session_factory()
+    db.bulk_insert_mappings(Product, [
+        {"id": i, "title": f"Producto {i}", "price": 10.0, "description": "", "category": "bench", "image": "",
+         "rating": {"rate": 0, "count": 0}, "rating_rate": 0, "rating_count": 0, "stock": 100}
+        for i in range(1, PRODUCTS + 1)
+    ])
+    db.bulk_insert_mappings(CartItem, [
+        {"id": i, "userId": i % 100 + 1, "date": datetime.now(), "products": []}
+        for i in range(1, CARTS + 1)
+    ])
+    db.commit()
+    db.close()
+
+def run(session_factory, cart_threads: int, catalog_threads: int, seconds: float):
+    latencies = {"carritos": [], "catálogo": []}
+    errors = {"carritos": 0, "catálogo": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def add_lines(db, rng):
+        CartService(db).add_item(rng.randint(1, CARTS), rng.randint(1, PRODUCTS), 1)
+
+    def edit_products(db, rng):
+        ProductService(db).update_product(rng.randint(1, PRODUCTS), ProductUpdate(price=round(rng.uniform(1, 100), 2)))
+
+    def worker(kind: str, operation, seed: int):
+        rng = random.Random(seed)
+        db = session_factory()
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    operation(db, rng)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies[kind].append(elapsed)
+                except Exception:
+                    db.rollback()
+                    with lock:
+                        errors[kind] += 1
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=worker, args=("carritos", add_lines, i)) for i in range(cart_threads)]
+    pool += [threading.Thread(target=worker, args=("catálogo", edit_products, 1000 + i)) for i in range(catalog_threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, errors
+
+def report(name: str, latencies: dict, errors: dict, seconds: float):
+    print(name)
+    for kind, samples in latencies.items():
+        samples.sort()
+        p50 = statistics.median(samples) * 1000 if samples else 0
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000 if samples else 0
+        print(f"  {kind:<10} {len(samples) / seconds:>9.1f} esc/s  p50 {p50:>8.2f} ms  p99 {p99:>8.2f} ms  "
+              f"errores {errors[kind]}")
+
+def main():
+    cart_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    catalog_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    print(f"{cart_threads} hilos de carritos + {catalog_threads} de catálogo, {seconds:.0f} s por configuración")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'single.db')}")
+        ensure_schema(engine)
+        session_factory = create_session_factory(engine, engine)
+        populate(session_factory)
+        report("una sola base", *run(session_factory, cart_threads, catalog_threads, seconds), seconds)
+        engine.dispose()
+
+        catalog_path = os.path.join(tmp, "catalog.db")
+        catalog_engine = create_sqlite_engine(f"sqlite:///{catalog_path}")
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'store.db')}")
+        attach_catalog(engine, catalog_path)
+        ensure_schema(engine, catalog_engine)
+        session_factory = create_session_factory(engine, catalog_engine)
+        populate(session_factory)
+        report("catálogo separado", *run(session_factory, cart_threads, catalog_threads, seconds), seconds)
+        engine.dispose()
+        catalog_engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark de escrituras concurrentes: commit por petición frente a group commit.
+
+Uso: python -m app.scripts.bench_write_queue [hilos] [escrituras_por_hilo]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core import write_queue as wq
+from app.core.database import create_sqlite_engine
+from app.models.dec_base import DecBase
+from app.models.cart_model import CartItem  # noqa: F401 - registra la tabla
+from app.models.product_model import Product  # noqa: F401
+from app.models.user_model import User  # noqa: F401
+from app.schemas.cart_schemas import CartCreate
+from app.services.cart_service import CartService
+
+def run(session_factory, threads: int, writes_per_thread: int):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(writes_per_thread):
+            cart = CartCreate(userId=1, date=datetime.now(), products=[{"productId": 1, "quantity": 1}])
+            db = session_factory()
+            start = time.perf_counter()
+            try:
+                CartService(db).create_cart(cart)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                db.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    total = time.perf_counter() - start
+    return latencies, errors, total
+
+def report(name, latencies, errors, total):
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    print(f"{name:<22} {len(latencies) / total:>10.1f} esc/s  p50 {p50:>8.2f} ms  p99 {p99:>8.2f} ms  errores {len(errors)}")
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    writes_per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        DecBase.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        print(f"{threads} hilos x {writes_per_thread} escrituras")
+        report("commit por petición", *run(session_factory, threads, writes_per_thread))
+
+        wq.write_queue = wq.WriteQueue(session_factory)
+        wq.write_queue.start()
+        try:
+            report("group commit", *run(session_factory, threads, writes_per_thread))
+            print(f"lotes: {wq.write_queue.batches}, escrituras: {wq.write_queue.writes}")
+        finally:
+            wq.stop_write_queue()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Sentencias SQL por escritura de los servicios, incluida la serialización de la respuesta.
+
+Cada alta, modificación o baja debe emitir una única sentencia (INSERT/UPDATE/
+DELETE ... RETURNING) más las propias de sus efectos secundarios (agregados de
+ventas en los carritos), sin SELECT previo ni refresh tras el commit.
+
+Uso: python -m app.scripts.count_write_statements
+"""
+import os
+import tempfile
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import count_statements, create_sqlite_engine
+from app.core.schema import ensure_schema
+from app.schemas.cart_schemas import CartCreate, CartResponse, CartUpdate
+from app.schemas.product_schemas import ProductCreate, ProductResponse, ProductUpdate
+from app.schemas.user_schemas import UserCreate, UserResponse, UserUpdate
+from app.services.cart_service import CartService
+from app.services.product_service import ProductService
+from app.services.user_service import UserService
+
+def measure(engine, name: str, operation, response_schema=None):
+    with count_statements(engine) as statements:
+        result = operation()
+        # Serializar como lo haría el endpoint: no debe disparar cargas perezosas
+        if response_schema is not None:
+            response_schema.model_validate(result, from_attributes=True)
+    # BEGIN lo emite el engine al abrir la transacción; no es una consulta
+    queries = [s.split()[0].upper() for s in statements if s.strip().upper() != "BEGIN"]
+    print(f"{name:<20} {len(queries):>2} sentencias  {' '.join(queries)}")
+    return result
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        ensure_schema(engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+        db = session_factory()
+
+        user = measure(engine, "crear usuario", lambda: UserService(db).create_user(UserCreate(
+            email="bench@example.com", username="bench", password="secret",
+            name={"firstname": "Bench", "lastname": "User"},
+            address={"city": "Madrid", "street": "Gran Vía", "number": 1, "zipcode": "28013",
+                     "geolocation": {"lat": "40.42", "long": "-3.70"}},
+            phone="600000000",
+        )), UserResponse)
+        measure(engine, "modificar usuario",
+                lambda: UserService(db).update_user(user.id, UserUpdate(phone="611111111")), UserResponse)
+
+        product = measure(engine, "crear producto", lambda: ProductService(db).create_product(ProductCreate(
+            title="Producto", price=10.0, description="", category="bench", image="https://example.com/p.png",
+            rating={"rate": 4.0, "count": 1},
+        )), ProductResponse)
+        measure(engine, "modificar producto",
+                lambda: ProductService(db).update_product(product.id, ProductUpdate(price=12.5)), ProductResponse)
+
+        cart = measure(engine, "crear carrito", lambda: CartService(db).create_cart(CartCreate(
+            userId=user.id, date=datetime.now(), products=[{"productId": product.id, "quantity": 2}],
+        )), CartResponse)
+        measure(engine, "modificar carrito", lambda: CartService(db).update_cart(
+            cart.id, CartUpdate(products=[{"productId": product.id, "quantity": 3}])), CartResponse)
+        measure(engine, "añadir línea", lambda: CartService(db).add_item(cart.id, product.id, 1))
+
+        measure(engine, "eliminar carrito", lambda: CartService(db).delete_cart(cart.id))
+        measure(engine, "eliminar producto", lambda: ProductService(db).delete_product(product.id))
+        measure(engine, "eliminar usuario", lambda: UserService(db).delete_user(user.id))
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,9 @@ from sqlalchemy.orm import Session
 from app.models.cart_model import CartItem
 from app.models.user_model import User
 from app.models.product_model import Product
-from app.models.dec_base import DecBase
-from app.core.database import engine, get_db
+from app.core.config import PRODUCT_INITIAL_STOCK
+from app.core.database import catalog_engine, engine, get_db
+from app.core.schema import ensure_schema
 
 # Constantes para la Fake Store API
 FAKE_STORE_API_BASE_URL = "https://fakestoreapi.com"
@@ -53,6 +54,9 @@ def insert_data_generic(db: Session, data_list: list, model_class):
         for data in data_list:
             if 'date' in data and isinstance(data['date'], str):
                 data['date'] = datetime.fromisoformat(data['date'].replace('Z', '+00:00'))
+            # La Fake Store API no trae stock: sin él ningún carrito se podría comprar
+            if model_class is Product:
+                data.setdefault('stock', PRODUCT_INITIAL_STOCK)
         
         db.bulk_insert_mappings(model_class, data_list)
         db.commit()
@@ -65,7 +69,7 @@ def insert_data_generic(db: Session, data_list: list, model_class):
 
 if __name__ == "__main__":
     # Crear tablas
-    DecBase.metadata.create_all(bind=engine)
+    ensure_schema(engine, catalog_engine)
     
      # Usar get_db() como generador
     db_generator = get_db()
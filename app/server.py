@@ -0,0 +1,23 @@
+"""Punto de entrada de producción: python -m app.server
+
+Arranca JAGASTORE_WORKERS procesos de uvicorn sin file watcher. Cada worker
+aplica los ajustes de SQLite al abrir sus conexiones y se calienta en el
+evento de startup, antes de que uvicorn empiece a aceptar conexiones.
+"""
+import uvicorn
+
+from app.core import config
+
+def main():
+    uvicorn.run(
+        "app.main:app",
+        host=config.SERVER_HOST,
+        port=config.SERVER_PORT,
+        workers=config.SERVER_WORKERS,
+        timeout_graceful_shutdown=config.SERVER_GRACEFUL_SHUTDOWN_S,
+        proxy_headers=True,
+        forwarded_allow_ips=config.SERVER_FORWARDED_ALLOW_IPS,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from app.core.database import on_store_connection
+from app.core.jobs import enqueue_job, job_handler
+from app.core.write_queue import execute_write
+from app.core.tracing import traced
+from app.models.analytics_model import ArchivedCartSales, CartSales, ProductSales, UserSpend
+from app.models.cart_model import CartItem
+from app.models.product_model import Product
+from app.services.recommendation_service import RecommendationService, record_cart_pairs
+import logging
+
+# Logger específico para servicios
+logger = logging.getLogger("services")
+
+def normalize_cart_lines(products) -> Dict[int, int]:
+    """Agrupar las líneas del carrito en {productId: cantidad}"""
+    quantities: Dict[int, int] = {}
+    for line in products or []:
+        try:
+            product_id = int(line["productId"])
+            quantity = int(line.get("quantity", 1))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if quantity > 0:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+class AnalyticsService:
+    def __init__(self, db: Session):
+        self.db = db
+        logger.debug("AnalyticsService inicializado")
+
+    @traced
+    def get_top_products(self, limit: int = 10) -> List[ProductSales]:
+        """Productos más vendidos por unidades"""
+        logger.debug(f"Obteniendo top {limit} productos")
+        return (
+            self.db.query(ProductSales)
+            .filter(ProductSales.units > 0)
+            .order_by(ProductSales.units.desc())
+            .limit(limit)
+            .all()
+        )
+
+    @traced
+    def get_top_users(self, limit: int = 10) -> List[UserSpend]:
+        """Usuarios con mayor gasto"""
+        logger.debug(f"Obteniendo top {limit} usuarios por gasto")
+        return (
+            self.db.query(UserSpend)
+            .filter(UserSpend.total > 0)
+            .order_by(UserSpend.total.desc())
+            .limit(limit)
+            .all()
+        )
+
+    @traced
+    def get_user_spend(self, user_id: int) -> UserSpend:
+        """Gasto acumulado de un usuario"""
+        logger.debug(f"Obteniendo gasto del usuario ID: {user_id}")
+        spend = self.db.get(UserSpend, user_id)
+        if spend is None:
+            spend = UserSpend(userId=user_id, carts=0, units=0, total=0.0)
+        return spend
+
+    @traced
+    def record_cart(self, cart_id: int, user_id: Optional[int], products: Optional[list], pairs: bool = True):
+        """Aplicar a los agregados la diferencia entre el estado contabilizado y el nuevo.
+
+        Se llama dentro de la transacción de la escritura del carrito; products=None
+        indica que el carrito se ha eliminado. Con pairs=True se actualiza también
+        la matriz de co-ocurrencia de las recomendaciones.
+        """
+        previous = self.db.get(CartSales, cart_id)
+        old_lines = {line["productId"]: line for line in previous.lines} if previous else {}
+        old_user = previous.userId if previous else None
+
+        quantities = normalize_cart_lines(products) if products is not None else {}
+
+        # Las líneas ya contabilizadas conservan su precio; las nuevas toman el actual
+        missing = [pid for pid in quantities if pid not in old_lines]
+        prices = {}
+        if missing:
+            # Lectura del catálogo adjunto dentro de la transacción del carrito
+            stmt = select(Product.id, Product.price).where(Product.id.in_(missing))
+            prices = dict(self.db.execute(stmt, bind_arguments=on_store_connection(self.db)).all())
+        new_lines = {
+            pid: {
+                "productId": pid,
+                "quantity": quantity,
+                "price": old_lines[pid]["price"] if pid in old_lines else float(prices.get(pid) or 0.0),
+            }
+            for pid, quantity in quantities.items()
+        }
+
+        # Deltas por producto: (unidades, ingresos, carritos)
+        product_deltas: Dict[int, Tuple[int, float, int]] = {}
+        for pid in set(old_lines) | set(new_lines):
+            old = old_lines.get(pid)
+            new = new_lines.get(pid)
+            units = (new["quantity"] if new else 0) - (old["quantity"] if old else 0)
+            revenue = (new["quantity"] * new["price"] if new else 0.0) - (old["quantity"] * old["price"] if old else 0.0)
+            carts = (1 if new else 0) - (1 if old else 0)
+            if units or revenue or carts:
+                product_deltas[pid] = (units, revenue, carts)
+
+        self._apply_product_deltas(product_deltas)
+
+        # Deltas por usuario: se resta al anterior y se suma al nuevo (puede ser el mismo)
+        user_deltas: Dict[int, List[float]] = {}
+        if previous and old_user is not None:
+            delta = user_deltas.setdefault(old_user, [0, 0, 0.0])
+            delta[0] -= 1
+            delta[1] -= sum(line["quantity"] for line in old_lines.values())
+            delta[2] -= sum(line["quantity"] * line["price"] for line in old_lines.values())
+        if products is not None and user_id is not None:
+            delta = user_deltas.setdefault(user_id, [0, 0, 0.0])
+            delta[0] += 1
+            delta[1] += sum(line["quantity"] for line in new_lines.values())
+            delta[2] += sum(line["quantity"] * line["price"] for line in new_lines.values())
+
+        self._apply_user_deltas(user_deltas)
+
+        if pairs:
+            record_cart_pairs(self.db, old_lines, new_lines)
+
+        # Guardar la contribución contabilizada del carrito
+        if products is None:
+            if previous:
+                self.db.delete(previous)
+        elif previous:
+            previous.userId = user_id
+            previous.lines = list(new_lines.values())
+        else:
+            self.db.add(CartSales(cartId=cart_id, userId=user_id, lines=list(new_lines.values())))
+        self.db.flush()
+
+    def _apply_product_deltas(self, product_deltas: Dict[int, Tuple[int, float, int]]):
+        for pid, (units, revenue, carts) in product_deltas.items():
+            stmt = insert(ProductSales).values(productId=pid, units=units, revenue=revenue, carts=carts)
+            self.db.execute(stmt.on_conflict_do_update(
+                index_elements=[ProductSales.productId],
+                set_={
+                    "units": ProductSales.units + stmt.excluded.units,
+                    "revenue": func.round(ProductSales.revenue + stmt.excluded.revenue, 2),
+                    "carts": ProductSales.carts + stmt.excluded.carts,
+                },
+            ))
+
+    def _apply_user_deltas(self, user_deltas: Dict[int, List[float]]):
+        for uid, (carts, units, total) in user_deltas.items():
+            if not (carts or units or total):
+                continue
+            stmt = insert(UserSpend).values(userId=uid, carts=carts, units=units, total=total)
+            self.db.execute(stmt.on_conflict_do_update(
+                index_elements=[UserSpend.userId],
+                set_={
+                    "carts": UserSpend.carts + stmt.excluded.carts,
+                    "units": UserSpend.units + stmt.excluded.units,
+                    "total": func.round(UserSpend.total + stmt.excluded.total, 2),
+                },
+            ))
+
+    def _add_archived(self, rows: List[Tuple[Optional[int], list]]):
+        """Sumar a los agregados la contribución guardada de carritos archivados"""
+        product_deltas: Dict[int, Tuple[int, float, int]] = {}
+        user_deltas: Dict[int, List[float]] = {}
+        for user_id, lines in rows:
+            for line in lines:
+                units, revenue, carts = product_deltas.get(line["productId"], (0, 0.0, 0))
+                product_deltas[line["productId"]] = (
+                    units + line["quantity"], revenue + line["quantity"] * line["price"], carts + 1
+                )
+            if user_id is not None:
+                delta = user_deltas.setdefault(user_id, [0, 0, 0.0])
+                delta[0] += 1
+                delta[1] += sum(line["quantity"] for line in lines)
+                delta[2] += sum(line["quantity"] * line["price"] for line in lines)
+        # Sumas de muchos carritos: se redondean como las que acumula la base
+        self._apply_product_deltas({pid: (u, round(r, 2), c) for pid, (u, r, c) in product_deltas.items()})
+        self._apply_user_deltas({uid: [c, u, round(t, 2)] for uid, (c, u, t) in user_deltas.items()})
+
+    @traced
+    def is_empty(self) -> bool:
+        """True si aún no se ha contabilizado ningún carrito"""
+        return self.db.execute(select(CartSales.cartId).limit(1)).first() is None
+
+    @traced
+    def rebuild(self, chunk_size: int = 500) -> int:
+        """Reconstruir los agregados desde cart_items y los carritos archivados, por bloques"""
+        logger.info(f"Reconstruyendo analítica de ventas (bloques de {chunk_size})")
+        self.db.execute(delete(ProductSales))
+        self.db.execute(delete(UserSpend))
+        self.db.execute(delete(CartSales))
+        self.db.commit()
+
+        # Los carritos archivados ya no están en cart_items: se suma la
+        # contribución que tenían al archivarse, con sus precios de entonces
+        last_id = 0
+        archived = 0
+        while True:
+            rows = self.db.execute(
+                select(ArchivedCartSales.id, ArchivedCartSales.userId, ArchivedCartSales.lines)
+                .where(ArchivedCartSales.id > last_id)
+                .order_by(ArchivedCartSales.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            self._add_archived([(user_id, lines) for _, user_id, lines in rows])
+            self.db.commit()
+            last_id = rows[-1][0]
+            archived += len(rows)
+
+        # Recorrido por rango de id: cada bloque es una transacción corta,
+        # las escrituras concurrentes de carritos se intercalan sin conflicto
+        last_id = 0
+        processed = 0
+        while True:
+            rows = self.db.execute(
+                select(CartItem.id, CartItem.userId, CartItem.products)
+                .where(CartItem.id > last_id)
+                .order_by(CartItem.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            # La matriz de co-ocurrencia se reconstruye al final de una vez
+            for cart_id, user_id, products in rows:
+                self.record_cart(cart_id, user_id, products or [], pairs=False)
+            self.db.commit()
+            last_id = rows[-1][0]
+            processed += len(rows)
+            logger.debug(f"Analítica reconstruida hasta carrito ID {last_id}")
+
+        logger.info(f"Analítica de ventas reconstruida: {processed} carritos y {archived} archivados")
+        RecommendationService(self.db).rebuild()
+        return processed
+    
+    @traced
+    def enqueue_rebuild(self, chunk_size: int = 500) -> int:
+        """Encolar la reconstrucción de los agregados y devolver el id del trabajo"""
+        job_id = execute_write(self.db, lambda db: enqueue_job(db, "analytics.rebuild", {"chunkSize": chunk_size}, max_attempts=1))
+        logger.info(f"Reconstrucción de analítica encolada: trabajo {job_id}")
+        return job_id
+
+@job_handler("analytics.cart")
+def _sync_cart_sales(db: Session, payload: dict):
+    cart_id = payload["cartId"]
+    cart = db.execute(select(CartItem.userId, CartItem.products).where(CartItem.id == cart_id)).first()
+    if cart is None:
+        AnalyticsService(db).record_cart(cart_id, None, None)
+    else:
+        AnalyticsService(db).record_cart(cart_id, cart.userId, cart.products or [])
+
+@job_handler("analytics.rebuild")
+def _rebuild_sales(db: Session, payload: dict):
+    return {"carts": AnalyticsService(db).rebuild(chunk_size=payload.get("chunkSize", 500))}
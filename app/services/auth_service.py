@@ -0,0 +1,62 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from app.models.user_model import User
+from app.core.auth import AuthenticatedUser
+from app.core.passwords import hash_password, needs_rehash, password_hasher, verify_password
+from app.core.write_queue import execute_write
+from app.core.tracing import traced
+import logging
+
+# Logger específico para servicios
+logger = logging.getLogger("services")
+
+# Hash de referencia para los usuarios inexistentes: el login tarda lo mismo
+# y no revela qué nombres de usuario están registrados
+_dummy_hash: Optional[str] = None
+
+class AuthService:
+    """Login por usuario y contraseña.
+
+    Es asíncrono porque el coste está en scrypt, que corre en el pool de
+    procesos; las consultas van al threadpool como en los handlers síncronos.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        logger.debug("AuthService inicializado")
+
+    def _credentials(self, username: str):
+        return self.db.execute(select(User.id, User.username, User.password).where(User.username == username)).first()
+
+    def _upgrade_password(self, user_id: int, old: str, new: str):
+        # Condicionado al valor leído: si la contraseña cambió entretanto, gana el cambio
+        def write(db: Session) -> int:
+            return db.execute(update(User).where(User.id == user_id, User.password == old).values(password=new)).rowcount
+        if execute_write(self.db, write):
+            logger.info(f"Contraseña del usuario {user_id} migrada a scrypt")
+
+    @traced
+    async def authenticate(self, username: str, password: str) -> Optional[AuthenticatedUser]:
+        """Comprobar las credenciales; None si no son válidas. Puede lanzar HasherBusy"""
+        global _dummy_hash
+        row = await run_in_threadpool(self._credentials, username)
+        if row is None:
+            if _dummy_hash is None:
+                _dummy_hash = await password_hasher.run_async(hash_password, "")
+            await password_hasher.run_async(verify_password, password, _dummy_hash)
+            logger.warning(f"Login fallido: usuario {username} no encontrado")
+            return None
+        if not await password_hasher.run_async(verify_password, password, row.password):
+            logger.warning(f"Login fallido: contraseña incorrecta para {username}")
+            return None
+        # Texto plano heredado o parámetros antiguos: se rehace con los actuales
+        if needs_rehash(row.password):
+            try:
+                new_hash = await password_hasher.run_async(hash_password, password)
+                await run_in_threadpool(self._upgrade_password, row.id, row.password, new_hash)
+            except Exception as e:
+                logger.error(f"Error migrando la contraseña del usuario {row.id}: {e}")
+        logger.info(f"Login correcto: {username} (ID: {row.id})")
+        return AuthenticatedUser(id=row.id, username=row.username, expires_at=0)
@@ -1,17 +1,121 @@
+from sqlalchemy import delete, exists, insert, select, text, update
+from datetime import datetime
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.models.cart_model import CartItem
-from app.schemas.cart_schemas import CartCreate, CartUpdate
+from app.models.job_model import Job
+from app.models.product_model import Product
+from app.schemas.cart_schemas import CartCreate, CartUpdate, CheckoutResponse
+from app.schemas.product_schemas import ProductResponse
+from app.core import config
+from app.core.cart_archive import get_archived_cart, list_archived_carts
+from app.core.catalog_snapshot import track_catalog_write
+from app.core.change_feed import record_product_change
+from app.core.database import on_store_connection
+from app.core.jobs import PermanentJobError, enqueue_job, job_handler
+from app.core.row_counters import adjust_counts, count_rows, counter_key, row_delta
+from app.core.write_queue import execute_write
+from app.core.tracing import traced
+from app.services.analytics_service import AnalyticsService, normalize_cart_lines
 import logging
 
 # Logger específico para servicios
 logger = logging.getLogger("services")
 
+class CheckoutError(Exception):
+    """La compra no puede completarse; no queda aplicada ninguna reserva"""
+
+    def __init__(self, message: str, products: Optional[List[int]] = None):
+        super().__init__(message)
+        self.products = products or []
+
+class AlreadyCheckedOutError(CheckoutError):
+    """El carrito ya se compró antes (otra petición u otro intento del mismo trabajo)"""
+
+class CartLockedError(Exception):
+    """El carrito ya se ha comprado y no admite cambios"""
+
+class CartOwnerError(Exception):
+    """El carrito pertenece a otro usuario"""
+
+def _ensure_cart_owner(db: Session, cart_id: int, owner_id: Optional[int]):
+    """Dentro de la escritura, CartOwnerError si el carrito es de otro usuario.
+
+    La lectura va en la misma transacción que la escritura (abierta con BEGIN
+    IMMEDIATE): no promociona un bloqueo de lectura ni ve un dueño ya cambiado.
+    Sin owner_id no se comprueba; si el carrito no existe, la escritura da None
+    """
+    if owner_id is None:
+        return
+    cart = db.execute(select(CartItem.userId).where(CartItem.id == cart_id)).first()
+    if cart is not None and cart.userId != owner_id:
+        raise CartOwnerError("El carrito pertenece a otro usuario")
+
+def _ensure_not_checked_out(db: Session, cart_id: int):
+    """Tras una escritura que no tocó ninguna fila: CartLockedError si el carrito ya se compró"""
+    if db.execute(select(CartItem.checkedOutAt).where(CartItem.id == cart_id)).scalar() is not None:
+        raise CartLockedError("El carrito ya se ha comprado")
+
+def _record_sales(db: Session, cart_id: int, user_id: Optional[int], products: Optional[list]):
+    """Actualizar la analítica de ventas del carrito, en segundo plano si hay trabajos"""
+    if config.JOBS_ENABLED:
+        # El trabajo lee el estado del carrito al ejecutarse: reintentos y
+        # trabajos repetidos del mismo carrito aplican siempre el delta correcto
+        enqueue_job(db, "analytics.cart", {"cartId": cart_id})
+    else:
+        AnalyticsService(db).record_cart(cart_id, user_id, products)
+
+# Mutaciones de una línea del carrito en una sola sentencia: SQLite reescribe el
+# array JSON en el motor y RETURNING devuelve el estado resultante, sin leer
+# antes la fila ni reenviar la lista completa de productos. Un carrito ya
+# comprado no cambia: sus líneas son las de la venta registrada
+_LINE_MATCH = "json_extract(value, '$.productId') = :product_id"
+_HAS_LINE = f"EXISTS (SELECT 1 FROM json_each(products) WHERE {_LINE_MATCH})"
+_RETURNING = 'RETURNING id, "userId", date, products'
+
+_ADD_LINE = text(f"""
+    UPDATE cart_items
+    SET products = CASE
+        WHEN {_HAS_LINE} THEN (
+            SELECT json_group_array(CASE
+                WHEN {_LINE_MATCH}
+                THEN json_set(value, '$.quantity', COALESCE(json_extract(value, '$.quantity'), 0) + :quantity)
+                ELSE json(value) END)
+            FROM json_each(products))
+        ELSE json_insert(COALESCE(products, '[]'), '$[#]',
+                         json_object('productId', :product_id, 'quantity', :quantity))
+    END
+    WHERE id = :cart_id AND "checkedOutAt" IS NULL
+    {_RETURNING}
+""").columns(CartItem.id, CartItem.userId, CartItem.date, CartItem.products)
+
+_SET_LINE = text(f"""
+    UPDATE cart_items
+    SET products = (
+        SELECT json_group_array(CASE
+            WHEN {_LINE_MATCH} THEN json_set(value, '$.quantity', :quantity)
+            ELSE json(value) END)
+        FROM json_each(products))
+    WHERE id = :cart_id AND "checkedOutAt" IS NULL AND {_HAS_LINE}
+    {_RETURNING}
+""").columns(CartItem.id, CartItem.userId, CartItem.date, CartItem.products)
+
+_REMOVE_LINE = text(f"""
+    UPDATE cart_items
+    SET products = (
+        SELECT json_group_array(json(value))
+        FROM json_each(products)
+        WHERE NOT ({_LINE_MATCH}))
+    WHERE id = :cart_id AND "checkedOutAt" IS NULL AND {_HAS_LINE}
+    {_RETURNING}
+""").columns(CartItem.id, CartItem.userId, CartItem.date, CartItem.products)
+
 class CartService:
     def __init__(self, db: Session):
         self.db = db
         logger.debug("CartService inicializado")
     
+    @traced
     def get_cart(self, cart_id: int) -> Optional[CartItem]:
         """Obtener carrito por ID"""
         logger.debug(f"Buscando carrito por ID: {cart_id}")
@@ -22,13 +126,22 @@ class CartService:
             logger.warning(f"Carrito no encontrado: ID {cart_id}")
         return cart
     
+    @traced
+    def count_carts(self, user_id: Optional[int] = None) -> int:
+        """Número total de carritos (o de un usuario) según los contadores de filas"""
+        if user_id:
+            return count_rows(self.db, "cart_items", "userId", user_id)
+        return count_rows(self.db, "cart_items")
+    
+    @traced
     def get_carts_by_user(self, user_id: int) -> List[CartItem]:
         """Obtener carritos por usuario"""
         logger.debug(f"Buscando carritos del usuario ID: {user_id}")
-        carts = self.db.query(CartItem).filter(CartItem.user_id == user_id).all()
+        carts = self.db.query(CartItem).filter(CartItem.userId == user_id).all()
         logger.info(f"Se encontraron {len(carts)} carritos para el usuario ID {user_id}")
         return carts
     
+    @traced
     def get_all_carts(self, skip: int = 0, limit: int = 100) -> List[CartItem]:
         """Obtener todos los carritos con paginación"""
         logger.debug(f"Obteniendo lista de carritos - skip: {skip}, limit: {limit}")
@@ -36,48 +149,275 @@ class CartService:
         logger.info(f"Se obtuvieron {len(carts)} carritos")
         return carts
     
+    @traced
+    def get_archived_cart(self, cart_id: int) -> Optional[dict]:
+        """Obtener un carrito archivado por ID"""
+        logger.debug(f"Buscando carrito archivado por ID: {cart_id}")
+        cart = get_archived_cart(cart_id)
+        if not cart:
+            logger.warning(f"Carrito archivado no encontrado: ID {cart_id}")
+        return cart
+    
+    @traced
+    def get_archived_carts(self, user_id: Optional[int] = None, skip: int = 0, limit: int = 100) -> List[dict]:
+        """Obtener carritos archivados, opcionalmente de un usuario"""
+        logger.debug(f"Obteniendo carritos archivados - usuario: {user_id}, skip: {skip}, limit: {limit}")
+        carts = list_archived_carts(user_id=user_id, skip=skip, limit=limit)
+        logger.info(f"Se obtuvieron {len(carts)} carritos archivados")
+        return carts
+    
+    @traced
     def create_cart(self, cart: CartCreate) -> CartItem:
         """Crear nuevo carrito"""
-        logger.debug(f"Intentando crear carrito para usuario ID: {cart.user_id}")
+        logger.debug(f"Intentando crear carrito para usuario ID: {cart.userId}")
         
-        # Crear instancia del carrito
-        db_cart = CartItem(**cart.dict())
-        self.db.add(db_cart)
-        self.db.commit()
-        self.db.refresh(db_cart)
-        logger.info(f"Carrito creado exitosamente: ID {db_cart.id} para usuario ID {cart.user_id}")
+        def write(db: Session) -> CartItem:
+            # INSERT ... RETURNING: la fila creada sale de la misma sentencia
+            db_cart = db.scalars(insert(CartItem).values(**cart.dict()).returning(CartItem)).one()
+            adjust_counts(db, row_delta("cart_items", 1, userId=db_cart.userId))
+            _record_sales(db, db_cart.id, db_cart.userId, db_cart.products)
+            return db_cart
+        
+        db_cart = execute_write(self.db, write)
+        logger.info(f"Carrito creado exitosamente: ID {db_cart.id} para usuario ID {cart.userId}")
         return db_cart
     
-    def update_cart(self, cart_id: int, cart_update: CartUpdate) -> Optional[CartItem]:
+    @traced
+    def update_cart(self, cart_id: int, cart_update: CartUpdate, owner_id: Optional[int] = None) -> Optional[CartItem]:
         """Actualizar carrito existente"""
         logger.debug(f"Intentando actualizar carrito ID: {cart_id}")
         
-        db_cart = self.get_cart(cart_id)
-        if not db_cart:
-            logger.warning(f"Carrito no encontrado para actualizar: ID {cart_id}")
-            return None
-        
         # Actualizar solo los campos proporcionados
         update_data = cart_update.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_cart, field, value)
-            logger.debug(f"Campo actualizado {field} para carrito ID {cart_id}")
         
-        self.db.commit()
-        self.db.refresh(db_cart)
+        def write(db: Session) -> Optional[CartItem]:
+            _ensure_cart_owner(db, cart_id, owner_id)
+            if not update_data:
+                return db.get(CartItem, cart_id)
+            # RETURNING da los valores nuevos: el usuario anterior solo se lee si
+            # cambia, ya con el bloqueo de escritura (execute_write abre con IMMEDIATE)
+            old_user_id = None
+            if "userId" in update_data:
+                old_user_id = db.execute(select(CartItem.userId).where(CartItem.id == cart_id)).scalar()
+            stmt = (
+                update(CartItem)
+                .where(CartItem.id == cart_id, CartItem.checkedOutAt.is_(None))
+                .values(**update_data)
+                .returning(CartItem)
+            )
+            db_cart = db.scalars(stmt.execution_options(synchronize_session=False, populate_existing=True)).first()
+            if not db_cart:
+                _ensure_not_checked_out(db, cart_id)
+                return None
+            if "userId" in update_data and old_user_id != db_cart.userId:
+                adjust_counts(db, {
+                    counter_key("cart_items", "userId", old_user_id): -1,
+                    counter_key("cart_items", "userId", db_cart.userId): 1,
+                })
+            _record_sales(db, db_cart.id, db_cart.userId, db_cart.products)
+            return db_cart
+        
+        db_cart = execute_write(self.db, write)
+        if not db_cart:
+            logger.warning(f"Carrito no encontrado para actualizar: ID {cart_id}")
+            return None
         logger.info(f"Carrito actualizado exitosamente: ID {cart_id}")
         return db_cart
     
-    def delete_cart(self, cart_id: int) -> bool:
+    @traced
+    def delete_cart(self, cart_id: int, owner_id: Optional[int] = None) -> bool:
         """Eliminar carrito"""
         logger.debug(f"Intentando eliminar carrito ID: {cart_id}")
         
-        db_cart = self.get_cart(cart_id)
-        if not db_cart:
+        def write(db: Session) -> bool:
+            _ensure_cart_owner(db, cart_id, owner_id)
+            # Un carrito comprado no se borra: sus ventas quedan registradas
+            stmt = delete(CartItem).where(CartItem.id == cart_id, CartItem.checkedOutAt.is_(None))
+            deleted = db.execute(stmt.returning(CartItem.userId)).first()
+            if deleted is None:
+                _ensure_not_checked_out(db, cart_id)
+                return False
+            adjust_counts(db, row_delta("cart_items", -1, userId=deleted.userId))
+            _record_sales(db, cart_id, None, None)
+            return True
+        
+        if not execute_write(self.db, write):
             logger.warning(f"Carrito no encontrado para eliminar: ID {cart_id}")
             return False
-        
-        self.db.delete(db_cart)
-        self.db.commit()
         logger.info(f"Carrito eliminado exitosamente: ID {cart_id}")
-        return True
\ No newline at end of file
+        return True
+    
+    def _mutate_line(self, statement, owner_id: Optional[int], **params):
+        def write(db: Session):
+            _ensure_cart_owner(db, params["cart_id"], owner_id)
+            cart = db.execute(statement, params).first()
+            if cart is None:
+                _ensure_not_checked_out(db, params["cart_id"])
+            else:
+                _record_sales(db, cart.id, cart.userId, cart.products)
+            return cart
+        
+        return execute_write(self.db, write)
+    
+    @traced
+    def cart_exists(self, cart_id: int, db: Optional[Session] = None) -> bool:
+        """Comprobar si existe un carrito sin cargarlo"""
+        return (db or self.db).execute(select(exists().where(CartItem.id == cart_id))).scalar()
+    
+    @traced
+    def add_item(self, cart_id: int, product_id: int, quantity: int, owner_id: Optional[int] = None):
+        """Añadir unidades de un producto al carrito (crea la línea si no existe)"""
+        logger.debug(f"Añadiendo {quantity} x producto {product_id} al carrito ID: {cart_id}")
+        cart = self._mutate_line(_ADD_LINE, owner_id, cart_id=cart_id, product_id=product_id, quantity=quantity)
+        if cart is None:
+            logger.warning(f"Carrito no encontrado para añadir producto: ID {cart_id}")
+            return None
+        logger.info(f"Producto {product_id} añadido al carrito ID {cart_id}")
+        return cart
+    
+    @traced
+    def set_item_quantity(self, cart_id: int, product_id: int, quantity: int, owner_id: Optional[int] = None):
+        """Cambiar la cantidad de una línea existente del carrito"""
+        logger.debug(f"Cambiando cantidad de producto {product_id} en carrito ID {cart_id} a {quantity}")
+        cart = self._mutate_line(_SET_LINE, owner_id, cart_id=cart_id, product_id=product_id, quantity=quantity)
+        if cart is None:
+            logger.warning(f"Línea no encontrada: carrito ID {cart_id}, producto {product_id}")
+            return None
+        logger.info(f"Cantidad actualizada: carrito ID {cart_id}, producto {product_id}")
+        return cart
+    
+    @traced
+    def remove_item(self, cart_id: int, product_id: int, owner_id: Optional[int] = None):
+        """Eliminar una línea del carrito"""
+        logger.debug(f"Eliminando producto {product_id} del carrito ID: {cart_id}")
+        cart = self._mutate_line(_REMOVE_LINE, owner_id, cart_id=cart_id, product_id=product_id)
+        if cart is None:
+            logger.warning(f"Línea no encontrada: carrito ID {cart_id}, producto {product_id}")
+            return None
+        logger.info(f"Producto {product_id} eliminado del carrito ID {cart_id}")
+        return cart
+    
+    @traced
+    def checkout(self, cart_id: int, owner_id: Optional[int] = None) -> Optional[dict]:
+        """Comprar el carrito reservando el stock de todas sus líneas, o ninguna"""
+        logger.debug(f"Intentando comprar carrito ID: {cart_id}")
+        
+        def write(db: Session) -> Optional[dict]:
+            _ensure_cart_owner(db, cart_id, owner_id)
+            checked_out_at = datetime.now()
+            # Marcar el carrito primero: dos compras simultáneas no pueden pasar ambas
+            stmt = (
+                update(CartItem)
+                .where(CartItem.id == cart_id, CartItem.checkedOutAt.is_(None))
+                .values(checkedOutAt=checked_out_at)
+                .returning(CartItem.products)
+                .execution_options(synchronize_session=False)
+            )
+            products = db.execute(stmt).scalar()
+            if products is None:
+                if not self.cart_exists(cart_id, db):
+                    return None
+                raise AlreadyCheckedOutError("El carrito ya se ha comprado")
+            
+            quantities = normalize_cart_lines(products)
+            if not quantities:
+                raise CheckoutError("El carrito está vacío")
+            
+            # Reserva condicional por línea: la fila solo cambia si hay stock
+            # suficiente, así que nunca se vende de más aunque compitan cientos
+            # de compradores por el mismo producto. El stock está en la base
+            # del catálogo: la reserva va por la conexión del carrito (ATTACH)
+            # para que ambas partes se confirmen o reviertan juntas
+            store = on_store_connection(db)
+            lines, missing = [], []
+            for product_id in sorted(quantities):
+                quantity = quantities[product_id]
+                stmt = (
+                    update(Product)
+                    .where(Product.id == product_id, Product.stock >= quantity)
+                    .values(stock=Product.stock - quantity)
+                    .returning(Product)
+                    .execution_options(synchronize_session=False, populate_existing=True)
+                )
+                product = db.scalars(stmt, bind_arguments=store).first()
+                if product is None:
+                    missing.append(product_id)
+                    continue
+                lines.append({"productId": product_id, "quantity": quantity, "remainingStock": product.stock})
+                # El stock forma parte del producto publicado: versión y evento
+                # de cambio por la misma conexión, dentro de la compra
+                track_catalog_write(db, product=product, bind_arguments=store)
+                payload = ProductResponse.model_validate(product).model_dump(mode="json")
+                record_product_change(db, "updated", product_id, payload, bind_arguments=store)
+            if missing:
+                # La excepción revierte la transacción (o el SAVEPOINT en la cola)
+                raise CheckoutError("Stock insuficiente", missing)
+            return {"cartId": cart_id, "checkedOutAt": checked_out_at, "lines": lines}
+        
+        result = execute_write(self.db, write)
+        if result is None:
+            logger.warning(f"Carrito no encontrado para comprar: ID {cart_id}")
+            return None
+        logger.info(f"Carrito comprado: ID {cart_id} ({len(result['lines'])} líneas reservadas)")
+        return result
+    
+    @traced
+    def checkout_summary(self, cart_id: int) -> Optional[dict]:
+        """Resultado de una compra ya hecha, o None si el carrito no se ha comprado"""
+        cart = self.db.execute(
+            select(CartItem.checkedOutAt, CartItem.products).where(CartItem.id == cart_id)
+        ).first()
+        if cart is None or cart.checkedOutAt is None:
+            return None
+        # El trabajo que la hizo guardó el resultado con el stock restante de entonces
+        result = self.db.execute(
+            select(Job.result)
+            .where(Job.kind == "cart.checkout", Job.status == "done", Job.payload["cartId"].as_integer() == cart_id)
+            .order_by(Job.id)
+            .limit(1)
+        ).scalar()
+        if result is not None:
+            return result
+        # Compra síncrona: las líneas salen del carrito, el stock de entonces no se conoce
+        lines = [
+            {"productId": product_id, "quantity": quantity, "remainingStock": None}
+            for product_id, quantity in sorted(normalize_cart_lines(cart.products).items())
+        ]
+        return {"cartId": cart_id, "checkedOutAt": cart.checkedOutAt, "lines": lines}
+    
+    @traced
+    def enqueue_checkout(self, cart_id: int, owner_id: Optional[int] = None) -> Optional[int]:
+        """Encolar la compra del carrito y devolver el id del trabajo"""
+        logger.debug(f"Encolando compra del carrito ID: {cart_id}")
+        
+        def write(db: Session) -> Optional[int]:
+            _ensure_cart_owner(db, cart_id, owner_id)
+            # Existencia e inserción en una sola sentencia
+            return enqueue_job(
+                db, "cart.checkout", {"cartId": cart_id}, max_attempts=3,
+                only_if=exists().where(CartItem.id == cart_id),
+            )
+        
+        job_id = execute_write(self.db, write)
+        if job_id is None:
+            logger.warning(f"Carrito no encontrado para comprar: ID {cart_id}")
+            return None
+        logger.info(f"Compra del carrito ID {cart_id} encolada: trabajo {job_id}")
+        return job_id
+
+@job_handler("cart.checkout")
+def _checkout_job(db: Session, payload: dict):
+    service = CartService(db)
+    try:
+        result = service.checkout(payload["cartId"])
+    except AlreadyCheckedOutError:
+        # Reintento tras una compra ya confirmada (lease vencido, trabajo
+        # repetido o compra síncrona previa): mismo resultado, sin fallar
+        logger.info(f"Carrito ID {payload['cartId']} ya comprado: se devuelve la compra existente")
+        result = service.checkout_summary(payload["cartId"])
+    except CheckoutError as e:
+        # Una compra rechazada no se arregla reintentando
+        raise PermanentJobError(str(e), {"products": e.products})
+    if result is None:
+        raise PermanentJobError("Carrito no encontrado")
+    return CheckoutResponse.model_validate(result).model_dump(mode="json")
@@ -0,0 +1,22 @@
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.models.job_model import Job
+from app.core.tracing import traced
+import logging
+
+# Logger específico para servicios
+logger = logging.getLogger("services")
+
+class JobService:
+    def __init__(self, db: Session):
+        self.db = db
+        logger.debug("JobService inicializado")
+    
+    @traced
+    def get_job(self, job_id: int) -> Optional[Job]:
+        """Obtener trabajo por ID"""
+        logger.debug(f"Buscando trabajo por ID: {job_id}")
+        job = self.db.get(Job, job_id)
+        if not job:
+            logger.warning(f"Trabajo no encontrado: ID {job_id}")
+        return job
@@ -1,17 +1,37 @@
+from sqlalchemy import delete, func, insert, or_, select, update
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.models.product_model import Product
-from app.schemas.product_schemas import ProductCreate, ProductUpdate
+from app.schemas.product_schemas import ProductCreate, ProductUpdate, ProductResponse
+from app.core import config
+from app.core.autocomplete import autocomplete_index, normalize_terms
+from app.core.catalog_snapshot import catalog_snapshot, track_catalog_write
+from app.core.change_feed import record_product_change
+from app.core.row_counters import adjust_counts, count_rows, counter_key, row_delta
+from app.core.write_queue import execute_write
+from app.core.tracing import traced
 import logging
 
 # Logger específico para servicios
 logger = logging.getLogger("services")
 
+def _rating_columns(rating) -> dict:
+    """Valores de las columnas numéricas a partir del JSON de rating"""
+    rating = rating or {}
+    return {
+        "rating_rate": float(rating.get("rate") or 0.0),
+        "rating_count": int(rating.get("count") or 0),
+    }
+
+def _change_payload(product: Product) -> dict:
+    return ProductResponse.model_validate(product).model_dump(mode="json")
+
 class ProductService:
     def __init__(self, db: Session):
         self.db = db
         logger.debug("ProductService inicializado")
     
+    @traced
     def get_product(self, product_id: int) -> Optional[Product]:
         """Obtener producto por ID"""
         logger.debug(f"Buscando producto por ID: {product_id}")
@@ -22,6 +42,7 @@ class ProductService:
             logger.warning(f"Producto no encontrado: ID {product_id}")
         return product
     
+    @traced
     def get_products(self, skip: int = 0, limit: int = 100) -> List[Product]:
         """Obtener lista de productos con paginación"""
         logger.debug(f"Obteniendo lista de productos - skip: {skip}, limit: {limit}")
@@ -29,6 +50,14 @@ class ProductService:
         logger.info(f"Se obtuvieron {len(products)} productos")
         return products
     
+    @traced
+    def count_products(self, category: Optional[str] = None) -> int:
+        """Número total de productos (o de una categoría) según los contadores de filas"""
+        if category:
+            return count_rows(self.db, "products", "category", category)
+        return count_rows(self.db, "products")
+    
+    @traced
     def get_products_by_category(self, category: str) -> List[Product]:
         """Obtener productos por categoría"""
         logger.debug(f"Buscando productos por categoría: {category}")
@@ -36,48 +65,183 @@ class ProductService:
         logger.info(f"Se encontraron {len(products)} productos en la categoría {category}")
         return products
     
+    def search_products(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        sort_by: str = "id",
+        descending: bool = False,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> List[Product]:
+        """Filtrar y ordenar productos, desde el snapshot en memoria si está disponible"""
+        logger.debug(
+            f"Buscando productos - categoría: {category}, precio: [{min_price}, {max_price}], "
+            f"rating mín.: {min_rating}, orden: {sort_by} {'desc' if descending else 'asc'}"
+        )
+        if config.CATALOG_SNAPSHOT_ENABLED:
+            catalog_snapshot.sync(self.db)
+        if catalog_snapshot.available:
+            ids = catalog_snapshot.query(category, min_price, max_price, min_rating, sort_by, descending, skip, limit)
+            # Solo se hidratan los productos de la página pedida
+            by_id = {p.id: p for p in self.db.query(Product).filter(Product.id.in_(ids)).all()} if ids else {}
+            products = [by_id[i] for i in ids if i in by_id]
+        else:
+            query = self.db.query(Product)
+            if category is not None:
+                query = query.filter(Product.category == category)
+            if min_price is not None:
+                query = query.filter(Product.price >= min_price)
+            if max_price is not None:
+                query = query.filter(Product.price <= max_price)
+            rate = func.json_extract(Product.rating, "$.rate")
+            if min_rating is not None:
+                query = query.filter(rate >= min_rating)
+            column = {
+                "id": Product.id,
+                "price": Product.price,
+                "rating": rate,
+                "rating_count": func.json_extract(Product.rating, "$.count"),
+            }[sort_by]
+            query = query.order_by(column.desc() if descending else column.asc(), Product.id)
+            products = query.offset(skip).limit(limit).all()
+        logger.info(f"Se encontraron {len(products)} productos")
+        return products
+    
+    @traced
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Sugerencias de productos para un prefijo, ordenadas por número de valoraciones"""
+        logger.debug(f"Autocompletando productos para: {prefix}")
+        if config.AUTOCOMPLETE_ENABLED:
+            autocomplete_index.sync(self.db)
+        if autocomplete_index.available:
+            return autocomplete_index.query(prefix, limit=limit)
+        # Sin índice: palabra del título que empieza por el último token
+        tokens = normalize_terms(prefix)
+        if not tokens:
+            return []
+        token = tokens[-1]
+        rows = self.db.execute(
+            select(Product.id, Product.title, Product.category, Product.rating_count)
+            .where(or_(Product.title.ilike(f"{token}%"), Product.title.ilike(f"% {token}%")))
+            .order_by(Product.rating_count.desc(), Product.id)
+            .limit(limit)
+        ).all()
+        return [
+            {"id": product_id, "title": title, "category": category, "ratingCount": rating_count or 0}
+            for product_id, title, category, rating_count in rows
+        ]
+    
+    @traced
     def create_product(self, product: ProductCreate) -> Product:
         """Crear nuevo producto"""
         logger.debug(f"Intentando crear producto: {product.title}")
         
-        # Crear instancia del producto
-        db_product = Product(**product.dict())
-        self.db.add(db_product)
-        self.db.commit()
-        self.db.refresh(db_product)
+        def write(db: Session) -> Product:
+            # INSERT ... RETURNING: la fila creada sale de la misma sentencia
+            stmt = insert(Product).values(**product.dict(), **_rating_columns(product.rating)).returning(Product)
+            db_product = db.scalars(stmt).one()
+            adjust_counts(db, row_delta("products", 1, category=db_product.category))
+            track_catalog_write(db, product=db_product)
+            record_product_change(db, "created", db_product.id, _change_payload(db_product))
+            return db_product
+        
+        db_product = execute_write(self.db, write)
         logger.info(f"Producto creado exitosamente: {db_product.title} (ID: {db_product.id})")
         return db_product
     
+    @traced
     def update_product(self, product_id: int, product_update: ProductUpdate) -> Optional[Product]:
         """Actualizar producto existente"""
         logger.debug(f"Intentando actualizar producto ID: {product_id}")
         
-        db_product = self.get_product(product_id)
+        # Actualizar solo los campos proporcionados
+        update_data = product_update.dict(exclude_unset=True)
+        if update_data.get("rating") is not None:
+            update_data.update(_rating_columns(update_data["rating"]))
+        
+        def write(db: Session) -> Optional[Product]:
+            if not update_data:
+                return db.get(Product, product_id)
+            # RETURNING da los valores nuevos: la categoría anterior solo se lee si
+            # cambia, ya con el bloqueo de escritura (execute_write abre con IMMEDIATE)
+            old_category = None
+            if "category" in update_data:
+                old_category = db.execute(select(Product.category).where(Product.id == product_id)).scalar()
+            stmt = update(Product).where(Product.id == product_id).values(**update_data).returning(Product)
+            db_product = db.scalars(stmt.execution_options(synchronize_session=False, populate_existing=True)).first()
+            if db_product is not None:
+                if "category" in update_data and old_category != db_product.category:
+                    adjust_counts(db, {
+                        counter_key("products", "category", old_category): -1,
+                        counter_key("products", "category", db_product.category): 1,
+                    })
+                track_catalog_write(db, product=db_product)
+                record_product_change(db, "updated", db_product.id, _change_payload(db_product))
+            return db_product
+        
+        db_product = execute_write(self.db, write)
         if not db_product:
             logger.warning(f"Producto no encontrado para actualizar: ID {product_id}")
             return None
+        logger.info(f"Producto actualizado exitosamente: {db_product.title} (ID: {product_id})")
+        return db_product
+    
+    @traced
+    def add_rating(self, product_id: int, rate: float) -> Optional[Product]:
+        """Registrar una valoración actualizando recuento y media en una única sentencia atómica"""
+        logger.debug(f"Registrando valoración {rate} para producto ID: {product_id}")
         
-        # Actualizar solo los campos proporcionados
-        update_data = product_update.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_product, field, value)
-            logger.debug(f"Campo actualizado {field} para producto ID {product_id}")
+        def write(db: Session):
+            count = func.coalesce(Product.rating_count, 0)
+            new_count = count + 1
+            new_rate = (func.coalesce(Product.rating_rate, 0.0) * count + rate) / new_count
+            # SQLite evalúa todas las expresiones con los valores previos de la fila,
+            # así que dos valoraciones concurrentes nunca se pisan
+            stmt = (
+                update(Product)
+                .where(Product.id == product_id)
+                .values(
+                    rating_count=new_count,
+                    rating_rate=new_rate,
+                    rating=func.json_object("rate", func.round(new_rate, 2), "count", new_count),
+                )
+                .returning(Product)
+                .execution_options(synchronize_session=False, populate_existing=True)
+            )
+            db_product = db.scalars(stmt).first()
+            if db_product is not None:
+                track_catalog_write(db, product=db_product)
+                record_product_change(db, "updated", db_product.id, _change_payload(db_product))
+            return db_product
         
-        self.db.commit()
-        self.db.refresh(db_product)
-        logger.info(f"Producto actualizado exitosamente: {db_product.title} (ID: {product_id})")
+        db_product = execute_write(self.db, write)
+        if db_product is None:
+            logger.warning(f"Producto no encontrado para valorar: ID {product_id}")
+            return None
+        logger.info(f"Valoración registrada para producto ID {product_id}: {db_product.rating}")
         return db_product
     
+    @traced
     def delete_product(self, product_id: int) -> bool:
         """Eliminar producto"""
         logger.debug(f"Intentando eliminar producto ID: {product_id}")
         
-        db_product = self.get_product(product_id)
-        if not db_product:
+        def write(db: Session) -> Optional[str]:
+            stmt = delete(Product).where(Product.id == product_id).returning(Product.title, Product.category)
+            deleted = db.execute(stmt).first()
+            if deleted is None:
+                return None
+            adjust_counts(db, row_delta("products", -1, category=deleted.category))
+            track_catalog_write(db, deleted_id=product_id)
+            record_product_change(db, "deleted", product_id)
+            return deleted.title
+        
+        title = execute_write(self.db, write)
+        if title is None:
             logger.warning(f"Producto no encontrado para eliminar: ID {product_id}")
             return False
-        
-        self.db.delete(db_product)
-        self.db.commit()
-        logger.info(f"Producto eliminado exitosamente: {db_product.title} (ID: {product_id})")
+        logger.info(f"Producto eliminado exitosamente: {title} (ID: {product_id})")
         return True
\ No newline at end of file
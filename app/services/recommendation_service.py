@@ -0,0 +1,195 @@
+from collections import Counter
+from itertools import permutations
+from sqlalchemy import delete, insert as sql_insert, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core import config
+from app.core.database import on_store_connection
+from app.core.metrics import metrics
+from app.core.tracing import traced
+from app.models.analytics_model import ArchivedCartSales, CartSales
+from app.models.product_model import Product
+from app.models.recommendation_model import ProductPair, RelatedProducts
+import logging
+import time
+
+try:
+    import numpy as np
+except ImportError:  # Sin numpy la reconstrucción cuenta los pares en Python
+    np = None
+
+# Logger específico para servicios
+logger = logging.getLogger("services")
+
+def _pair_deltas(old_ids: Iterable[int], new_ids: Iterable[int]) -> Dict[Tuple[int, int], int]:
+    # Pares ordenados que el carrito deja de aportar (-1) y que empieza a aportar (+1)
+    deltas: Dict[Tuple[int, int], int] = {}
+    for ids, sign in ((set(old_ids), -1), (set(new_ids), 1)):
+        for pair in permutations(ids, 2):
+            deltas[pair] = deltas.get(pair, 0) + sign
+    return {pair: delta for pair, delta in deltas.items() if delta}
+
+def _refresh_related(db: Session, product_ids: Iterable[int]):
+    # El top-k de cada producto es un rango del índice (productId, carts)
+    for product_id in product_ids:
+        rows = db.execute(
+            select(ProductPair.relatedId, ProductPair.carts)
+            .where(ProductPair.productId == product_id, ProductPair.carts > 0)
+            .order_by(ProductPair.carts.desc(), ProductPair.relatedId)
+            .limit(config.RECOMMENDATIONS_TOP_K)
+        ).all()
+        if not rows:
+            db.execute(delete(RelatedProducts).where(RelatedProducts.productId == product_id))
+            continue
+        related = [[related_id, carts] for related_id, carts in rows]
+        stmt = insert(RelatedProducts).values(productId=product_id, related=related)
+        db.execute(stmt.on_conflict_do_update(index_elements=[RelatedProducts.productId], set_={"related": related}))
+
+def record_cart_pairs(db: Session, old_ids: Iterable[int], new_ids: Iterable[int]):
+    """Aplicar a la matriz de co-ocurrencia el cambio de productos de un carrito.
+
+    Se llama dentro de la transacción que contabiliza el carrito en la
+    analítica de ventas, con los productos contabilizados antes y después.
+    """
+    deltas = _pair_deltas(old_ids, new_ids)
+    if not deltas:
+        return
+    stmt = insert(ProductPair)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ProductPair.productId, ProductPair.relatedId],
+            set_={"carts": ProductPair.carts + stmt.excluded.carts},
+        ),
+        [{"productId": a, "relatedId": b, "carts": delta} for (a, b), delta in deltas.items()],
+    )
+    affected = sorted({a for a, _ in deltas})
+    db.execute(delete(ProductPair).where(ProductPair.productId.in_(affected), ProductPair.carts <= 0))
+    _refresh_related(db, affected)
+
+class _PairCounter:
+    """Acumulador de co-ocurrencias por bloques de carritos.
+
+    Con numpy cada bloque se expande a pares con operaciones vectorizadas y
+    se agrega con np.unique; las claves combinan los dos ids en un int64.
+    """
+
+    def __init__(self):
+        if np is not None:
+            self.keys = np.empty(0, dtype=np.int64)
+            self.counts = np.empty(0, dtype=np.int64)
+        else:
+            self.counter: Counter = Counter()
+
+    @traced
+    def add(self, carts: List[List[int]]):
+        if np is None:
+            for ids in carts:
+                self.counter.update(permutations(ids, 2))
+            return
+        sizes = np.fromiter((len(ids) for ids in carts), dtype=np.int64, count=len(carts))
+        products = np.fromiter((pid for ids in carts for pid in ids), dtype=np.int64, count=int(sizes.sum()))
+        if len(products) == 0:
+            return
+        # Cada línea se empareja con todas las líneas de su carrito
+        starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        line_sizes = np.repeat(sizes, sizes)
+        left = np.repeat(np.arange(len(products)), line_sizes)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(line_sizes) - line_sizes, line_sizes)
+        right = np.repeat(starts, line_sizes) + offsets
+        keep = left != right
+        keys = (products[left[keep]] << 32) | products[right[keep]]
+        keys, counts = np.unique(keys, return_counts=True)
+        # Fusionar con lo acumulado de los bloques anteriores
+        merged, inverse = np.unique(np.concatenate((self.keys, keys)), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate((self.counts, counts)), minlength=len(merged)).astype(np.int64)
+        self.keys = merged
+
+    @traced
+    def pairs(self) -> List[Tuple[int, int, int]]:
+        """(productId, relatedId, carts) ordenados por producto y co-ocurrencia descendente"""
+        if np is None:
+            return sorted(((a, b, c) for (a, b), c in self.counter.items()), key=lambda p: (p[0], -p[2], p[1]))
+        a, b = self.keys >> 32, self.keys & 0xFFFFFFFF
+        order = np.lexsort((b, -self.counts, a))
+        return list(zip(a[order].tolist(), b[order].tolist(), self.counts[order].tolist()))
+
+class RecommendationService:
+    def __init__(self, db: Session):
+        self.db = db
+        logger.debug("RecommendationService inicializado")
+
+    @traced
+    def get_related(self, product_id: int, limit: int = 10) -> Optional[List[Tuple[Product, int]]]:
+        """Productos comprados junto a uno dado, con el número de carritos en común.
+
+        Devuelve None si el producto no existe.
+        """
+        logger.debug(f"Obteniendo productos relacionados con ID: {product_id}")
+        row = self.db.get(RelatedProducts, product_id)
+        if row is None:
+            if self.db.get(Product, product_id) is None:
+                return None
+            return []
+        ranked = row.related[:limit]
+        # Los vecinos se leen del catálogo adjunto, en la misma conexión
+        stmt = select(Product).where(Product.id.in_([related_id for related_id, _ in ranked]))
+        products = {p.id: p for p in self.db.scalars(stmt, bind_arguments=on_store_connection(self.db))}
+        # Los productos eliminados siguen en la matriz hasta la próxima reconstrucción
+        return [(products[related_id], carts) for related_id, carts in ranked if related_id in products]
+
+    @traced
+    def is_empty(self) -> bool:
+        """True si no hay ningún vecino precalculado"""
+        return self.db.execute(select(RelatedProducts.productId).limit(1)).first() is None
+
+    @traced
+    def rebuild(self, chunk_size: int = config.RECOMMENDATIONS_BUILD_CHUNK) -> int:
+        """Reconstruir la matriz de co-ocurrencia y los top-k desde los carritos contabilizados y archivados"""
+        start = time.perf_counter()
+        logger.info(f"Reconstruyendo recomendaciones (bloques de {chunk_size})")
+        try:
+            # El DELETE toma el bloqueo de escritura de SQLite: ninguna escritura
+            # de carritos se confirma durante la lectura, así que el resultado es
+            # exacto aunque se lea por bloques para acotar la memoria
+            self.db.execute(delete(ProductPair))
+            self.db.execute(delete(RelatedProducts))
+            counter = _PairCounter()
+            processed = 0
+            # Los archivados conservan los pares que aportaban al archivarse
+            for key, lines_column in ((CartSales.cartId, CartSales.lines), (ArchivedCartSales.id, ArchivedCartSales.lines)):
+                last_id = 0
+                while True:
+                    rows = self.db.execute(
+                        select(key, lines_column).where(key > last_id).order_by(key).limit(chunk_size)
+                    ).all()
+                    if not rows:
+                        break
+                    counter.add([[line["productId"] for line in lines] for _, lines in rows])
+                    last_id = rows[-1][0]
+                    processed += len(rows)
+
+            pairs = counter.pairs()
+            for i in range(0, len(pairs), chunk_size):
+                self.db.execute(sql_insert(ProductPair), [
+                    {"productId": a, "relatedId": b, "carts": c} for a, b, c in pairs[i:i + chunk_size]
+                ])
+            related: Dict[int, List[List[int]]] = {}
+            for a, b, c in pairs:
+                neighbours = related.setdefault(a, [])
+                if len(neighbours) < config.RECOMMENDATIONS_TOP_K:
+                    neighbours.append([b, c])
+            if related:
+                self.db.execute(sql_insert(RelatedProducts), [
+                    {"productId": product_id, "related": neighbours} for product_id, neighbours in related.items()
+                ])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        metrics.observe("recommendations_rebuild_seconds", time.perf_counter() - start)
+        logger.info(
+            f"Recomendaciones reconstruidas: {processed} carritos, {len(pairs)} pares, {len(related)} productos "
+            f"({(time.perf_counter() - start) * 1000:.0f} ms)"
+        )
+        return processed
@@ -1,17 +1,32 @@
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.cart_model import CartItem
 from app.models.user_model import User
 from app.schemas.user_schemas import UserCreate, UserUpdate
+from app.core.passwords import hash_password, password_hasher
+from app.core.geo import box_condition, geo_columns, haversine_km, radius_boxes, users_geo
+from app.core.row_counters import adjust_counts, count_rows, counter_key, row_delta
+from app.core.user_index import UNIQUE_FIELDS, user_index
+from app.core.write_queue import execute_write
+from app.core.tracing import traced
 import logging
 
 # Logger específico para servicios
 logger = logging.getLogger("services")
 
+_DUPLICATE_MESSAGES = {
+    "email": "El email {} ya está registrado",
+    "username": "El nombre de usuario {} ya está registrado",
+}
+
 class UserService:
     def __init__(self, db: Session):
         self.db = db
         logger.debug("UserService inicializado")
     
+    @traced
     def get_user(self, user_id: int) -> Optional[User]:
         """Obtener usuario por ID"""
         logger.debug(f"Buscando usuario por ID: {user_id}")
@@ -22,6 +37,7 @@ class UserService:
             logger.warning(f"Usuario no encontrado: ID {user_id}")
         return user
     
+    @traced
     def get_user_by_email(self, email: str) -> Optional[User]:
         """Obtener usuario por email"""
         logger.debug(f"Buscando usuario por email: {email}")
@@ -30,6 +46,7 @@ class UserService:
             logger.info(f"Usuario encontrado por email: {email}")
         return user
     
+    @traced
     def get_users(self, skip: int = 0, limit: int = 100) -> List[User]:
         """Obtener lista de usuarios con paginación"""
         logger.debug(f"Obteniendo lista de usuarios - skip: {skip}, limit: {limit}")
@@ -37,53 +54,166 @@ class UserService:
         logger.info(f"Se obtuvieron {len(users)} usuarios")
         return users
     
+    def get_users_in_box(
+        self, min_lat: float, max_lat: float, min_long: float, max_long: float, skip: int = 0, limit: int = 100
+    ) -> List[User]:
+        """Usuarios cuya ubicación cae dentro de una caja de coordenadas"""
+        logger.debug(f"Buscando usuarios en la caja lat [{min_lat}, {max_lat}], long [{min_long}, {max_long}]")
+        # El R*Tree guarda float32 redondeado hacia fuera: las columnas dan el corte exacto
+        inside = select(users_geo.c.id).where(box_condition(min_lat, max_lat, min_long, max_long))
+        users = (
+            self.db.query(User)
+            .filter(User.id.in_(inside), User.lat.between(min_lat, max_lat), User.long.between(min_long, max_long))
+            .order_by(User.id)
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+        logger.info(f"Se encontraron {len(users)} usuarios en la caja")
+        return users
+    
+    @traced
+    def get_users_nearby(self, lat: float, long: float, radius_km: float, limit: int = 100) -> List[Tuple[User, float]]:
+        """Usuarios a menos de radius_km de un punto, del más cercano al más lejano"""
+        logger.debug(f"Buscando usuarios a menos de {radius_km} km de ({lat}, {long})")
+        # El índice devuelve la caja que contiene el círculo; la distancia real se
+        # calcula solo sobre esas posiciones, sin cargar todavía los usuarios
+        candidates = []
+        for box in radius_boxes(lat, long, radius_km):
+            rows = self.db.execute(
+                select(User.id, User.lat, User.long).where(User.id.in_(select(users_geo.c.id).where(box_condition(*box))))
+            ).all()
+            candidates.extend(rows)
+        nearest = sorted(
+            (distance, user_id)
+            for user_id, user_lat, user_long in candidates
+            if (distance := haversine_km(lat, long, user_lat, user_long)) <= radius_km
+        )[:limit]
+        users = {u.id: u for u in self.db.query(User).filter(User.id.in_([user_id for _, user_id in nearest]))}
+        result = [(users[user_id], distance) for distance, user_id in nearest if user_id in users]
+        logger.info(f"Se encontraron {len(result)} usuarios a menos de {radius_km} km")
+        return result
+    
+    @traced
+    def count_users(self) -> int:
+        """Número total de usuarios según los contadores de filas"""
+        return count_rows(self.db, "users")
+    
+    def _ensure_unique(self, db: Session, values: Dict[str, Any], user_id: Optional[int] = None):
+        """Dentro de la escritura, ValueError si un campo único ya pertenece a otro usuario.
+
+        Solo consulta la base cuando el índice en memoria da un acierto; la
+        consulta va en la transacción de la escritura (BEGIN IMMEDIATE), así que
+        dos registros simultáneos no pueden pasar ambos la comprobación
+        """
+        for field in UNIQUE_FIELDS:
+            value = values.get(field)
+            # Sin índice cargado o con un valor nuevo no hay consulta: decide el UNIQUE
+            if value is None or not user_index.contains(field, value):
+                continue
+            # Un acierto se confirma: otro worker pudo borrar o renombrar al usuario
+            owner = db.execute(select(User.id).where(getattr(User, field) == value)).scalar()
+            if owner is None:
+                user_index.discard(field, value)
+            elif owner != user_id:
+                raise self._duplicate_error(field, values)
+    
+    def _duplicate_error(self, field: str, values: Dict[str, Any]) -> ValueError:
+        logger.error(f"Valor duplicado en {field}: {values[field]}")
+        return ValueError(_DUPLICATE_MESSAGES[field].format(values[field]))
+    
+    def _write_unique(self, write, values: Dict[str, Any]):
+        """Ejecutar una escritura traduciendo las violaciones de UNIQUE a ValueError"""
+        try:
+            return execute_write(self.db, write)
+        except IntegrityError as e:
+            field = next((f for f in UNIQUE_FIELDS if f"users.{f}" in str(e.orig)), None)
+            if field is None:
+                raise
+            # Lo registró otro worker: el índice local lo aprende
+            user_index.add(field, values[field])
+            raise self._duplicate_error(field, values)
+    
+    @traced
     def create_user(self, user: UserCreate) -> User:
-        """Crear nuevo usuario con validación de email único"""
+        """Crear nuevo usuario con validación de email y nombre de usuario únicos"""
         logger.debug(f"Intentando crear usuario: {user.email}")
+        values = {**user.dict(), **geo_columns(user.address)}
+        # scrypt fuera de la escritura: no se hace esperar a la cola con el bloqueo tomado
+        values["password"] = password_hasher.run(hash_password, user.password)
         
-        # Verificar si el email ya existe
-        if self.get_user_by_email(user.email):
-            logger.error(f"Email ya registrado: {user.email}")
-            raise ValueError(f"El email {user.email} ya está registrado")
+        def write(db: Session) -> User:
+            self._ensure_unique(db, values)
+            # INSERT ... RETURNING: la fila creada sale de la misma sentencia
+            db_user = db.scalars(insert(User).values(**values).returning(User)).one()
+            adjust_counts(db, row_delta("users", 1))
+            user_index.track_write(db, added={f: values[f] for f in UNIQUE_FIELDS})
+            return db_user
         
-        # Crear instancia del usuario
-        db_user = User(**user.dict())
-        self.db.add(db_user)
-        self.db.commit()
-        self.db.refresh(db_user)
+        db_user = self._write_unique(write, values)
         logger.info(f"Usuario creado exitosamente: {db_user.email} (ID: {db_user.id})")
         return db_user
     
+    @traced
     def update_user(self, user_id: int, user_update: UserUpdate) -> Optional[User]:
         """Actualizar usuario existente"""
         logger.debug(f"Intentando actualizar usuario ID: {user_id}")
         
-        db_user = self.get_user(user_id)
-        if not db_user:
-            logger.warning(f"Usuario no encontrado para actualizar: ID {user_id}")
-            return None
-        
         # Actualizar solo los campos proporcionados
         update_data = user_update.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_user, field, value)
-            logger.debug(f"Campo actualizado {field} para usuario ID {user_id}")
+        if "address" in update_data:
+            update_data.update(geo_columns(update_data["address"]))
+        if "password" in update_data:
+            update_data["password"] = password_hasher.run(hash_password, update_data["password"])
+        changed_fields = [f for f in UNIQUE_FIELDS if f in update_data]
         
-        self.db.commit()
-        self.db.refresh(db_user)
+        def write(db: Session) -> Optional[User]:
+            if not update_data:
+                return db.get(User, user_id)
+            self._ensure_unique(db, update_data, user_id=user_id)
+            # Los valores anteriores solo se leen si cambia algún campo único, ya
+            # con el bloqueo de escritura (execute_write abre con IMMEDIATE)
+            old = None
+            if changed_fields:
+                old = db.execute(select(User.email, User.username).where(User.id == user_id)).first()
+            stmt = update(User).where(User.id == user_id).values(**update_data).returning(User)
+            db_user = db.scalars(stmt.execution_options(synchronize_session=False, populate_existing=True)).first()
+            if db_user is not None and old is not None:
+                user_index.track_write(
+                    db,
+                    added={f: getattr(db_user, f) for f in changed_fields},
+                    removed={f: getattr(old, f) for f in changed_fields if getattr(old, f) != getattr(db_user, f)},
+                )
+            return db_user
+        
+        db_user = self._write_unique(write, update_data)
+        if not db_user:
+            logger.warning(f"Usuario no encontrado para actualizar: ID {user_id}")
+            return None
         logger.info(f"Usuario actualizado exitosamente: {db_user.email} (ID: {user_id})")
         return db_user
     
+    @traced
     def delete_user(self, user_id: int) -> bool:
         """Eliminar usuario"""
         logger.debug(f"Intentando eliminar usuario ID: {user_id}")
         
-        db_user = self.get_user(user_id)
-        if not db_user:
+        def write(db: Session) -> Optional[str]:
+            deleted = db.execute(delete(User).where(User.id == user_id).returning(User.email, User.username)).first()
+            if deleted is None:
+                return None
+            # Como hacía el borrado ORM, los carritos quedan sin usuario
+            detached = db.execute(update(CartItem).where(CartItem.userId == user_id).values(userId=None)).rowcount
+            adjust_counts(db, {
+                **row_delta("users", -1),
+                counter_key("cart_items", "userId", user_id): -detached,
+            })
+            user_index.track_write(db, removed={"email": deleted.email, "username": deleted.username})
+            return deleted.email
+        
+        email = execute_write(self.db, write)
+        if email is None:
             logger.warning(f"Usuario no encontrado para eliminar: ID {user_id}")
             return False
-        
-        self.db.delete(db_user)
-        self.db.commit()
-        logger.info(f"Usuario eliminado exitosamente: {db_user.email} (ID: {user_id})")
+        logger.info(f"Usuario eliminado exitosamente: {email} (ID: {user_id})")
         return True
\ No newline at end of file